@@ -0,0 +1,165 @@
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from flask import g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Bucket state is kept for this many (client, scope) pairs, least recently
+# used first out, so a scan from many addresses cannot grow memory unbounded
+MAX_BUCKETS = 10000
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second with bursts of up to ``burst``."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Refill and return the seconds until a token is available."""
+        # A bucket created after ``now`` was read must not start in debt
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = max(now, self.updated)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """Sheds load before it reaches the database.
+
+    Each request must pass, in order:
+
+    - the client's default token bucket (``RATE_LIMIT_DEFAULT``) and, for
+      endpoints listed in ``RATE_LIMIT_ROUTES``, the client's bucket for that
+      endpoint; otherwise it gets ``429`` with ``Retry-After``;
+    - the global in-flight limit (``MAX_IN_FLIGHT``) and, for writes, the
+      writer queue limit (``MAX_WRITE_QUEUE``); otherwise it gets ``503``.
+
+    Rejections are immediate, so a burst costs the server almost nothing
+    and well-behaved clients keep bounded latency. Clients are told apart
+    by address, so behind a reverse proxy ``PROXY_FIX_X_FOR`` must be set
+    for ``remote_addr`` to be the client's rather than the proxy's.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.default_limit = None
+        self.route_limits = {}
+        self.max_in_flight = None
+        self.max_write_queue = None
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.shed = 0
+
+    def init_app(self, app):
+        self.enabled = app.config.get("RATE_LIMIT_ENABLED", False)
+        self.default_limit = app.config.get("RATE_LIMIT_DEFAULT")
+        self.route_limits = app.config.get("RATE_LIMIT_ROUTES", {})
+        self.max_in_flight = app.config.get("MAX_IN_FLIGHT")
+        self.max_write_queue = app.config.get("MAX_WRITE_QUEUE")
+        if self.enabled:
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+
+    def _bucket(self, key, limit):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limit)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _reject(self, status, message, retry_after):
+        response = jsonify({"status": "error", "message": message})
+        response.status_code = status
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _before_request(self):
+        if request.method == "OPTIONS" or request.endpoint in (None, "static"):
+            return None
+
+        client = request.remote_addr or "unknown"
+        limits = []
+        if self.default_limit:
+            limits.append(((client, None), self.default_limit))
+        if request.endpoint in self.route_limits:
+            limits.append(
+                ((client, request.endpoint), self.route_limits[request.endpoint])
+            )
+
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._bucket(key, limit) for key, limit in limits]
+            wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+            if wait:
+                self.rate_limited += 1
+                return self._reject(429, "Rate limit exceeded", wait)
+
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return self._reject(503, "Server is busy, try again shortly", 1)
+
+            if self.max_write_queue and request.method in WRITE_METHODS:
+                from database.writer import writer
+
+                if writer.stats()["queue_depth"] >= self.max_write_queue:
+                    self.shed += 1
+                    return self._reject(503, "Write queue is full", 1)
+
+            # Only admitted requests consume tokens
+            for bucket in buckets:
+                bucket.tokens -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.admitted += 1
+        g.admitted = True
+        return None
+
+    def _teardown_request(self, e=None):
+        if g.pop("admitted", False):
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        """Report admission counters and the configured limits."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "shed": self.shed,
+                "clients_tracked": len(self._buckets),
+                "default_limit": self.default_limit,
+                "route_limits": self.route_limits,
+                "max_in_flight": self.max_in_flight,
+                "max_write_queue": self.max_write_queue,
+            }
+
+
+admission = AdmissionController()
+
+
+def init_app(app):
+    """Install admission control on the Flask app."""
+    admission.init_app(app)
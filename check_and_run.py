@@ -5,9 +5,19 @@ import sys
 import subprocess
 import venv
 import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 
+REQUIREMENTS_STAMP = Path("venv") / ".requirements.sha256"
+# Launching stops if one of these fails; failing checks are only reported
+REQUIRED_STEPS = [
+    "Setting up environment",
+    "Installing dependencies",
+    "Preparing database",
+]
+
 
 def run_command(command, error_msg=None):
     try:
@@ -42,72 +52,107 @@ def check_venv():
         sys.exit(1)
 
 
+def requirements_hash():
+    """Hash requirements.txt together with the Python version."""
+    digest = hashlib.sha256()
+    digest.update(Path("requirements.txt").read_bytes())
+    digest.update(f"{sys.version_info.major}.{sys.version_info.minor}".encode())
+    return digest.hexdigest()
+
+
 def check_requirements():
     if not os.path.exists("requirements.txt"):
         print("❌ requirements.txt not found")
         sys.exit(1)
 
-    print("📦 Installing packages...")
+    # Reinstalling is only needed when requirements.txt changed since the
+    # last successful install into this venv
+    current = requirements_hash()
+    if REQUIREMENTS_STAMP.exists() and REQUIREMENTS_STAMP.read_text() == current:
+        return "up to date"
+
     pip_path = get_venv_pip()
     if not run_command(
-        f"{pip_path} install -r requirements.txt", "Package installation failed"
+        f"{pip_path} install --disable-pip-version-check -r requirements.txt",
+        "Package installation failed",
     ):
         sys.exit(1)
+    REQUIREMENTS_STAMP.write_text(current)
+    return "installed"
 
 
 def check_database():
-    print("🗄️  Setting up database...")
     python_path = get_venv_python()
     if not run_command(
         f"{python_path} scripts/db_init.py init", "Database setup failed"
     ):
         sys.exit(1)
+    return "ready"
 
 
-def run_checks():
-    steps = ["Running tests", "Checking code style", "Formatting code"]
-    python_path = get_venv_python()
-    commands = [
-        f"{python_path} -m pytest",
-        f"{python_path} -m flake8",
-        f"{python_path} -m black .",
-    ]
+def timed(name, step):
+    started = time.perf_counter()
+    try:
+        result = step()
+    except SystemExit:
+        result = "failed"
+    return name, result, time.perf_counter() - started
+
+
+def run_parallel(steps, pbar):
+    """Run independent steps concurrently, reporting each as it finishes."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        futures = [pool.submit(timed, name, step) for name, step in steps]
+        for future in as_completed(futures):
+            name, result, elapsed = future.result()
+            results[name] = result
+            tqdm.write(f"   {name:<24} {result:<12} {elapsed:6.2f}s")
+            pbar.update(1)
+    return results
 
-    for step, cmd in zip(steps, commands):
-        with tqdm(
-            total=100,
-            desc=f"⚡ {step}",
-            bar_format="{desc:<30} |{bar:50}| {percentage:3.0f}% [{elapsed}<{remaining}]",
-            colour="red",
-        ) as pbar:
-            run_command(cmd)
-            for i in range(100):
-                time.sleep(0.01)
-                pbar.update(1)
+
+def check_command(command):
+    return lambda: "ok" if run_command(command) else "failed"
 
 
 def main():
     print("🎯 Starting Promptful...")
+    started = time.perf_counter()
+    python_path = get_venv_python()
 
-    tasks = ["Setting up environment", "Installing dependencies", "Preparing database"]
-    for task in tasks:
-        with tqdm(
-            total=100,
-            desc=f"🔄 {task}",
-            bar_format="{desc:<30} |{bar:50}| {percentage:3.0f}% [{elapsed}<{remaining}]",
-            colour="blue",
-        ) as pbar:
-            if "environment" in task:
-                check_venv()
-            elif "dependencies" in task:
-                check_requirements()
-            else:
-                check_database()
-            for i in range(100):
-                time.sleep(0.02)
-                pbar.update(1)
-
-    run_checks()
+    # The checks only need the venv and its packages; they are otherwise
+    # independent, except that flake8 should see the code black formatted.
+    waves = [
+        [("Setting up environment", lambda: check_venv() or "ready")],
+        [("Installing dependencies", check_requirements)],
+        [
+            ("Preparing database", check_database),
+            ("Formatting code", check_command(f"{python_path} -m black -q .")),
+        ],
+        [
+            ("Running tests", check_command(f"{python_path} -m pytest -q")),
+            (
+                "Checking code style",
+                check_command(
+                    f"{python_path} -m flake8 --extend-exclude venv,promptful-v2"
+                ),
+            ),
+        ],
+    ]
+    with tqdm(
+        total=sum(len(wave) for wave in waves),
+        desc="🔄 Bootstrapping",
+        bar_format="{desc:<30} |{bar:50}| {n_fmt}/{total_fmt} [{elapsed}]",
+        colour="blue",
+    ) as pbar:
+        results = {}
+        for wave in waves:
+            results.update(run_parallel(wave, pbar))
+            if any(results.get(name) == "failed" for name in REQUIRED_STEPS):
+                sys.exit(1)
+
+    print(f"✅ Ready in {time.perf_counter() - started:.1f}s")
 
     print("\n🚀 Launching application...")
     os.environ["FLASK_ENV"] = "development"
@@ -0,0 +1,113 @@
+import logging
+import functools
+import threading
+from flask import Response, current_app, request
+
+logger = logging.getLogger(__name__)
+
+# Followers give up waiting and run the view themselves after this long
+WAIT_TIMEOUT = 30
+
+
+class _Call:
+    __slots__ = ("done", "response")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None  # (body, status, headers) once shareable
+
+
+class Coalescer:
+    """Single-flight execution of identical concurrent GET requests.
+
+    The first request for a key runs the view; identical requests arriving
+    while it is in flight wait for it and are answered with a copy of its
+    serialised response. Streamed responses cannot be shared, so waiters
+    then run the view themselves.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._stats = {}
+
+    def _count(self, endpoint, outcome):
+        counts = self._stats.setdefault(
+            endpoint, {"executed": 0, "coalesced": 0, "fallback": 0}
+        )
+        counts[outcome] += 1
+
+    def _key(self, view_args):
+        from database.shards import current_workspace
+
+        # The workspace was picked by a before_request hook, which has run
+        # by the time a view (and so this wrapper) is called
+        return (
+            current_workspace(),
+            request.endpoint,
+            tuple(sorted(view_args.items())),
+            tuple(sorted(request.args.items(multi=True))),
+        )
+
+    def run(self, view, args, kwargs):
+        key = self._key(kwargs)
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+
+        if not leader:
+            call.done.wait(WAIT_TIMEOUT)
+            shared = call.response
+            with self._lock:
+                self._count(request.endpoint, "coalesced" if shared else "fallback")
+            if shared:
+                body, status, headers = shared
+                return Response(body, status=status, headers=headers)
+            return view(*args, **kwargs)
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+            if not response.is_streamed:
+                call.response = (
+                    response.get_data(),
+                    response.status_code,
+                    list(response.headers),
+                )
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                self._count(request.endpoint, "executed")
+            call.done.set()
+
+    def stats(self):
+        """Report executed vs coalesced requests per endpoint."""
+        with self._lock:
+            return {
+                "in_flight": len(self._in_flight),
+                "endpoints": {
+                    endpoint: dict(counts)
+                    for endpoint, counts in sorted(self._stats.items())
+                },
+            }
+
+
+coalescer = Coalescer()
+
+
+def coalesce(view):
+    """Share one in-flight execution among identical concurrent GETs.
+
+    Requests are identical when they hit the same endpoint in the same
+    workspace with the same URL arguments and query string (in any order).
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET":
+            return view(*args, **kwargs)
+        return coalescer.run(view, args, kwargs)
+
+    return wrapper
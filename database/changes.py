@@ -0,0 +1,192 @@
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Tasks, lists and tags live in one database whatever the workspace, so
+# their events go to every subscriber (with a null workspace)
+SHARED_ENTITIES = {"task", "list", "tag"}
+
+
+class _Subscriber:
+    __slots__ = ("workspace", "queue", "overflowed")
+
+    def __init__(self, workspace, size):
+        self.workspace = workspace
+        self.queue = queue.Queue(maxsize=size)
+        self.overflowed = False
+
+
+class ChangeBroker:
+    """In-process fan-out of change events to Server-Sent Event streams.
+
+    db.py publishes a compact event after each prompt, task, list or tag
+    write; every event gets the next id and is kept in a replay buffer of
+    the last ``CHANGE_REPLAY_SIZE`` events, then copied to each subscriber
+    of its workspace, or to all subscribers when its workspace is None.
+    A client reconnecting with ``Last-Event-ID`` is sent what it missed
+    from the buffer, or a ``reset`` event telling it to reload when the
+    buffer no longer reaches back that far (or the server restarted,
+    which the id's epoch prefix shows).
+
+    A subscriber that falls ``CHANGE_QUEUE_SIZE`` events behind is dropped;
+    its stream ends and the client resumes from the buffer. Only writes
+    made by this process are seen, so run a single worker process (with
+    threads) when clients rely on the stream.
+    """
+
+    def __init__(self):
+        self.epoch = str(int(time.time()))
+        self.replay_size = 1000
+        self.queue_size = 256
+        self.heartbeat = 15
+        self.max_subscribers = 100
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=self.replay_size)
+        self._subscribers = set()
+        self._last_id = 0
+        self.published = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.replay_size = app.config.get("CHANGE_REPLAY_SIZE", 1000)
+        self.queue_size = app.config.get("CHANGE_QUEUE_SIZE", 256)
+        self.heartbeat = app.config.get("CHANGE_HEARTBEAT", 15)
+        self.max_subscribers = app.config.get("MAX_CHANGE_SUBSCRIBERS", 100)
+        self._buffer = deque(self._buffer, maxlen=self.replay_size)
+
+    def publish(self, workspace, entity, action, entity_id=None, **data):
+        with self._lock:
+            self._last_id += 1
+            event = {
+                "id": f"{self.epoch}:{self._last_id}",
+                "seq": self._last_id,
+                "workspace": workspace,
+                "entity": entity,
+                "action": action,
+                "entity_id": entity_id,
+                "at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+                **data,
+            }
+            self._buffer.append(event)
+            self.published += 1
+            for subscriber in list(self._subscribers):
+                if workspace is not None and subscriber.workspace != workspace:
+                    continue
+                try:
+                    subscriber.queue.put_nowait(event)
+                except queue.Full:
+                    subscriber.overflowed = True
+                    self._subscribers.discard(subscriber)
+                    self.dropped += 1
+
+    def _missed(self, last_event_id, workspace):
+        """Buffered events after ``last_event_id``, or None if there is a gap."""
+        epoch, _, seq = (last_event_id or "").partition(":")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._last_id:
+            return None
+        if seq < self._last_id and (
+            not self._buffer or self._buffer[0]["seq"] > seq + 1
+        ):
+            return None
+        return [
+            event
+            for event in self._buffer
+            if event["seq"] > seq and event["workspace"] in (workspace, None)
+        ]
+
+    def subscribe(self, workspace, last_event_id=None):
+        """Register a subscriber; returns it with the events to send first.
+
+        Those are the missed events, or a single ``reset`` event when the
+        client is resuming across a gap. Raises OverflowError at
+        ``MAX_CHANGE_SUBSCRIBERS``.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise OverflowError("Too many change stream subscribers")
+            replay = []
+            if last_event_id:
+                replay = self._missed(last_event_id, workspace)
+                if replay is None:
+                    replay = [
+                        {
+                            "id": f"{self.epoch}:{self._last_id}",
+                            "seq": self._last_id,
+                            "action": "reset",
+                        }
+                    ]
+            subscriber = _Subscriber(workspace, self.queue_size)
+            self._subscribers.add(subscriber)
+        return subscriber, replay
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber, replay):
+        """Yield the Server-Sent Events text of a subscription.
+
+        A comment line is sent every ``heartbeat`` seconds without events,
+        which keeps proxies from closing the connection and lets the server
+        notice clients that went away.
+        """
+        try:
+            yield "retry: 3000\n\n"
+            for event in replay:
+                yield self._format(event)
+            while not subscriber.overflowed or not subscriber.queue.empty():
+                try:
+                    event = subscriber.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield self._format(event)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _format(self, event):
+        kind = "reset" if event["action"] == "reset" else "change"
+        data = {key: value for key, value in event.items() if key != "seq"}
+        return f"id: {event['id']}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "published": self.published,
+                "dropped_subscribers": self.dropped,
+                "last_event_id": f"{self.epoch}:{self._last_id}",
+                "buffered": len(self._buffer),
+                "replay_size": self.replay_size,
+            }
+
+
+broker = ChangeBroker()
+
+
+def init_app(app):
+    """Configure the change stream from the Flask app."""
+    broker.init_app(app)
+
+
+def publish(entity, action, entity_id=None, **data):
+    """Announce a committed write to the change stream subscribers.
+
+    Called from write operations after ``commit()``; on a writer thread
+    the event is held back until the group commit has succeeded.
+    """
+    from database.shards import current_workspace
+    from database.writer import after_commit
+
+    workspace = None if entity in SHARED_ENTITIES else current_workspace()
+    after_commit(lambda: broker.publish(workspace, entity, action, entity_id, **data))
@@ -1,14 +1,21 @@
 import sqlite3
+import hashlib
 import json
 import os
+import threading
 from pathlib import Path
-from flask import current_app, g
-from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from datetime import datetime, date, timedelta
 import logging
 from flask_sqlalchemy import SQLAlchemy
+from database.writer import after_commit, write_operation
 
 logger = logging.getLogger(__name__)
 
+# Tasks, lists and tags live in their own database (SQLALCHEMY_DATABASE_URI)
+# behind the models in database/models.py; prompts use sqlite3 directly
+db = SQLAlchemy()
+
 
 class DatabaseError(Exception):
     """Custom exception for database errors."""
@@ -16,15 +23,38 @@ class DatabaseError(Exception):
     pass
 
 
+def _read_only_request():
+    """Whether the current request should use a read-only connection."""
+    return (
+        current_app.config.get("READ_ONLY_CONNECTIONS", False)
+        and has_request_context()
+        and request.method in ("GET", "HEAD")
+    )
+
+
 def get_db():
     """Connect to the application's configured database."""
     if "db" not in g:
         try:
+            from database.shards import shard_path
+
             # Ensure the instance folder exists
-            db_path = current_app.config["DATABASE"]
+            db_path = shard_path()
             os.makedirs(os.path.dirname(db_path), exist_ok=True)
             logger.debug(f"Using database at: {db_path}")
 
+            if _read_only_request():
+                # Reads never queue behind the writer thread; writes made
+                # during a GET still go through write_operation functions
+                g.db = sqlite3.connect(
+                    f"file:{os.path.abspath(db_path)}?mode=ro",
+                    uri=True,
+                    detect_types=sqlite3.PARSE_DECLTYPES,
+                    timeout=20,
+                )
+                g.db.row_factory = sqlite3.Row
+                return g.db
+
             g.db = sqlite3.connect(
                 db_path,
                 detect_types=sqlite3.PARSE_DECLTYPES,
@@ -96,9 +126,224 @@ def init_db():
         raise DatabaseError(f"Unexpected error during initialization: {e}")
 
 
+# Schema Migrations
+
+# Fresh databases get this version from schema.sql; older files are upgraded
+# step by step by migrate_db() using the MIGRATIONS list below.
+SCHEMA_VERSION = 7
+
+
+def _migrate_prompt_blobs(db):
+    """Move inline prompt bodies into the content-addressed blob table."""
+    columns = [row["name"] for row in db.execute("PRAGMA table_info(prompts)")]
+    if "content_hash" in columns:
+        return
+
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS prompt_blobs (
+               hash TEXT PRIMARY KEY,
+               content TEXT NOT NULL,
+               size INTEGER NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+    db.execute(
+        """CREATE TABLE prompts_new (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               prompt_name TEXT NOT NULL,
+               ai_selection TEXT NOT NULL,
+               content_hash TEXT NOT NULL REFERENCES prompt_blobs(hash),
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+           )"""
+    )
+
+    cursor = db.execute(
+        """SELECT id, prompt_name, ai_selection, prompt_content, created_at, updated_at
+           FROM prompts"""
+    )
+    while True:
+        rows = cursor.fetchmany(500)
+        if not rows:
+            break
+        db.executemany(
+            """INSERT INTO prompts_new
+                   (id, prompt_name, ai_selection, content_hash, created_at, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    row["id"],
+                    row["prompt_name"],
+                    row["ai_selection"],
+                    _store_blob(db, row["prompt_content"]),
+                    row["created_at"],
+                    row["updated_at"],
+                )
+                for row in rows
+            ],
+        )
+
+    db.execute("DROP TABLE prompts")
+    db.execute("ALTER TABLE prompts_new RENAME TO prompts")
+    db.execute("CREATE INDEX idx_prompts_content_hash ON prompts(content_hash)")
+    db.execute(
+        """CREATE TRIGGER IF NOT EXISTS update_prompt_timestamp
+           AFTER UPDATE ON prompts
+           BEGIN
+               UPDATE prompts SET updated_at = CURRENT_TIMESTAMP
+               WHERE id = NEW.id;
+           END"""
+    )
+
+
+def _migrate_prompt_versions(db):
+    """Add the delta-compressed prompt version history table."""
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS prompt_versions (
+               prompt_id INTEGER NOT NULL REFERENCES prompts(id) ON DELETE CASCADE,
+               version INTEGER NOT NULL,
+               prompt_name TEXT NOT NULL,
+               ai_selection TEXT NOT NULL,
+               content_hash TEXT REFERENCES prompt_blobs(hash),
+               delta TEXT,
+               size INTEGER NOT NULL,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY (prompt_id, version)
+           )"""
+    )
+    db.execute(
+        """CREATE INDEX IF NOT EXISTS idx_prompt_versions_content_hash
+           ON prompt_versions(content_hash)"""
+    )
+
+
+def _migrate_minhash(db):
+    """Add MinHash signature and LSH bucket tables for near-duplicate checks.
+
+    Existing bodies are signed lazily by minhash.backfill_signatures().
+    """
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS blob_minhash (
+               hash TEXT PRIMARY KEY REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+               signature BLOB NOT NULL
+           )"""
+    )
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS blob_lsh (
+               band INTEGER NOT NULL,
+               bucket INTEGER NOT NULL,
+               hash TEXT NOT NULL REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+               PRIMARY KEY (band, bucket, hash)
+           ) WITHOUT ROWID"""
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_blob_lsh_hash ON blob_lsh(hash)")
+
+
+def _migrate_jobs(db):
+    """Add the persistent background job table."""
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS jobs (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               kind TEXT NOT NULL,
+               status TEXT NOT NULL DEFAULT 'queued',
+               params TEXT NOT NULL DEFAULT '{}',
+               progress REAL NOT NULL DEFAULT 0,
+               message TEXT,
+               result TEXT,
+               error TEXT,
+               cancel_requested INTEGER NOT NULL DEFAULT 0,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               started_at TIMESTAMP,
+               finished_at TIMESTAMP
+           )"""
+    )
+    db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+
+def _migrate_prompt_usage(db):
+    """Add server-side prompt usage counters."""
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS prompt_usage (
+               prompt_id INTEGER PRIMARY KEY REFERENCES prompts(id) ON DELETE CASCADE,
+               copy_count INTEGER NOT NULL DEFAULT 0,
+               render_count INTEGER NOT NULL DEFAULT 0,
+               use_count INTEGER NOT NULL DEFAULT 0,
+               last_used_at TIMESTAMP
+           )"""
+    )
+    db.execute(
+        """CREATE INDEX IF NOT EXISTS idx_prompt_usage_use_count
+           ON prompt_usage(use_count DESC)"""
+    )
+
+
+def _migrate_drop_timestamp_trigger(db):
+    """Drop the trigger that re-updated updated_at after every prompt write.
+
+    Writers now set updated_at in the same statement, so the trigger only
+    doubled the work of each update.
+    """
+    db.execute("DROP TRIGGER IF EXISTS update_prompt_timestamp")
+
+
+def _migrate_prompt_metadata(db):
+    """Add precomputed counts and the variables side table to blobs."""
+    columns = [row["name"] for row in db.execute("PRAGMA table_info(prompt_blobs)")]
+    for column in ("char_count", "word_count", "token_estimate"):
+        if column not in columns:
+            db.execute(f"ALTER TABLE prompt_blobs ADD COLUMN {column} INTEGER")
+    for column in ("char_count", "word_count", "token_estimate"):
+        db.execute(
+            f"""CREATE INDEX IF NOT EXISTS idx_prompt_blobs_{column}
+                ON prompt_blobs({column})"""
+        )
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS blob_variables (
+               name TEXT NOT NULL,
+               hash TEXT NOT NULL REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+               PRIMARY KEY (name, hash)
+           ) WITHOUT ROWID"""
+    )
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_blob_variables_hash ON blob_variables(hash)"
+    )
+
+
+MIGRATIONS = [
+    (1, _migrate_prompt_blobs),
+    (2, _migrate_prompt_versions),
+    (3, _migrate_minhash),
+    (4, _migrate_jobs),
+    (5, _migrate_prompt_usage),
+    (6, _migrate_drop_timestamp_trigger),
+    (7, _migrate_prompt_metadata),
+]
+
+
+def migrate_db(db=None):
+    """Apply any pending schema migrations to an existing database."""
+    db = db if db is not None else get_db()
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        try:
+            db.execute("BEGIN")
+            migration(db)
+            db.execute(f"PRAGMA user_version = {target}")
+            db.commit()
+            logger.info(f"Migrated database to schema version {target}")
+        except sqlite3.Error as e:
+            logger.error(f"Database migration to version {target} failed: {e}")
+            db.rollback()
+            raise DatabaseError(f"Failed to migrate database: {e}")
+
+
 def init_app(app):
     """Register database functions with the Flask app."""
     app.teardown_appcontext(close_db)
+    _init_task_db(app)
 
     # Ensure the database exists and is initialized
     with app.app_context():
@@ -112,6 +357,8 @@ def init_app(app):
             if "prompts" not in tables:
                 logger.warning("Required tables missing, initializing database...")
                 init_db()
+            else:
+                migrate_db(db)
 
             # Verify database functionality
             cursor.execute("SELECT 1")
@@ -122,9 +369,109 @@ def init_app(app):
             raise DatabaseError(f"Database initialization failed: {e}")
 
 
-# Prompt CRUD Operations
+def _init_task_db(app):
+    """Bind the task models to the app and create any missing tables.
+
+    A task_closure table created here for an existing task database is
+    filled from Task.parent_id, so subtask writes work straight away.
+    """
+    from sqlalchemy import inspect
+    from database import models  # noqa: F401 (registers the models)
+
+    db.init_app(app)
+    with app.app_context():
+        url = db.engine.url
+        if url.get_backend_name() == "sqlite" and url.database:
+            os.makedirs(os.path.dirname(os.path.abspath(url.database)), exist_ok=True)
+        existing = set(inspect(db.engine).get_table_names())
+        db.create_all()
+        # create_all skips tables that exist, including their new indexes
+        for table in db.metadata.sorted_tables:
+            if table.name in existing:
+                for index in table.indexes:
+                    index.create(db.engine, checkfirst=True)
+        if "tasks" in existing and "task_closure" not in existing:
+            logger.info("Building task_closure for the existing tasks")
+            rebuild_task_tree()
 
 
+# Prompt CRUD Operations
+
+# Prompts reference their body through the content-addressed prompt_blobs
+# table; every read joins it back in so callers still see prompt_content.
+PROMPT_SELECT = """SELECT p.id, p.prompt_name, p.ai_selection, p.content_hash,
+                          b.content AS prompt_content, p.created_at, p.updated_at,
+                          b.char_count, b.word_count, b.token_estimate
+                   FROM prompts p
+                   JOIN prompt_blobs b ON b.hash = p.content_hash"""
+
+
+def _prompt_to_dict(prompt):
+    """Convert a prompt row into the dictionary returned by the API."""
+    return {
+        "id": prompt["id"],
+        "prompt_name": prompt["prompt_name"],
+        "ai_selection": json.loads(prompt["ai_selection"]),
+        "prompt_content": prompt["prompt_content"],
+        "created_at": prompt["created_at"],
+        "updated_at": prompt["updated_at"],
+        "char_count": prompt["char_count"],
+        "word_count": prompt["word_count"],
+        "token_estimate": prompt["token_estimate"],
+    }
+
+
+# Updates that turn out to be no-ops skip the write entirely; these counters
+# show how many writes that saved in this process.
+_update_stats = {
+    "prompt_updates": 0,
+    "prompt_writes_avoided": 0,
+    "task_updates": 0,
+    "task_writes_avoided": 0,
+}
+_update_stats_lock = threading.Lock()
+
+
+def _count_update(kind, changed):
+    with _update_stats_lock:
+        _update_stats[f"{kind}_updates"] += 1
+        if not changed:
+            _update_stats[f"{kind}_writes_avoided"] += 1
+
+
+def get_update_stats():
+    """Get update counts and how many of them were skipped as no-ops."""
+    with _update_stats_lock:
+        return dict(_update_stats)
+
+
+def content_hash(content):
+    """Return the content address (SHA-256 hex digest) of a prompt body."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _store_blob(db, content):
+    """Store a prompt body unless an identical one exists; return its hash."""
+    digest = content_hash(content)
+    db.execute(
+        "INSERT OR IGNORE INTO prompt_blobs (hash, content, size) VALUES (?, ?, ?)",
+        (digest, content, len(content.encode("utf-8"))),
+    )
+    return digest
+
+
+def _release_blob(db, digest):
+    """Delete a blob once no prompt or version snapshot references it."""
+    db.execute(
+        """DELETE FROM prompt_blobs
+           WHERE hash = ?
+             AND NOT EXISTS (SELECT 1 FROM prompts WHERE content_hash = ?)
+             AND NOT EXISTS (SELECT 1 FROM prompt_versions WHERE content_hash = ?)""",
+        (digest, digest, digest),
+    )
+
+
+@write_operation
 def create_prompt(prompt_name, ai_selection, prompt_content):
     """Create a new prompt."""
     if not prompt_name or not prompt_content:
@@ -133,15 +480,38 @@ def create_prompt(prompt_name, ai_selection, prompt_content):
     if not isinstance(ai_selection, (list, dict)):
         raise ValueError("AI selection must be a list or dictionary")
 
+    from database.changes import publish
+    from database.metadata import index_metadata
+    from database.minhash import index_signature
+    from database.similarity import similarity_index
+    from database.trigram import name_index
+    from database.versions import record_version
+
     db = get_db()
     try:
+        digest = _store_blob(db, prompt_content)
+        index_signature(db, digest, prompt_content)
+        index_metadata(db, digest, prompt_content)
         cursor = db.execute(
-            "INSERT INTO prompts (prompt_name, ai_selection, prompt_content) VALUES (?, ?, ?)",
-            (prompt_name, json.dumps(ai_selection), prompt_content),
+            "INSERT INTO prompts (prompt_name, ai_selection, content_hash) VALUES (?, ?, ?)",
+            (prompt_name, json.dumps(ai_selection), digest),
+        )
+        record_version(
+            db,
+            cursor.lastrowid,
+            prompt_name,
+            json.dumps(ai_selection),
+            prompt_content,
+            previous=None,
         )
         db.commit()
-        logger.debug(f"Created new prompt with ID: {cursor.lastrowid}")
-        return cursor.lastrowid
+        prompt_id = cursor.lastrowid
+        # The in-memory indexes must not get ahead of the batch's COMMIT
+        after_commit(lambda: name_index.add("prompt", prompt_id, prompt_name))
+        after_commit(lambda: similarity_index.add(prompt_id, prompt_content, digest))
+        publish("prompt", "created", prompt_id, prompt_name=prompt_name)
+        logger.debug(f"Created new prompt with ID: {prompt_id}")
+        return prompt_id
     except sqlite3.IntegrityError as e:
         logger.error(f"Integrity error in create_prompt: {e}")
         db.rollback()
@@ -152,27 +522,122 @@ def create_prompt(prompt_name, ai_selection, prompt_content):
         raise DatabaseError(f"Database error while creating prompt: {e}")
 
 
+@write_operation
+def import_prompts(prompts, skip_existing=True, near_duplicates=None):
+    """Bulk-import prompts in a single transaction.
+
+    Each item is a dict with ``prompt_name``, ``prompt_content`` and an
+    optional ``ai_selection``. Bodies whose hash is already stored are not
+    written again, and with ``skip_existing`` a prompt whose name and body
+    both match an existing prompt is skipped entirely.
+
+    ``near_duplicates`` checks every row against the MinHash LSH index
+    (including rows imported earlier in the same batch): ``"flag"`` imports
+    the row and reports its matches, ``"skip"`` merges it into the existing
+    prompt by not importing it.
+    """
+    from database.changes import publish
+    from database.metadata import index_metadata
+    from database.minhash import index_signature, near_duplicates as find_matches
+    from database.similarity import similarity_index
+    from database.trigram import name_index
+
+    if near_duplicates not in (None, "flag", "skip"):
+        raise ValueError("near_duplicates must be 'flag' or 'skip'")
+
+    db = get_db()
+    created = []
+    stats = {"created": 0, "skipped": 0, "blobs_created": 0, "blobs_reused": 0}
+    if near_duplicates:
+        stats["near_duplicates"] = []
+    try:
+        # Lookups go by primary key and the content_hash index, one row at a
+        # time, so a chunked import job does not reread whole tables per
+        # chunk; rows written earlier in this call are seen the same way
+        for item in prompts:
+            prompt_name = item.get("prompt_name")
+            prompt_content = item.get("prompt_content")
+            ai_selection = item.get("ai_selection", [])
+            if not prompt_name or not prompt_content:
+                raise ValueError("Prompt name and content are required")
+            if not isinstance(ai_selection, (list, dict)):
+                raise ValueError("AI selection must be a list or dictionary")
+
+            digest = content_hash(prompt_content)
+            if (
+                skip_existing
+                and db.execute(
+                    "SELECT 1 FROM prompts WHERE content_hash = ? AND prompt_name = ?",
+                    (digest, prompt_name),
+                ).fetchone()
+            ):
+                stats["skipped"] += 1
+                continue
+
+            if near_duplicates:
+                matches = find_matches(db, prompt_content)
+                if matches:
+                    stats["near_duplicates"].append(
+                        {"prompt_name": prompt_name, "matches": matches[:5]}
+                    )
+                    if near_duplicates == "skip":
+                        stats["skipped"] += 1
+                        continue
+
+            if db.execute(
+                "SELECT 1 FROM prompt_blobs WHERE hash = ?", (digest,)
+            ).fetchone():
+                stats["blobs_reused"] += 1
+            else:
+                db.execute(
+                    "INSERT INTO prompt_blobs (hash, content, size) VALUES (?, ?, ?)",
+                    (digest, prompt_content, len(prompt_content.encode("utf-8"))),
+                )
+                stats["blobs_created"] += 1
+            index_signature(db, digest, prompt_content)
+            index_metadata(db, digest, prompt_content)
+
+            cursor = db.execute(
+                "INSERT INTO prompts (prompt_name, ai_selection, content_hash) VALUES (?, ?, ?)",
+                (prompt_name, json.dumps(ai_selection), digest),
+            )
+            created.append((cursor.lastrowid, prompt_name, prompt_content, digest))
+            stats["created"] += 1
+
+        db.commit()
+
+        def index_created():
+            for prompt_id, prompt_name, prompt_content, digest in created:
+                name_index.add("prompt", prompt_id, prompt_name)
+                similarity_index.add(prompt_id, prompt_content, digest)
+
+        after_commit(index_created)
+        if created:
+            # One event for the batch; clients reload the collection
+            publish("prompt", "imported", count=len(created))
+        logger.info(f"Imported {stats['created']} prompts, skipped {stats['skipped']}")
+        return stats
+    except ValueError:
+        db.rollback()
+        raise
+    except sqlite3.Error as e:
+        logger.error(f"Database error in import_prompts: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to import prompts: {e}")
+
+
 def get_prompt(id):
     """Get a prompt by ID."""
     if not isinstance(id, int):
         raise ValueError("Prompt ID must be an integer")
 
     try:
-        prompt = (
-            get_db().execute("SELECT * FROM prompts WHERE id = ?", (id,)).fetchone()
-        )
+        prompt = get_db().execute(f"{PROMPT_SELECT} WHERE p.id = ?", (id,)).fetchone()
 
         if prompt is None:
             return None
 
-        return {
-            "id": prompt["id"],
-            "prompt_name": prompt["prompt_name"],
-            "ai_selection": json.loads(prompt["ai_selection"]),
-            "prompt_content": prompt["prompt_content"],
-            "created_at": prompt["created_at"],
-            "updated_at": prompt["updated_at"],
-        }
+        return _prompt_to_dict(prompt)
     except sqlite3.Error as e:
         logger.error(f"Database error in get_prompt: {e}")
         raise DatabaseError(f"Failed to retrieve prompt: {e}")
@@ -185,22 +650,10 @@ def get_all_prompts():
     """Get all prompts."""
     try:
         prompts = (
-            get_db()
-            .execute("SELECT * FROM prompts ORDER BY created_at DESC")
-            .fetchall()
+            get_db().execute(f"{PROMPT_SELECT} ORDER BY p.created_at DESC").fetchall()
         )
 
-        return [
-            {
-                "id": prompt["id"],
-                "prompt_name": prompt["prompt_name"],
-                "ai_selection": json.loads(prompt["ai_selection"]),
-                "prompt_content": prompt["prompt_content"],
-                "created_at": prompt["created_at"],
-                "updated_at": prompt["updated_at"],
-            }
-            for prompt in prompts
-        ]
+        return [_prompt_to_dict(prompt) for prompt in prompts]
     except sqlite3.Error as e:
         logger.error(f"Database error in get_all_prompts: {e}")
         raise DatabaseError(f"Failed to retrieve prompts: {e}")
@@ -209,57 +662,190 @@ def get_all_prompts():
         raise DatabaseError(f"Invalid AI selection data in database: {e}")
 
 
+def iter_prompts(batch_size=500):
+    """Yield all prompts, newest first, fetching ``batch_size`` rows at a time.
+
+    Unlike :func:`get_all_prompts` the full list is never built, so callers
+    streaming a response keep memory flat however large the library is.
+    """
+    try:
+        cursor = get_db().execute(f"{PROMPT_SELECT} ORDER BY p.created_at DESC")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for prompt in rows:
+                yield _prompt_to_dict(prompt)
+    except sqlite3.Error as e:
+        logger.error(f"Database error in iter_prompts: {e}")
+        raise DatabaseError(f"Failed to retrieve prompts: {e}")
+
+
+@write_operation
 def update_prompt(id, prompt_name, ai_selection, prompt_content):
     """Update a prompt."""
+    if not prompt_name or not prompt_content:
+        raise ValueError("Prompt name and content are required")
+
+    patch_prompt(
+        id,
+        prompt_name=prompt_name,
+        ai_selection=ai_selection,
+        prompt_content=prompt_content,
+    )
+    return True
+
+
+@write_operation
+def patch_prompt(id, **changes):
+    """Apply a partial update to a prompt.
+
+    Only fields that differ from the stored values are written, in a single
+    UPDATE that also bumps ``updated_at``; when nothing differs no write
+    happens at all. Returns whether the prompt changed.
+    """
     if not isinstance(id, int):
         raise ValueError("Prompt ID must be an integer")
 
-    if not prompt_name or not prompt_content:
-        raise ValueError("Prompt name and content are required")
+    unknown = set(changes) - {"prompt_name", "ai_selection", "prompt_content"}
+    if unknown:
+        raise ValueError(f"Unknown prompt fields: {', '.join(sorted(unknown))}")
 
-    if not isinstance(ai_selection, (list, dict)):
+    if "prompt_name" in changes and not changes["prompt_name"]:
+        raise ValueError("Prompt name cannot be empty")
+
+    if "prompt_content" in changes and not changes["prompt_content"]:
+        raise ValueError("Prompt content cannot be empty")
+
+    if "ai_selection" in changes and not isinstance(
+        changes["ai_selection"], (list, dict)
+    ):
         raise ValueError("AI selection must be a list or dictionary")
 
+    from database.changes import publish
+    from database.metadata import index_metadata
+    from database.minhash import index_signature
+    from database.similarity import similarity_index
+    from database.trigram import name_index
+    from database.versions import ensure_base_version, record_version
+
     db = get_db()
     try:
-        cursor = db.execute(
-            """UPDATE prompts 
-               SET prompt_name = ?,
-                   ai_selection = ?,
-                   prompt_content = ?,
-                   updated_at = CURRENT_TIMESTAMP
-               WHERE id = ?""",
-            (prompt_name, json.dumps(ai_selection), prompt_content, id),
-        )
-        db.commit()
-
-        if cursor.rowcount == 0:
+        current = db.execute(
+            """SELECT p.prompt_name, p.ai_selection, p.content_hash, b.content
+               FROM prompts p
+               JOIN prompt_blobs b ON b.hash = p.content_hash
+               WHERE p.id = ?""",
+            (id,),
+        ).fetchone()
+        if current is None:
             raise DatabaseError(f"No prompt found with ID {id}")
 
-        return True
+        prompt_name = changes.get("prompt_name", current["prompt_name"])
+        ai_selection = (
+            json.dumps(changes["ai_selection"])
+            if "ai_selection" in changes
+            else current["ai_selection"]
+        )
+        prompt_content = changes.get("prompt_content", current["content"])
+
+        columns = {}
+        if prompt_name != current["prompt_name"]:
+            columns["prompt_name"] = prompt_name
+        if ai_selection != current["ai_selection"]:
+            columns["ai_selection"] = ai_selection
+        if prompt_content != current["content"]:
+            digest = _store_blob(db, prompt_content)
+            index_signature(db, digest, prompt_content)
+            index_metadata(db, digest, prompt_content)
+            columns["content_hash"] = digest
+
+        if not columns:
+            _count_update("prompt", changed=False)
+            return False
+
+        ensure_base_version(db, id)
+        record_version(
+            db,
+            id,
+            prompt_name,
+            ai_selection,
+            prompt_content,
+            previous=current["content"],
+        )
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        db.execute(
+            f"""UPDATE prompts
+                SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?""",
+            (*columns.values(), id),
+        )
+        if "content_hash" in columns:
+            _release_blob(db, current["content_hash"])
+        db.commit()
     except sqlite3.IntegrityError as e:
-        logger.error(f"Integrity error in update_prompt: {e}")
+        logger.error(f"Integrity error in patch_prompt: {e}")
         db.rollback()
         raise DatabaseError(f"Failed to update prompt: {e}")
     except sqlite3.Error as e:
-        logger.error(f"Database error in update_prompt: {e}")
+        logger.error(f"Database error in patch_prompt: {e}")
         db.rollback()
         raise DatabaseError(f"Database error while updating prompt: {e}")
 
-
+    _count_update("prompt", changed=True)
+    publish(
+        "prompt",
+        "updated",
+        id,
+        fields=sorted(
+            "prompt_content" if column == "content_hash" else column
+            for column in columns
+        ),
+    )
+    if "prompt_name" in columns:
+        after_commit(lambda: name_index.add("prompt", id, prompt_name))
+    if "content_hash" in columns:
+        digest = columns["content_hash"]
+        after_commit(lambda: similarity_index.add(id, prompt_content, digest))
+    return True
+
+
+@write_operation
 def delete_prompt(id):
     """Delete a prompt."""
+    from database.changes import publish
+    from database.similarity import similarity_index
+    from database.trigram import name_index
+
     if not isinstance(id, int):
         raise ValueError("Prompt ID must be an integer")
 
     db = get_db()
     try:
-        cursor = db.execute("DELETE FROM prompts WHERE id = ?", (id,))
-        db.commit()
-
-        if cursor.rowcount == 0:
+        current = db.execute(
+            "SELECT content_hash FROM prompts WHERE id = ?", (id,)
+        ).fetchone()
+        if current is None:
             raise DatabaseError(f"No prompt found with ID {id}")
 
+        # Version rows go with the prompt (ON DELETE CASCADE), so any
+        # snapshot blobs they pinned may be collectable now as well
+        snapshots = [
+            row["content_hash"]
+            for row in db.execute(
+                """SELECT DISTINCT content_hash FROM prompt_versions
+                   WHERE prompt_id = ? AND content_hash IS NOT NULL""",
+                (id,),
+            )
+        ]
+        db.execute("DELETE FROM prompts WHERE id = ?", (id,))
+        for digest in {current["content_hash"], *snapshots}:
+            _release_blob(db, digest)
+        db.commit()
+        after_commit(lambda: name_index.remove("prompt", id))
+        after_commit(lambda: similarity_index.remove(id))
+        publish("prompt", "deleted", id)
+
         return True
     except sqlite3.Error as e:
         logger.error(f"Database error in delete_prompt: {e}")
@@ -267,42 +853,150 @@ def delete_prompt(id):
         raise DatabaseError(f"Failed to delete prompt: {e}")
 
 
+# Prompt Blob Storage
+
+
+@write_operation
+def gc_prompt_blobs():
+    """Delete every blob no longer referenced by a prompt or a version."""
+    unreferenced = """hash NOT IN (SELECT content_hash FROM prompts)
+                      AND hash NOT IN (SELECT content_hash FROM prompt_versions
+                                       WHERE content_hash IS NOT NULL)"""
+    db = get_db()
+    try:
+        freed = db.execute(
+            f"""SELECT COUNT(*) AS blobs, COALESCE(SUM(size), 0) AS bytes
+                FROM prompt_blobs WHERE {unreferenced}"""
+        ).fetchone()
+        db.execute(f"DELETE FROM prompt_blobs WHERE {unreferenced}")
+        db.commit()
+        logger.info(
+            f"Garbage-collected {freed['blobs']} prompt blobs ({freed['bytes']} bytes)"
+        )
+        return {"blobs_deleted": freed["blobs"], "bytes_freed": freed["bytes"]}
+    except sqlite3.Error as e:
+        logger.error(f"Database error in gc_prompt_blobs: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to garbage-collect prompt blobs: {e}")
+
+
+def get_blob_stats():
+    """Report how much storage content deduplication is saving.
+
+    Logical bytes count every reference to a body: current prompt content
+    plus version history snapshots.
+    """
+    try:
+        stats = (
+            get_db()
+            .execute(
+                """SELECT
+                       (SELECT COUNT(*) FROM prompts) AS prompts,
+                       (SELECT COUNT(*) FROM prompt_blobs) AS blobs,
+                       (SELECT COALESCE(SUM(b.size), 0)
+                          FROM prompts p
+                          JOIN prompt_blobs b ON b.hash = p.content_hash)
+                       + (SELECT COALESCE(SUM(size), 0)
+                          FROM prompt_versions
+                          WHERE content_hash IS NOT NULL) AS logical_bytes,
+                       (SELECT COALESCE(SUM(size), 0) FROM prompt_blobs) AS stored_bytes"""
+            )
+            .fetchone()
+        )
+        logical_bytes = stats["logical_bytes"]
+        stored_bytes = stats["stored_bytes"]
+        return {
+            "prompts": stats["prompts"],
+            "blobs": stats["blobs"],
+            "logical_bytes": logical_bytes,
+            "stored_bytes": stored_bytes,
+            "bytes_saved": max(logical_bytes - stored_bytes, 0),
+            "dedup_ratio": (
+                round(logical_bytes / stored_bytes, 3) if stored_bytes else 1.0
+            ),
+        }
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_blob_stats: {e}")
+        raise DatabaseError(f"Failed to retrieve blob stats: {e}")
+
+
 # Search and Filter Operations
 
 
-def search_prompts(search_term=None, ai_filter=None):
-    """Search prompts by name and/or AI selection."""
+PROMPT_SORTS = {
+    "created": "p.created_at DESC",
+    "name": "p.prompt_name",
+    "tokens": "b.token_estimate",
+    "-tokens": "b.token_estimate DESC",
+    "chars": "b.char_count",
+    "-chars": "b.char_count DESC",
+    "words": "b.word_count",
+    "-words": "b.word_count DESC",
+}
+
+
+def search_prompts(
+    search_term=None,
+    ai_filter=None,
+    variable=None,
+    min_tokens=None,
+    max_tokens=None,
+    sort="created",
+):
+    """Search prompts by name, AI selection, variable and token estimate.
+
+    Variable and size filters and sorts use the precomputed metadata and
+    its indexes instead of parsing prompt bodies.
+    """
+    if sort not in PROMPT_SORTS:
+        raise ValueError(f"Sort must be one of: {', '.join(PROMPT_SORTS)}")
+
+    if (
+        variable
+        or min_tokens is not None
+        or max_tokens is not None
+        or sort != "created"
+    ):
+        from database.metadata import backfill_metadata, metadata_pending
+
+        if metadata_pending():
+            backfill_metadata()
+
     db = get_db()
-    query = "SELECT * FROM prompts"
+    query = PROMPT_SELECT
     params = []
     conditions = []
 
     if search_term:
-        conditions.append("prompt_name LIKE ?")
+        conditions.append("p.prompt_name LIKE ?")
         params.append(f"%{search_term}%")
 
     if ai_filter:
-        conditions.append("ai_selection LIKE ?")
+        conditions.append("p.ai_selection LIKE ?")
         params.append(f"%{ai_filter}%")
 
+    if variable:
+        conditions.append(
+            "p.content_hash IN (SELECT hash FROM blob_variables WHERE name = ?)"
+        )
+        params.append(variable)
+
+    if min_tokens is not None:
+        conditions.append("b.token_estimate >= ?")
+        params.append(min_tokens)
+
+    if max_tokens is not None:
+        conditions.append("b.token_estimate <= ?")
+        params.append(max_tokens)
+
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
 
-    query += " ORDER BY created_at DESC"
+    query += f" ORDER BY {PROMPT_SORTS[sort]}"
 
     try:
         prompts = db.execute(query, params).fetchall()
-        return [
-            {
-                "id": prompt["id"],
-                "prompt_name": prompt["prompt_name"],
-                "ai_selection": json.loads(prompt["ai_selection"]),
-                "prompt_content": prompt["prompt_content"],
-                "created_at": prompt["created_at"],
-                "updated_at": prompt["updated_at"],
-            }
-            for prompt in prompts
-        ]
+        return [_prompt_to_dict(prompt) for prompt in prompts]
     except sqlite3.Error as e:
         logger.error(f"Database error in search_prompts: {e}")
         raise DatabaseError(f"Failed to search prompts: {e}")
@@ -312,46 +1006,119 @@ def search_prompts(search_term=None, ai_filter=None):
 
 
 # Task functions
-def get_tasks(list_id=None, tag_id=None, due_date=None, due_after=None):
-    """Get tasks with optional filters."""
+def _task_query(list_id=None, tag_id=None, due_date=None, due_after=None):
+    """Build the filtered task query shared by get_tasks and iter_tasks."""
     from database.models import Task, Tag
 
-    try:
-        query = Task.query
+    query = Task.query
+
+    if list_id is not None:
+        query = query.filter(Task.list_id == list_id)
+    elif list_id is None:  # Inbox view (tasks with no list)
+        query = query.filter(Task.list_id.is_(None))
 
-        if list_id is not None:
-            query = query.filter(Task.list_id == list_id)
-        elif list_id is None:  # Inbox view (tasks with no list)
-            query = query.filter(Task.list_id.is_(None))
+    if tag_id:
+        query = query.join(Task.tags).filter(Tag.id == tag_id)
 
-        if tag_id:
-            query = query.join(Task.tags).filter(Tag.id == tag_id)
+    # Ranges rather than date(due_date) so the due_date index is used
+    if due_date:
+        query = query.filter(
+            Task.due_date >= _day_start(due_date),
+            Task.due_date < _day_start(due_date) + timedelta(days=1),
+        )
+
+    if due_after:
+        query = query.filter(Task.due_date >= _day_start(due_after))
+
+    return query.order_by(Task.created_at.desc())
 
-        if due_date:
-            query = query.filter(db.func.date(Task.due_date) == due_date)
 
-        if due_after:
-            query = query.filter(db.func.date(Task.due_date) >= due_after)
+def _day_start(day):
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if isinstance(day, datetime):
+        day = day.date()
+    return datetime.combine(day, datetime.min.time())
 
-        return [task.to_dict() for task in query.order_by(Task.created_at.desc()).all()]
+
+def get_tasks(list_id=None, tag_id=None, due_date=None, due_after=None):
+    """Get tasks with optional filters."""
+    try:
+        query = _task_query(list_id, tag_id, due_date, due_after)
+        return [task.to_dict() for task in query.all()]
     except Exception as e:
         logger.error(f"Error getting tasks: {e}")
         raise DatabaseError(str(e))
 
 
+def iter_tasks(
+    list_id=None, tag_id=None, due_date=None, due_after=None, batch_size=500
+):
+    """Yield flat task dicts with the same filters as get_tasks, in batches.
+
+    Only columns are loaded, ``batch_size`` rows at a time, plus one query
+    per batch for the tags' ids and names; no ORM objects are kept, so
+    memory and the number of queries stay flat. Unlike get_tasks, the
+    dicts carry no ``subtasks`` (use ``parent_id``) and tags no counts.
+    """
+    from itertools import islice
+    from sqlalchemy import select
+    from database.models import Tag, Task, task_tags
+
+    columns = Task.__table__.columns
+    try:
+        query = _task_query(list_id, tag_id, due_date, due_after)
+        rows = iter(query.with_entities(*columns).yield_per(batch_size))
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            tags = {}
+            for task_id, id, name in db.session.execute(
+                select(task_tags.c.task_id, Tag.id, Tag.name)
+                .join(Tag, Tag.id == task_tags.c.tag_id)
+                .where(task_tags.c.task_id.in_([row.id for row in batch]))
+                .order_by(Tag.id)
+            ):
+                tags.setdefault(task_id, []).append({"id": id, "name": name})
+            for row in batch:
+                task = {
+                    column.name: (
+                        value.isoformat() if isinstance(value, datetime) else value
+                    )
+                    for column, value in zip(columns, row)
+                }
+                task["tags"] = tags.get(row.id, [])
+                yield task
+    except Exception as e:
+        logger.error(f"Error streaming tasks: {e}")
+        raise DatabaseError(str(e))
+
+
 def create_task(
-    title, description=None, due_date=None, list_id=None, priority=4, tags=None
+    title,
+    description=None,
+    due_date=None,
+    list_id=None,
+    priority=4,
+    tags=None,
+    parent_id=None,
 ):
-    """Create a new task."""
+    """Create a new task, optionally as a subtask of ``parent_id``."""
     from database.models import Task, Tag
+    from database.scheduler import as_datetime
 
     try:
+        if parent_id is not None and not Task.query.get(parent_id):
+            raise DatabaseError("Parent task not found")
+
         task = Task(
             title=title,
             description=description,
-            due_date=due_date,
+            due_date=as_datetime(due_date) if due_date is not None else None,
             list_id=list_id,
             priority=priority,
+            parent_id=parent_id,
         )
 
         if tags:
@@ -361,7 +1128,12 @@ def create_task(
                     task.tags.append(tag)
 
         db.session.add(task)
+        db.session.flush()
+        _insert_tree_node(task.id, parent_id)
         db.session.commit()
+        _invalidate_task_stats()
+        _schedule_due(task)
+        _publish_task("created", task.id)
         return task.to_dict()
     except Exception as e:
         db.session.rollback()
@@ -369,26 +1141,64 @@ def create_task(
         raise DatabaseError(str(e))
 
 
+_TASK_FIELDS = {
+    "title",
+    "description",
+    "due_date",
+    "list_id",
+    "priority",
+    "completed",
+    "parent_id",
+    "tags",
+}
+
+
 def update_task(id, **kwargs):
-    """Update a task."""
+    """Update only the given fields of a task.
+
+    Values equal to the stored ones are ignored; if nothing differs the
+    task is returned without a write (and without bumping updated_at).
+    """
     from database.models import Task, Tag
+    from database.scheduler import as_datetime
+
+    unknown = set(kwargs) - _TASK_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
 
     try:
         task = Task.query.get(id)
         if not task:
             raise DatabaseError("Task not found")
 
+        changed = []
         for key, value in kwargs.items():
             if key == "tags":
+                if set(value) == {tag.name for tag in task.tags}:
+                    continue
                 task.tags = []
                 for tag_name in value:
                     tag = Tag.query.filter_by(name=tag_name).first()
                     if tag:
                         task.tags.append(tag)
             else:
+                if key == "due_date" and value is not None:
+                    value = as_datetime(value)
+                if value == getattr(task, key):
+                    continue
+                if key == "parent_id":
+                    _move_tree_node(task.id, value)
                 setattr(task, key, value)
+            changed.append(key)
+
+        _count_update("task", bool(changed))
+        if not changed:
+            return task.to_dict()
 
         db.session.commit()
+        _invalidate_task_stats()
+        _schedule_due(task)
+        _publish_task("updated", task.id, fields=sorted(changed))
         return task.to_dict()
     except Exception as e:
         db.session.rollback()
@@ -403,8 +1213,15 @@ def delete_task(id):
     try:
         task = Task.query.get(id)
         if task:
+            # Subtasks become top-level tasks, as the ORM nulls their parent_id
+            for subtask in task.subtasks:
+                _move_tree_node(subtask.id, None)
+            _delete_tree_node(task.id)
             db.session.delete(task)
             db.session.commit()
+            _invalidate_task_stats()
+            _unschedule_due(id)
+            _publish_task("deleted", id)
         return True
     except Exception as e:
         db.session.rollback()
@@ -424,6 +1241,9 @@ def toggle_task(id, completed=True):
         task.completed = completed
         task.completed_at = datetime.utcnow() if completed else None
         db.session.commit()
+        _invalidate_task_stats()
+        _schedule_due(task)
+        _publish_task("updated", task.id, fields=["completed"])
         return task.to_dict()
     except Exception as e:
         db.session.rollback()
@@ -431,6 +1251,316 @@ def toggle_task(id, completed=True):
         raise DatabaseError(str(e))
 
 
+def _schedule_due(task):
+    from database.scheduler import due_scheduler
+
+    due_date = None if task.completed else task.due_date
+    # The task is already committed; a scheduling problem must not turn
+    # that into an error response
+    try:
+        due_scheduler.update(task.id, due_date, task.title)
+    except Exception as e:
+        logger.error(f"Error scheduling task {task.id}: {e}")
+
+
+def _unschedule_due(task_id):
+    from database.scheduler import due_scheduler
+
+    due_scheduler.remove(task_id)
+
+
+def _publish_task(action, task_id, **data):
+    from database.changes import publish
+
+    publish("task", action, task_id, **data)
+
+
+# Task hierarchy
+#
+# task_closure stores every (ancestor, descendant, depth) pair of the subtask
+# tree, so subtrees, descendant counts and cycle checks are single indexed
+# queries instead of walking Task.subtasks one level at a time. The helpers
+# below run inside the caller's session transaction; Task.parent_id stays
+# the source of truth and rebuild_task_tree() regenerates the table from it.
+
+
+def _insert_tree_node(task_id, parent_id):
+    """Add the closure rows of a new task under ``parent_id``."""
+    from sqlalchemy import text
+
+    db.session.execute(
+        text(
+            """INSERT INTO task_closure (ancestor_id, descendant_id, depth)
+               VALUES (:id, :id, 0)"""
+        ),
+        {"id": task_id},
+    )
+    if parent_id is not None:
+        db.session.execute(
+            text(
+                """INSERT INTO task_closure (ancestor_id, descendant_id, depth)
+                   SELECT ancestor_id, :id, depth + 1 FROM task_closure
+                   WHERE descendant_id = :parent_id"""
+            ),
+            {"id": task_id, "parent_id": parent_id},
+        )
+
+
+def _move_tree_node(task_id, parent_id):
+    """Reattach the subtree of ``task_id`` under ``parent_id`` (None for root).
+
+    Only the rows linking the subtree to its old and new ancestors change,
+    so the work is proportional to the subtree size times the depth.
+    """
+    from sqlalchemy import text
+    from database.models import Task
+
+    params = {"id": task_id, "parent_id": parent_id}
+    if parent_id is not None:
+        if not Task.query.get(parent_id):
+            raise DatabaseError("Parent task not found")
+        cycle = db.session.execute(
+            text(
+                """SELECT 1 FROM task_closure
+                   WHERE ancestor_id = :id AND descendant_id = :parent_id"""
+            ),
+            params,
+        ).first()
+        if cycle:
+            raise DatabaseError("A task cannot be moved under its own subtask")
+
+    db.session.execute(
+        text(
+            """DELETE FROM task_closure
+               WHERE descendant_id IN
+                     (SELECT descendant_id FROM task_closure WHERE ancestor_id = :id)
+                 AND ancestor_id NOT IN
+                     (SELECT descendant_id FROM task_closure WHERE ancestor_id = :id)"""
+        ),
+        params,
+    )
+    if parent_id is not None:
+        db.session.execute(
+            text(
+                """INSERT INTO task_closure (ancestor_id, descendant_id, depth)
+                   SELECT up.ancestor_id, down.descendant_id, up.depth + down.depth + 1
+                   FROM task_closure up, task_closure down
+                   WHERE up.descendant_id = :parent_id AND down.ancestor_id = :id"""
+            ),
+            params,
+        )
+
+
+def _delete_tree_node(task_id):
+    """Drop the closure rows of a task whose subtasks were already moved."""
+    from sqlalchemy import text
+
+    db.session.execute(
+        text(
+            """DELETE FROM task_closure
+               WHERE descendant_id = :id OR ancestor_id = :id"""
+        ),
+        {"id": task_id},
+    )
+
+
+def move_task(id, parent_id=None):
+    """Move a task and its subtasks under ``parent_id``, or to the top level."""
+    return update_task(id, parent_id=parent_id)
+
+
+def get_task_subtree(id, max_depth=None):
+    """Get a task and its descendants, down to ``max_depth`` levels.
+
+    Returns a flat list ordered by depth, each task carrying its depth
+    relative to ``id`` and the number of (completed) tasks below it, all
+    from one query.
+    """
+    from sqlalchemy import text
+
+    query = """SELECT t.id, t.title, t.due_date, t.completed, t.priority,
+                      t.list_id, t.parent_id, c.depth,
+                      COUNT(d.descendant_id) - 1 AS descendant_count,
+                      COALESCE(SUM(dt.completed), 0) - COALESCE(t.completed, 0)
+                          AS completed_descendant_count
+               FROM task_closure c
+               JOIN tasks t ON t.id = c.descendant_id
+               JOIN task_closure d ON d.ancestor_id = c.descendant_id
+               JOIN tasks dt ON dt.id = d.descendant_id
+               WHERE c.ancestor_id = :id"""
+    params = {"id": id}
+    if max_depth is not None:
+        query += " AND c.depth <= :max_depth"
+        params["max_depth"] = max_depth
+    query += " GROUP BY c.descendant_id ORDER BY c.depth, t.created_at"
+
+    try:
+        rows = db.session.execute(text(query), params).fetchall()
+    except Exception as e:
+        logger.error(f"Error getting task subtree: {e}")
+        raise DatabaseError(str(e))
+
+    tasks = []
+    for row in rows:
+        task = dict(row._mapping)
+        task["completed"] = bool(task["completed"])
+        tasks.append(task)
+    return tasks
+
+
+def rebuild_task_tree():
+    """Regenerate task_closure from Task.parent_id; returns the row count.
+
+    The table is created (and filled) at startup; this repairs it should
+    it ever drift from parent_id.
+    """
+    from sqlalchemy import text
+
+    try:
+        db.session.execute(text("DELETE FROM task_closure"))
+        result = db.session.execute(
+            text(
+                """INSERT INTO task_closure (ancestor_id, descendant_id, depth)
+                   WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+                       SELECT id, id, 0 FROM tasks
+                       UNION ALL
+                       SELECT tree.ancestor_id, t.id, tree.depth + 1
+                       FROM tree JOIN tasks t ON t.parent_id = tree.descendant_id
+                   )
+                   SELECT ancestor_id, descendant_id, depth FROM tree"""
+            )
+        )
+        db.session.commit()
+        return result.rowcount
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error rebuilding task tree: {e}")
+        raise DatabaseError(str(e))
+
+
+# Task dashboard statistics
+
+_TASK_STATS_SQL = """
+    SELECT 'all' AS scope, NULL AS scope_id, {aggregates} FROM tasks t
+    UNION ALL
+    SELECT 'list', t.list_id, {aggregates} FROM tasks t GROUP BY t.list_id
+    UNION ALL
+    SELECT 'tag', tt.tag_id, {aggregates}
+    FROM task_tags tt JOIN tasks t ON t.id = tt.task_id
+    GROUP BY tt.tag_id
+"""
+
+_TASK_STATS_AGGREGATES = """
+    COUNT(*) AS total,
+    COALESCE(SUM(t.completed), 0) AS completed,
+    COALESCE(SUM(NOT t.completed AND t.due_date < :today), 0) AS overdue,
+    COALESCE(SUM(NOT t.completed AND t.due_date >= :today
+                 AND t.due_date < :tomorrow), 0) AS due_today,
+    COALESCE(SUM(NOT t.completed AND t.due_date >= :today
+                 AND t.due_date < :week_end), 0) AS due_this_week,
+    COALESCE(SUM(NOT t.completed AND t.priority = 1), 0) AS priority_1,
+    COALESCE(SUM(NOT t.completed AND t.priority = 2), 0) AS priority_2,
+    COALESCE(SUM(NOT t.completed AND t.priority = 3), 0) AS priority_3,
+    COALESCE(SUM(NOT t.completed AND t.priority = 4), 0) AS priority_4
+"""
+
+# Cached per workspace and day, and only while the task database is
+# unchanged: every task write in this process drops the cache, and
+# PRAGMA data_version catches commits made by other processes
+_task_stats = {}  # workspace -> (day, data_version, stats)
+_task_stats_generation = 0
+_task_stats_lock = threading.Lock()
+_data_version_conn = None
+
+
+def _invalidate_task_stats():
+    global _task_stats_generation
+    with _task_stats_lock:
+        _task_stats_generation += 1
+        _task_stats.clear()
+
+
+def _task_data_version():
+    """A value that changes with every commit to the task database by any
+    connection or process, or None when that database is not a SQLite file.
+
+    It is read on a connection of its own that never writes, since SQLite
+    only counts commits made through other connections.
+    """
+    global _data_version_conn
+    url = db.engine.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    with _task_stats_lock:
+        if _data_version_conn is None:
+            _data_version_conn = sqlite3.connect(url.database, check_same_thread=False)
+        return _data_version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def _stats_row(row):
+    counts = dict(row._mapping)
+    counts.pop("scope")
+    counts.pop("scope_id")
+    counts["by_priority"] = {
+        str(priority): counts.pop(f"priority_{priority}") for priority in range(1, 5)
+    }
+    return counts
+
+
+def get_task_stats():
+    """Get dashboard counts overall, per list and per tag.
+
+    Overdue, due-today, due-this-week, completed and per-priority (open
+    tasks) counts all come from one aggregate query. The result is cached
+    until the task database changes, in this or another process, or the
+    day changes.
+    """
+    from sqlalchemy import text
+    from database.shards import current_workspace
+
+    today = date.today()
+    workspace = current_workspace()
+    version = _task_data_version()
+    with _task_stats_lock:
+        cached = _task_stats.get(workspace)
+        if cached is not None and cached[:2] == (today, version):
+            return cached[2]
+        generation = _task_stats_generation
+
+    try:
+        rows = db.session.execute(
+            text(_TASK_STATS_SQL.format(aggregates=_TASK_STATS_AGGREGATES)),
+            # due_date is stored as 'YYYY-MM-DD HH:MM:SS', so bare dates
+            # bound whole days
+            {
+                "today": today.isoformat(),
+                "tomorrow": (today + timedelta(days=1)).isoformat(),
+                "week_end": (today + timedelta(days=7)).isoformat(),
+            },
+        ).fetchall()
+    except Exception as e:
+        logger.error(f"Error getting task stats: {e}")
+        raise DatabaseError(str(e))
+
+    stats = {"overall": None, "lists": {}, "tags": {}}
+    for row in rows:
+        if row.scope == "all":
+            stats["overall"] = _stats_row(row)
+        elif row.scope == "list":
+            # Tasks without a list make up the inbox
+            key = "inbox" if row.scope_id is None else str(row.scope_id)
+            stats["lists"][key] = _stats_row(row)
+        else:
+            stats["tags"][str(row.scope_id)] = _stats_row(row)
+
+    with _task_stats_lock:
+        # Only cache if no task was written while the query ran; a commit
+        # from elsewhere is caught by the next data_version check
+        if _task_stats_generation == generation:
+            _task_stats[workspace] = (today, version, stats)
+    return stats
+
+
 # List functions
 def get_lists():
     """Get all lists."""
@@ -460,12 +1590,16 @@ def get_list(id):
 
 def create_list(name, color="#4a90e2", icon="list"):
     """Create a new list."""
+    from database.changes import publish
     from database.models import List
+    from database.trigram import name_index
 
     try:
         list_obj = List(name=name, color=color, icon=icon)
         db.session.add(list_obj)
         db.session.commit()
+        name_index.add("list", list_obj.id, name)
+        publish("list", "created", list_obj.id, name=name)
         return list_obj.to_dict()
     except Exception as e:
         db.session.rollback()
@@ -499,12 +1633,16 @@ def get_tag(id):
 
 def create_tag(name, color="#4a90e2"):
     """Create a new tag."""
+    from database.changes import publish
     from database.models import Tag
+    from database.trigram import name_index
 
     try:
         tag = Tag(name=name, color=color)
         db.session.add(tag)
         db.session.commit()
+        name_index.add("tag", tag.id, name)
+        publish("tag", "created", tag.id, name=name)
         return tag.to_dict()
     except Exception as e:
         db.session.rollback()
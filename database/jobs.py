@@ -0,0 +1,538 @@
+import os
+import json
+import time
+import multiprocessing
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from database.db import get_db, DatabaseError
+from database.writer import write_operation
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Progress is written to the jobs table at most this often per job
+PROGRESS_INTERVAL = 0.5
+
+_handlers = {}
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+    pass
+
+
+def job_handler(kind):
+    """Register a function as the handler for a job kind.
+
+    Handlers are called as ``handler(ctx, **params)`` inside an app context
+    and return a JSON-serialisable result.
+    """
+
+    def decorator(fn):
+        _handlers[kind] = fn
+        return fn
+
+    return decorator
+
+
+def _job_to_dict(job):
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "result": json.loads(job["result"]) if job["result"] else None,
+        "error": job["error"],
+        "cancel_requested": bool(job["cancel_requested"]),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class JobContext:
+    """Handle passed to a running job for progress and cancellation."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self._last_progress = 0.0
+        self._last_cancel_check = time.monotonic()
+
+    def cancelled(self):
+        """Return True once cancellation of this job has been requested.
+
+        Requests made in this process are seen immediately; the jobs table
+        is polled (throttled) for requests handled by another worker.
+        """
+        if self.job_id in self.runner._cancelled:
+            return True
+        now = time.monotonic()
+        if now - self._last_cancel_check < PROGRESS_INTERVAL:
+            return False
+        self._last_cancel_check = now
+        row = (
+            get_db()
+            .execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,))
+            .fetchone()
+        )
+        return bool(row and row["cancel_requested"])
+
+    def check_cancelled(self):
+        """Raise JobCancelled if cancellation has been requested."""
+        if self.cancelled():
+            raise JobCancelled()
+
+    def progress(self, fraction, message=None, force=False):
+        """Record progress between 0 and 1; writes are throttled."""
+        now = time.monotonic()
+        if not force and now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        _set_progress(self.job_id, round(min(max(fraction, 0.0), 1.0), 4), message)
+
+    def map_in_process(self, fn, items, chunksize=64):
+        """Run a picklable CPU-bound function over items in the process pool."""
+        self.check_cancelled()
+        return list(self.runner.processes.map(fn, items, chunksize=chunksize))
+
+
+class JobRunner:
+    """Runs queued jobs on a bounded thread pool, persisting state in SQLite.
+
+    CPU-heavy steps can be pushed to a bounded process pool through
+    :meth:`JobContext.map_in_process`. No external broker is involved: the
+    jobs table is the queue, so jobs queued when the process stopped are
+    resumed on the next start and jobs that were running are marked failed.
+    Job state changes go through the single writer like any other write;
+    job threads only read on their own connections.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.threads = None
+        self._processes = None
+        self._process_workers = 1
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.threads = ThreadPoolExecutor(
+            max_workers=app.config.get("JOB_WORKERS", 2), thread_name_prefix="job"
+        )
+        self._process_workers = app.config.get("JOB_PROCESSES", 1)
+
+        with app.app_context():
+            _fail_interrupted()
+            queued = [
+                row["id"]
+                for row in get_db().execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY id", (QUEUED,)
+                )
+            ]
+        for job_id in queued:
+            self.threads.submit(self._run, job_id)
+
+    @property
+    def processes(self):
+        with self._lock:
+            if self._processes is None:
+                # Forking this multithreaded process (writers, job threads,
+                # the change stream) could copy a held lock into the child
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self._process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._processes
+
+    def enqueue(self, kind, params=None):
+        """Persist a new job and schedule it; returns the job."""
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = _insert_job(kind, params)
+        self.threads.submit(self._run, job_id)
+        logger.debug(f"Enqueued {kind} job {job_id}")
+        return get_job(job_id)
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs are cancelled immediately."""
+        if _request_cancel(job_id):
+            self._cancelled.add(job_id)
+        return get_job(job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            if not _claim_job(job_id):
+                self._cancelled.discard(job_id)
+                return
+
+            job = (
+                get_db()
+                .execute("SELECT kind, params FROM jobs WHERE id = ?", (job_id,))
+                .fetchone()
+            )
+            ctx = JobContext(self, job_id)
+            started = time.perf_counter()
+            try:
+                result = _handlers[job["kind"]](ctx, **json.loads(job["params"]))
+                _finish_job(job_id, SUCCEEDED, result=result)
+            except JobCancelled:
+                _finish_job(job_id, CANCELLED)
+            except Exception as e:
+                logger.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+                _finish_job(job_id, FAILED, error=str(e))
+            finally:
+                self._cancelled.discard(job_id)
+                logger.info(
+                    f"Job {job_id} ({job['kind']}) finished in "
+                    f"{time.perf_counter() - started:.2f}s"
+                )
+
+
+@write_operation
+def _fail_interrupted():
+    db = get_db()
+    try:
+        db.execute(
+            """UPDATE jobs
+               SET status = ?, error = 'Interrupted by shutdown',
+                   finished_at = CURRENT_TIMESTAMP
+               WHERE status = ?""",
+            (FAILED, RUNNING),
+        )
+        db.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error while failing interrupted jobs: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to mark interrupted jobs: {e}")
+
+
+@write_operation
+def _claim_job(job_id):
+    db = get_db()
+    try:
+        cursor = db.execute(
+            """UPDATE jobs SET status = ?, started_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND status = ?""",
+            (RUNNING, job_id, QUEUED),
+        )
+        db.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error while claiming job {job_id}: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to start job: {e}")
+
+
+@write_operation
+def _set_progress(job_id, progress, message):
+    db = get_db()
+    try:
+        db.execute(
+            "UPDATE jobs SET progress = ?, message = ? WHERE id = ?",
+            (progress, message, job_id),
+        )
+        db.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error while recording job progress: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to record job progress: {e}")
+
+
+@write_operation
+def _finish_job(job_id, status, result=None, error=None):
+    db = get_db()
+    try:
+        db.execute(
+            """UPDATE jobs
+               SET status = ?, result = ?, error = ?,
+                   progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END,
+                   finished_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (
+                status,
+                json.dumps(result) if result is not None else None,
+                error,
+                status,
+                job_id,
+            ),
+        )
+        db.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error while finishing job {job_id}: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to finish job: {e}")
+
+
+@write_operation
+def _insert_job(kind, params):
+    db = get_db()
+    try:
+        cursor = db.execute(
+            "INSERT INTO jobs (kind, params) VALUES (?, ?)",
+            (kind, json.dumps(params or {})),
+        )
+        db.commit()
+        return cursor.lastrowid
+    except sqlite3.Error as e:
+        logger.error(f"Database error in enqueue: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to enqueue job: {e}")
+
+
+@write_operation
+def _request_cancel(job_id):
+    db = get_db()
+    try:
+        cursor = db.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)",
+            (job_id, QUEUED, RUNNING),
+        )
+        db.execute(
+            """UPDATE jobs SET status = ?, finished_at = CURRENT_TIMESTAMP
+               WHERE id = ? AND status = ?""",
+            (CANCELLED, job_id, QUEUED),
+        )
+        db.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Database error in cancel: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to cancel job: {e}")
+
+
+runner = JobRunner()
+
+
+def init_app(app):
+    """Start the job runner for the Flask app."""
+    runner.init_app(app)
+
+
+def get_job(job_id):
+    """Get a job by ID."""
+    try:
+        job = get_db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_to_dict(job) if job else None
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_job: {e}")
+        raise DatabaseError(f"Failed to retrieve job: {e}")
+
+
+def get_jobs(status=None, limit=50):
+    """List the most recent jobs, optionally filtered by status."""
+    query = "SELECT * FROM jobs"
+    params = []
+    if status:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    try:
+        return [_job_to_dict(job) for job in get_db().execute(query, params)]
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_jobs: {e}")
+        raise DatabaseError(f"Failed to retrieve jobs: {e}")
+
+
+# Built-in job handlers
+
+
+@job_handler("import_prompts")
+def _import_prompts_job(ctx, prompts, skip_existing=True, near_duplicates=None):
+    """Import prompts in chunks so the job can report progress and stop."""
+    from database.db import import_prompts
+
+    chunk_size = 500
+    totals = {}
+    for start in range(0, len(prompts), chunk_size):
+        ctx.check_cancelled()
+        stats = import_prompts(
+            prompts[start : start + chunk_size],
+            skip_existing=skip_existing,
+            near_duplicates=near_duplicates,
+        )
+        for key, value in stats.items():
+            if key == "near_duplicates":
+                totals.setdefault(key, []).extend(value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+        ctx.progress(
+            (start + chunk_size) / len(prompts),
+            f"Imported {min(start + chunk_size, len(prompts))} of {len(prompts)}",
+        )
+    return totals
+
+
+@job_handler("delete_prompts")
+def _delete_prompts_job(ctx, ids):
+    """Delete many prompts, one short transaction each."""
+    from database.db import delete_prompt
+
+    deleted = 0
+    for done, prompt_id in enumerate(ids, start=1):
+        ctx.check_cancelled()
+        try:
+            delete_prompt(int(prompt_id))
+            deleted += 1
+        except DatabaseError as e:
+            logger.warning(f"Skipping prompt {prompt_id} in delete job: {e}")
+        ctx.progress(done / len(ids), f"Deleted {deleted} of {len(ids)}")
+    return {"deleted": deleted, "requested": len(ids)}
+
+
+@job_handler("export_prompts")
+def _export_prompts_job(ctx):
+    """Write every prompt to a JSON file under the instance folder."""
+    from flask import current_app
+    from database.db import PROMPT_SELECT, _prompt_to_dict
+
+    export_dir = os.path.join(
+        os.path.dirname(current_app.config["DATABASE"]), "exports"
+    )
+    os.makedirs(export_dir, exist_ok=True)
+    path = os.path.join(export_dir, f"prompts-{ctx.job_id}.json")
+
+    db = get_db()
+    total = db.execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+    cursor = db.execute(f"{PROMPT_SELECT} ORDER BY p.id")
+    written = 0
+    with open(path, "w") as f:
+        f.write("[")
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            ctx.check_cancelled()
+            for row in rows:
+                f.write("," if written else "")
+                json.dump(_prompt_to_dict(row), f, default=str)
+                written += 1
+            ctx.progress(written / max(total, 1), f"Exported {written} of {total}")
+        f.write("]")
+    return {"path": path, "prompts": written}
+
+
+@job_handler("rebuild_name_index")
+def _rebuild_name_index_job(ctx):
+    from database.trigram import name_index
+
+    return name_index.rebuild()
+
+
+@job_handler("rebuild_similarity_index")
+def _rebuild_similarity_index_job(ctx):
+    from database.similarity import similarity_index
+
+    return similarity_index.rebuild()
+
+
+@job_handler("backfill_minhash")
+def _backfill_minhash_job(ctx, batch_size=500):
+    """Sign unsigned prompt bodies, computing signatures in the process pool."""
+    from database.minhash import signature
+
+    db = get_db()
+    total = db.execute(
+        """SELECT COUNT(DISTINCT p.content_hash) FROM prompts p
+           LEFT JOIN blob_minhash m ON m.hash = p.content_hash
+           WHERE m.hash IS NULL"""
+    ).fetchone()[0]
+    done = 0
+    while True:
+        ctx.check_cancelled()
+        rows = db.execute(
+            """SELECT DISTINCT b.hash, b.content
+               FROM prompts p
+               JOIN prompt_blobs b ON b.hash = p.content_hash
+               LEFT JOIN blob_minhash m ON m.hash = b.hash
+               WHERE m.hash IS NULL
+               LIMIT ?""",
+            (batch_size,),
+        ).fetchall()
+        if not rows:
+            break
+        signatures = ctx.map_in_process(signature, [row["content"] for row in rows])
+        _store_signatures(
+            [(row["hash"], row["content"], sig) for row, sig in zip(rows, signatures)]
+        )
+        done += len(rows)
+        ctx.progress(done / max(total, 1), f"Signed {done} of {total}")
+    return {"signed": done}
+
+
+@write_operation
+def _store_signatures(signed):
+    from database.minhash import index_signature
+
+    db = get_db()
+    try:
+        for digest, content, sig in signed:
+            index_signature(db, digest, content, sig=sig)
+        db.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error in backfill_minhash: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to store prompt signatures: {e}")
+
+
+@job_handler("maintain_db")
+def _maintain_db_job(ctx, vacuum=True):
+    """Run integrity check, ANALYZE and incremental vacuum on every database.
+
+    That is the prompt database, the task database and each workspace's.
+    This is the one job that bypasses the writer: VACUUM cannot run inside
+    the writer's batch transaction, so it uses connections of its own and
+    waits on the busy timeout like any other SQLite client.
+    """
+    from flask import current_app
+    from database.db import db
+    from database.maintenance import database_files, maintain_file
+
+    files = database_files(
+        current_app.config["DATABASE"],
+        db.engine.url.database,
+        current_app.config.get("WORKSPACE_DIR", "instance/workspaces"),
+    )
+    reports = {}
+    for done, (name, path) in enumerate(files):
+        ctx.check_cancelled()
+        ctx.progress(done / len(files), f"Maintaining {name}", force=True)
+        reports[name] = maintain_file(path, vacuum=vacuum)
+    problems = {
+        name: report["problems"][:5]
+        for name, report in reports.items()
+        if report["problems"]
+    }
+    if problems:
+        raise DatabaseError(f"Integrity check failed: {problems}")
+    return {"databases": reports}
+
+
+@job_handler("backfill_metadata")
+def _backfill_metadata_job(ctx, batch_size=500):
+    """Compute counts and variables of bodies stored before metadata."""
+    from database.metadata import backfill_metadata
+
+    total = (
+        get_db()
+        .execute("SELECT COUNT(*) FROM prompt_blobs WHERE char_count IS NULL")
+        .fetchone()[0]
+    )
+
+    def progress(done):
+        ctx.check_cancelled()
+        ctx.progress(done / max(total, 1), f"Described {done} of {total}")
+
+    return {"described": backfill_metadata(batch_size, progress=progress)}
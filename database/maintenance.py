@@ -0,0 +1,177 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def integrity_check(conn):
+    """Return the problems reported by PRAGMA integrity_check (empty if ok)."""
+    problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    return [] if problems == ["ok"] else problems
+
+
+def optimize(conn):
+    """Refresh the planner statistics used to pick indexes."""
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+
+
+def enable_incremental_vacuum(conn):
+    """Switch the file to incremental auto-vacuum.
+
+    Changing the mode only takes effect after a full VACUUM, which rewrites
+    the whole file, so this is done once from the command line rather than
+    from the scheduled task.
+    """
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def incremental_vacuum(conn, pages=None):
+    """Return up to ``pages`` free pages (all by default) to the filesystem.
+
+    Returns the number of pages released, or None when the file is not in
+    incremental auto-vacuum mode.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+        return None
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    pragma = "PRAGMA incremental_vacuum"
+    if pages:
+        pragma += f"({int(pages)})"
+    # The pragma frees one page per result row, so step through all of them
+    conn.execute(pragma).fetchall()
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def _object_sizes(conn):
+    """Pages and bytes used per table and index, from the dbstat table."""
+    try:
+        rows = conn.execute(
+            """SELECT name, COUNT(*) AS pages, SUM(pgsize) AS bytes,
+                      SUM(unused) AS unused_bytes
+               FROM dbstat GROUP BY name"""
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+        return {}
+    return {
+        row[0]: {"pages": row[1], "bytes": row[2], "unused_bytes": row[3]}
+        for row in rows
+    }
+
+
+def storage_report(conn):
+    """Report row counts, page usage, fragmentation and index sizes."""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    sizes = _object_sizes(conn)
+
+    objects = conn.execute(
+        """SELECT type, name, tbl_name FROM sqlite_master
+           WHERE type IN ('table', 'index') AND name NOT LIKE 'sqlite_%'
+           ORDER BY tbl_name, type DESC, name"""
+    ).fetchall()
+    tables = []
+    indexes = []
+    for kind, name, table in objects:
+        size = sizes.get(name, {})
+        if kind == "table":
+            rows = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+            tables.append({"name": name, "rows": rows, **size})
+        else:
+            indexes.append({"name": name, "table": table, **size})
+
+    used = sum(size["bytes"] for size in sizes.values())
+    unused = sum(size["unused_bytes"] for size in sizes.values())
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "file_bytes": page_size * page_count,
+        "freelist_pages": freelist_count,
+        # Share of the file that is free pages or slack inside used pages
+        "fragmentation": (
+            round((freelist_count * page_size + unused) / (page_count * page_size), 4)
+            if page_count
+            else 0.0
+        ),
+        "used_bytes": used or None,
+        "auto_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0],
+        "tables": tables,
+        "indexes": indexes,
+    }
+
+
+def run_maintenance(conn, vacuum=True):
+    """Check integrity, refresh statistics and reclaim free pages.
+
+    ``conn`` should be in autocommit mode (``isolation_level=None``).
+    Returns the storage report with the outcome and timing of each step.
+    """
+    report = {"steps": {}}
+
+    started = time.perf_counter()
+    report["problems"] = integrity_check(conn)
+    report["steps"]["integrity_check"] = round(time.perf_counter() - started, 3)
+
+    started = time.perf_counter()
+    optimize(conn)
+    report["steps"]["analyze"] = round(time.perf_counter() - started, 3)
+
+    if vacuum:
+        started = time.perf_counter()
+        report["vacuumed_pages"] = incremental_vacuum(conn)
+        report["steps"]["incremental_vacuum"] = round(time.perf_counter() - started, 3)
+
+    report.update(storage_report(conn))
+    if report["problems"]:
+        logger.error(f"Integrity check found problems: {report['problems'][:5]}")
+    return report
+
+
+def database_files(database, task_database, workspace_dir):
+    """Name and path of every database file: prompts, tasks and each workspace."""
+    files = [("prompts", database), ("tasks", task_database)]
+    if os.path.isdir(workspace_dir):
+        files.extend(
+            (f"workspace:{name[: -len('.sqlite')]}", os.path.join(workspace_dir, name))
+            for name in sorted(os.listdir(workspace_dir))
+            if name.endswith(".sqlite")
+        )
+    return [(name, path) for name, path in files if path and os.path.exists(path)]
+
+
+def maintain_file(path, vacuum=True, timeout=20):
+    """Run maintenance on one database file over a connection of its own."""
+    with closing(sqlite3.connect(path, timeout=timeout, isolation_level=None)) as conn:
+        return run_maintenance(conn, vacuum=vacuum)
+
+
+def init_app(app):
+    """Enqueue a maintain_db job every DB_MAINTENANCE_INTERVAL seconds.
+
+    Off unless the interval is configured.
+    """
+    interval = app.config.get("DB_MAINTENANCE_INTERVAL")
+    if not interval:
+        return
+
+    def schedule():
+        from database.jobs import runner
+
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    runner.enqueue("maintain_db")
+            except Exception as e:
+                logger.error(f"Error scheduling database maintenance: {e}")
+
+    threading.Thread(target=schedule, name="db-maintenance", daemon=True).start()
@@ -0,0 +1,139 @@
+import re
+import math
+import sqlite3
+import logging
+from database.db import get_db, DatabaseError
+from database.writer import write_operation
+
+logger = logging.getLogger(__name__)
+
+# Same pattern the prompt form uses to find {variables}
+VARIABLE_RE = re.compile(r"\{([^}]+)\}")
+_WORD_RE = re.compile(r"\S+")
+
+
+def extract_variables(content):
+    """Return the distinct ``{variable}`` names of a body, in order."""
+    return list(dict.fromkeys(VARIABLE_RE.findall(content)))
+
+
+def estimate_tokens(char_count, word_count):
+    """Approximate the token count of English-like text.
+
+    Averages the usual ~4 characters per token and ~0.75 words per token
+    rules of thumb; close enough for filtering and sorting.
+    """
+    return math.ceil((char_count / 4 + word_count * 4 / 3) / 2)
+
+
+def content_metadata(content):
+    """Compute the stored metadata of a prompt body."""
+    char_count = len(content)
+    word_count = len(_WORD_RE.findall(content))
+    return {
+        "char_count": char_count,
+        "word_count": word_count,
+        "token_estimate": estimate_tokens(char_count, word_count),
+        "variables": extract_variables(content),
+    }
+
+
+def index_metadata(db, digest, content):
+    """Store the counts and variables of a body.
+
+    Runs inside the caller's transaction; bodies already described are
+    skipped, so each distinct body is parsed once.
+    """
+    if db.execute(
+        "SELECT 1 FROM prompt_blobs WHERE hash = ? AND char_count IS NOT NULL",
+        (digest,),
+    ).fetchone():
+        return
+    metadata = content_metadata(content)
+    db.execute(
+        """UPDATE prompt_blobs
+           SET char_count = ?, word_count = ?, token_estimate = ?
+           WHERE hash = ?""",
+        (
+            metadata["char_count"],
+            metadata["word_count"],
+            metadata["token_estimate"],
+            digest,
+        ),
+    )
+    db.executemany(
+        "INSERT OR IGNORE INTO blob_variables (name, hash) VALUES (?, ?)",
+        [(name, digest) for name in metadata["variables"]],
+    )
+
+
+@write_operation
+def _backfill_batch(batch_size):
+    db = get_db()
+    try:
+        rows = db.execute(
+            "SELECT hash, content FROM prompt_blobs WHERE char_count IS NULL LIMIT ?",
+            (batch_size,),
+        ).fetchall()
+        for row in rows:
+            index_metadata(db, row["hash"], row["content"])
+        db.commit()
+        return len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Database error in backfill_metadata: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to backfill prompt metadata: {e}")
+
+
+def backfill_metadata(batch_size=500, progress=None):
+    """Describe bodies stored before metadata existed, one batch per commit.
+
+    ``progress`` is called with the running total after each batch.
+    """
+    total = 0
+    while True:
+        done = _backfill_batch(batch_size)
+        if not done:
+            break
+        total += done
+        if progress:
+            progress(total)
+    if total:
+        logger.info(f"Backfilled metadata for {total} prompt bodies")
+    return total
+
+
+def metadata_pending():
+    """Whether any body still lacks metadata (an index lookup)."""
+    try:
+        return (
+            get_db()
+            .execute("SELECT 1 FROM prompt_blobs WHERE char_count IS NULL LIMIT 1")
+            .fetchone()
+            is not None
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Database error in metadata_pending: {e}")
+        raise DatabaseError(f"Failed to check prompt metadata: {e}")
+
+
+def get_variables(limit=100):
+    """Variable names with the number of current prompts using each."""
+    try:
+        rows = (
+            get_db()
+            .execute(
+                """SELECT v.name, COUNT(p.id) AS prompts
+                   FROM blob_variables v
+                   JOIN prompts p ON p.content_hash = v.hash
+                   GROUP BY v.name
+                   ORDER BY prompts DESC, v.name
+                   LIMIT ?""",
+                (limit,),
+            )
+            .fetchall()
+        )
+        return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_variables: {e}")
+        raise DatabaseError(f"Failed to retrieve prompt variables: {e}")
@@ -0,0 +1,228 @@
+import re
+import zlib
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+from database.db import get_db, DatabaseError
+from database.writer import write_operation
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+# 128 permutations split into 16 bands of 8 rows: two bodies collide in at
+# least one band with probability 1 - (1 - s^8)^16, which crosses 50% at a
+# Jaccard similarity of about 0.7.
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_random = np.random.RandomState(1)
+_A = _random.randint(1, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _random.randint(0, (1 << 61) - 1, size=NUM_PERM, dtype=np.uint64)
+
+
+def _shingles(text):
+    """Hash the word 3-shingles of a prompt body into uint64 values."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)]
+    else:
+        grams = [
+            " ".join(words[i : i + SHINGLE_SIZE])
+            for i in range(len(words) - SHINGLE_SIZE + 1)
+        ]
+    return np.fromiter(
+        {zlib.crc32(gram.encode("utf-8")) for gram in grams}, dtype=np.uint64
+    )
+
+
+def signature(text):
+    """Return the MinHash signature of a prompt body as uint32 values."""
+    shingles = _shingles(text)
+    with np.errstate(over="ignore"):
+        hashed = (np.outer(shingles, _A) + _B) % _MERSENNE_PRIME & _MAX_HASH
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def _bands(sig):
+    """Yield ``(band, bucket)`` keys for the LSH index."""
+    for band in range(BANDS):
+        chunk = sig[band * ROWS : (band + 1) * ROWS].tobytes()
+        digest = hashlib.blake2b(chunk, digest_size=8).digest()
+        yield band, int.from_bytes(digest, "big", signed=True)
+
+
+def _decode(blob):
+    return np.frombuffer(blob, dtype="<u4")
+
+
+def similarity(sig_a, sig_b):
+    """Estimate the Jaccard similarity of two bodies from their signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def index_signature(db, digest, content, sig=None):
+    """Store the signature and LSH buckets of a body.
+
+    Runs inside the caller's transaction; bodies already indexed are skipped.
+    A precomputed ``sig`` (e.g. from a worker process) is used as is.
+    """
+    if db.execute("SELECT 1 FROM blob_minhash WHERE hash = ?", (digest,)).fetchone():
+        return
+    if sig is None:
+        sig = signature(content)
+    db.execute(
+        "INSERT INTO blob_minhash (hash, signature) VALUES (?, ?)",
+        (digest, sig.astype("<u4").tobytes()),
+    )
+    db.executemany(
+        "INSERT OR IGNORE INTO blob_lsh (band, bucket, hash) VALUES (?, ?, ?)",
+        [(band, bucket, digest) for band, bucket in _bands(sig)],
+    )
+
+
+def near_duplicates(db, content, threshold=DEFAULT_THRESHOLD):
+    """Find current prompts whose body is a near-duplicate of ``content``.
+
+    Only prompts sharing an LSH bucket are compared, so the cost depends on
+    the number of candidates rather than the size of the library.
+    """
+    sig = signature(content)
+    keys = list(_bands(sig))
+    clauses = " OR ".join("(band = ? AND bucket = ?)" for _ in keys)
+    params = [value for key in keys for value in key]
+    candidates = db.execute(
+        f"""SELECT m.hash, m.signature FROM blob_minhash m
+            WHERE m.hash IN (SELECT hash FROM blob_lsh WHERE {clauses})""",
+        params,
+    ).fetchall()
+
+    matches = {}
+    for candidate in candidates:
+        score = similarity(sig, _decode(candidate["signature"]))
+        if score >= threshold:
+            matches[candidate["hash"]] = score
+    if not matches:
+        return []
+
+    placeholders = ",".join("?" * len(matches))
+    prompts = db.execute(
+        f"""SELECT id, prompt_name, content_hash FROM prompts
+            WHERE content_hash IN ({placeholders})""",
+        list(matches),
+    ).fetchall()
+    return sorted(
+        (
+            {
+                "id": prompt["id"],
+                "prompt_name": prompt["prompt_name"],
+                "similarity": round(matches[prompt["content_hash"]], 4),
+            }
+            for prompt in prompts
+        ),
+        key=lambda match: -match["similarity"],
+    )
+
+
+@write_operation
+def backfill_signatures(batch_size=500):
+    """Compute signatures for prompt bodies written before the LSH index."""
+    db = get_db()
+    total = 0
+    try:
+        while True:
+            rows = db.execute(
+                """SELECT DISTINCT b.hash, b.content
+                   FROM prompts p
+                   JOIN prompt_blobs b ON b.hash = p.content_hash
+                   LEFT JOIN blob_minhash m ON m.hash = b.hash
+                   WHERE m.hash IS NULL
+                   LIMIT ?""",
+                (batch_size,),
+            ).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                index_signature(db, row["hash"], row["content"])
+            db.commit()
+            total += len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Database error in backfill_signatures: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to backfill MinHash signatures: {e}")
+
+    if total:
+        logger.info(f"Backfilled MinHash signatures for {total} prompt bodies")
+    return total
+
+
+def get_duplicate_clusters(threshold=DEFAULT_THRESHOLD):
+    """Group the current prompt library into clusters of near-duplicates.
+
+    Candidate pairs come from shared LSH buckets, are verified against the
+    signature similarity and joined with union-find; prompts with identical
+    bodies always land in the same cluster.
+    """
+    backfill_signatures()
+    db = get_db()
+    try:
+        buckets = db.execute(
+            """SELECT group_concat(l.hash, ',') AS hashes
+               FROM blob_lsh l
+               WHERE l.hash IN (SELECT content_hash FROM prompts)
+               GROUP BY l.band, l.bucket
+               HAVING COUNT(*) > 1"""
+        ).fetchall()
+        signatures = {}
+        pairs = set()
+        for bucket in buckets:
+            hashes = sorted(set(bucket["hashes"].split(",")))
+            signatures.update((digest, None) for digest in hashes)
+            pairs.update((a, b) for i, a in enumerate(hashes) for b in hashes[i + 1 :])
+
+        for start in range(0, len(signatures), 500):
+            batch = list(signatures)[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row in db.execute(
+                f"SELECT hash, signature FROM blob_minhash WHERE hash IN ({placeholders})",
+                batch,
+            ):
+                signatures[row["hash"]] = _decode(row["signature"])
+
+        parent = {}
+
+        def find(digest):
+            parent.setdefault(digest, digest)
+            while parent[digest] != digest:
+                parent[digest] = parent[parent[digest]]
+                digest = parent[digest]
+            return digest
+
+        for a, b in pairs:
+            if similarity(signatures[a], signatures[b]) >= threshold:
+                parent[find(a)] = find(b)
+
+        prompts = db.execute(
+            "SELECT id, prompt_name, content_hash FROM prompts ORDER BY id"
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_duplicate_clusters: {e}")
+        raise DatabaseError(f"Failed to build duplicate report: {e}")
+
+    clusters = {}
+    for prompt in prompts:
+        digest = prompt["content_hash"]
+        root = find(digest) if digest in parent else digest
+        clusters.setdefault(root, []).append(
+            {"id": prompt["id"], "prompt_name": prompt["prompt_name"]}
+        )
+
+    report = [members for members in clusters.values() if len(members) > 1]
+    report.sort(key=len, reverse=True)
+    return [{"size": len(members), "prompts": members} for members in report]
@@ -10,7 +10,7 @@ from sqlalchemy import (
     Table,
 )
 from sqlalchemy.orm import relationship
-from database import db
+from database.db import db
 
 # Association tables for many-to-many relationships
 task_tags = Table(
@@ -29,13 +29,13 @@ class Task(db.Model):
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    due_date = Column(DateTime)
-    completed = Column(Boolean, default=False)
+    due_date = Column(DateTime, index=True)
+    completed = Column(Boolean, default=False, index=True)
     completed_at = Column(DateTime)
     priority = Column(Integer, default=4)  # 1=Highest, 4=Lowest
 
     # Relationships
-    list_id = Column(Integer, ForeignKey("lists.id"))
+    list_id = Column(Integer, ForeignKey("lists.id"), index=True)
     list = relationship("List", back_populates="tasks")
     parent_id = Column(Integer, ForeignKey("tasks.id"))
     subtasks = relationship("Task", backref=db.backref("parent", remote_side=[id]))
@@ -61,6 +61,24 @@ class Task(db.Model):
         }
 
 
+class TaskClosure(db.Model):
+    """Every ancestor/descendant pair of the subtask tree, including each
+    task paired with itself at depth 0."""
+
+    __tablename__ = "task_closure"
+
+    ancestor_id = Column(
+        Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True
+    )
+    descendant_id = Column(
+        Integer,
+        ForeignKey("tasks.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+    )
+    depth = Column(Integer, nullable=False)
+
+
 class List(db.Model):
     __tablename__ = "lists"
 
@@ -0,0 +1,256 @@
+import heapq
+import logging
+import itertools
+import threading
+from collections import deque
+from datetime import datetime, time, timedelta
+
+logger = logging.getLogger(__name__)
+
+DUE = "due"
+OVERDUE = "overdue"
+
+# The loop re-checks the clock at least this often (seconds), so a changed
+# system clock is noticed without anything being pushed
+MAX_SLEEP = 300
+
+
+def as_datetime(value):
+    """Due dates may arrive as datetimes, dates or ISO strings.
+
+    The result is always naive local time, like ``datetime.now()`` it is
+    compared with; an offset (``Z``, ``+00:00``) is converted, not dropped.
+    """
+    if isinstance(value, str):
+        if value.endswith(("Z", "z")):
+            value = value[:-1] + "+00:00"
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def overdue_at(due_date):
+    """A task is overdue from the midnight after its due date."""
+    return datetime.combine(due_date.date() + timedelta(days=1), time.min)
+
+
+class DueScheduler:
+    """Fires "due" and "overdue" events for open tasks without polling.
+
+    Open tasks with a due date are loaded once (through the due_date index)
+    into a min-heap of upcoming events; create/update/toggle/delete_task
+    keep it current. One thread sleeps until the earliest event, and is
+    woken when an earlier one is pushed. Events go to a bounded feed and to
+    the hooks registered with ``register``.
+
+    Stale heap entries (the task changed or was closed since they were
+    pushed) are skipped when they come up rather than searched for and
+    removed.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.feed_size = 1000
+        self._heap = []  # (when, tiebreak, task id, event type, version)
+        self._tasks = {}  # task id -> (version, due date, title)
+        self._versions = itertools.count(1)
+        self._tiebreak = itertools.count()
+        self._condition = threading.Condition()
+        self._feed = deque()
+        self._next_event_id = 1
+        self._hooks = []
+        self._thread = None
+        self.fired = {DUE: 0, OVERDUE: 0}
+        self.hook_errors = 0
+        self.load_error = None
+
+    def init_app(self, app):
+        self.app = app
+        self.feed_size = app.config.get("DUE_FEED_SIZE", 1000)
+        self._feed = deque(maxlen=self.feed_size)
+        with app.app_context():
+            try:
+                self.load()
+            except Exception as e:
+                # Reported by stats() so an empty schedule is not mistaken
+                # for there being no due tasks
+                self.load_error = str(e)
+                logger.error(f"Error loading due tasks: {e}")
+        self._thread = threading.Thread(
+            target=self._run, name="due-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def register(self, hook):
+        """Call ``hook(event)`` for every event, on the scheduler thread.
+
+        Hooks should return quickly (enqueue a job for slow work); errors
+        are logged and do not stop other hooks.
+        """
+        self._hooks.append(hook)
+        return hook
+
+    def load(self):
+        """Build the heap from the open tasks that have a due date.
+
+        Events whose time passed before the load are not fired.
+        """
+        from database.models import Task
+
+        rows = (
+            Task.query.with_entities(Task.id, Task.due_date, Task.title)
+            .filter(Task.due_date.isnot(None), Task.completed.is_(False))
+            .order_by(Task.due_date)
+            .all()
+        )
+        now = datetime.now()
+        with self._condition:
+            self._heap = []
+            self._tasks = {}
+            for task_id, due_date, title in rows:
+                self._heap.extend(
+                    self._track(
+                        task_id, as_datetime(due_date), title, now, fire_past=False
+                    )
+                )
+            heapq.heapify(self._heap)
+            self.load_error = None
+            self._condition.notify()
+        logger.info(f"Scheduled {len(self._tasks)} due tasks")
+
+    def _track(self, task_id, due_date, title, now, fire_past):
+        """Record a task and return its heap entries (not yet pushed)."""
+        version = next(self._versions)
+        self._tasks[task_id] = (version, due_date, title)
+        overdue = overdue_at(due_date)
+        events = [(overdue, OVERDUE)]
+        # A task created or moved straight into the past only reports overdue
+        if due_date > now or (fire_past and overdue > now):
+            events.append((due_date, DUE))
+        return [
+            (when, next(self._tiebreak), task_id, kind, version)
+            for when, kind in events
+            if when > now or fire_past
+        ]
+
+    def update(self, task_id, due_date, title=None):
+        """Schedule a task, or unschedule it when ``due_date`` is None.
+
+        Renames keep the pending events; a new due date replaces them and
+        fires at once for times already passed.
+        """
+        if due_date is not None:
+            due_date = as_datetime(due_date)
+        with self._condition:
+            current = self._tasks.get(task_id)
+            if due_date is None:
+                self._tasks.pop(task_id, None)
+                return
+            if current and current[1] == due_date:
+                self._tasks[task_id] = (current[0], current[1], title)
+                return
+            for entry in self._track(
+                task_id, due_date, title, datetime.now(), fire_past=True
+            ):
+                heapq.heappush(self._heap, entry)
+            self._condition.notify()
+
+    def remove(self, task_id):
+        """Stop tracking a task; its pending events are dropped lazily."""
+        with self._condition:
+            self._tasks.pop(task_id, None)
+
+    def _pop_due(self, now):
+        """Remove and return the events whose time has come."""
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            when, _, task_id, kind, version = heapq.heappop(self._heap)
+            current = self._tasks.get(task_id)
+            if current is None or current[0] != version:
+                continue
+            event = {
+                "id": self._next_event_id,
+                "type": kind,
+                "task_id": task_id,
+                "title": current[2],
+                "due_date": current[1].isoformat(),
+                "fired_at": now.isoformat(timespec="seconds"),
+            }
+            self._next_event_id += 1
+            self._feed.append(event)
+            self.fired[kind] += 1
+            ready.append(event)
+        return ready
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = datetime.now()
+                ready = self._pop_due(now)
+                if not ready:
+                    timeout = MAX_SLEEP
+                    if self._heap:
+                        timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+                    self._condition.wait(max(timeout, 0))
+                    continue
+            for event in ready:
+                self._dispatch(event)
+
+    def _dispatch(self, event):
+        for hook in list(self._hooks):
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        hook(event)
+                else:
+                    hook(event)
+            except Exception as e:
+                self.hook_errors += 1
+                logger.error(f"Error in due task hook {hook.__name__}: {e}")
+
+    def feed(self, since=0, limit=100):
+        """Events with an id above ``since``, oldest first."""
+        with self._condition:
+            events = [event for event in self._feed if event["id"] > since]
+        return events[:limit]
+
+    def upcoming(self, limit=50):
+        """Tracked open tasks ordered by due date, flagged when overdue."""
+        now = datetime.now()
+        with self._condition:
+            tasks = sorted(self._tasks.items(), key=lambda item: (item[1][1], item[0]))[
+                :limit
+            ]
+        return [
+            {
+                "task_id": task_id,
+                "title": title,
+                "due_date": due_date.isoformat(),
+                "overdue": overdue_at(due_date) <= now,
+            }
+            for task_id, (_, due_date, title) in tasks
+        ]
+
+    def stats(self):
+        with self._condition:
+            return {
+                "tracked_tasks": len(self._tasks),
+                "heap_entries": len(self._heap),
+                "next_event_at": (self._heap[0][0].isoformat() if self._heap else None),
+                "fired": dict(self.fired),
+                "feed_events": len(self._feed),
+                "hooks": len(self._hooks),
+                "hook_errors": self.hook_errors,
+                "load_error": self.load_error,
+            }
+
+
+due_scheduler = DueScheduler()
+
+
+def init_app(app):
+    """Load the due tasks and start the scheduler thread."""
+    due_scheduler.init_app(app)
@@ -1,18 +1,112 @@
+-- Only takes effect on a new, empty file; existing files are switched by
+-- `python scripts/db_init.py maintain`
+PRAGMA auto_vacuum = INCREMENTAL;
+
+DROP TABLE IF EXISTS prompt_usage;
+DROP TABLE IF EXISTS jobs;
+DROP TABLE IF EXISTS blob_lsh;
+DROP TABLE IF EXISTS blob_minhash;
+DROP TABLE IF EXISTS blob_variables;
+DROP TABLE IF EXISTS prompt_versions;
 DROP TABLE IF EXISTS prompts;
+DROP TABLE IF EXISTS prompt_blobs;
+
+-- Content-addressed prompt bodies: identical content is stored once
+CREATE TABLE prompt_blobs (
+    hash TEXT PRIMARY KEY, -- SHA-256 hex digest of the content
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL, -- UTF-8 length of the content in bytes
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Precomputed on write by database/metadata.py
+    char_count INTEGER,
+    word_count INTEGER,
+    token_estimate INTEGER
+);
+
+CREATE INDEX idx_prompt_blobs_char_count ON prompt_blobs(char_count);
+CREATE INDEX idx_prompt_blobs_word_count ON prompt_blobs(word_count);
+CREATE INDEX idx_prompt_blobs_token_estimate ON prompt_blobs(token_estimate);
+
+-- The {variables} used by each prompt body
+CREATE TABLE blob_variables (
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+    PRIMARY KEY (name, hash)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_blob_variables_hash ON blob_variables(hash);
 
 CREATE TABLE prompts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     prompt_name TEXT NOT NULL,
     ai_selection TEXT NOT NULL, -- JSON array of selected AIs
-    prompt_content TEXT NOT NULL,
+    content_hash TEXT NOT NULL REFERENCES prompt_blobs(hash),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Trigger to update the updated_at timestamp
-CREATE TRIGGER IF NOT EXISTS update_prompt_timestamp 
-AFTER UPDATE ON prompts
-BEGIN
-    UPDATE prompts SET updated_at = CURRENT_TIMESTAMP
-    WHERE id = NEW.id;
-END;
\ No newline at end of file
+CREATE INDEX idx_prompts_content_hash ON prompts(content_hash);
+
+-- Prompt revision history: every SNAPSHOT_INTERVAL-th version is a full
+-- snapshot (content_hash), the rest are line deltas against the previous one
+CREATE TABLE prompt_versions (
+    prompt_id INTEGER NOT NULL REFERENCES prompts(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    prompt_name TEXT NOT NULL,
+    ai_selection TEXT NOT NULL,
+    content_hash TEXT REFERENCES prompt_blobs(hash), -- set for snapshots
+    delta TEXT, -- JSON line edits, set for deltas
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (prompt_id, version)
+);
+
+CREATE INDEX idx_prompt_versions_content_hash ON prompt_versions(content_hash);
+
+-- MinHash signatures of prompt bodies and their LSH band buckets, used to
+-- find near-duplicate prompts without comparing every pair
+CREATE TABLE blob_minhash (
+    hash TEXT PRIMARY KEY REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+    signature BLOB NOT NULL -- NUM_PERM little-endian uint32 values
+);
+
+CREATE TABLE blob_lsh (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    hash TEXT NOT NULL REFERENCES prompt_blobs(hash) ON DELETE CASCADE,
+    PRIMARY KEY (band, bucket, hash)
+) WITHOUT ROWID;
+
+CREATE INDEX idx_blob_lsh_hash ON blob_lsh(hash);
+
+-- Background jobs (imports, exports, reindexing); the table is the queue
+CREATE TABLE jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued', -- queued, running, succeeded, failed, cancelled
+    params TEXT NOT NULL DEFAULT '{}', -- JSON keyword arguments for the handler
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT, -- JSON
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX idx_jobs_status ON jobs(status);
+
+-- Server-side usage counters, written in batches by database/usage.py
+CREATE TABLE prompt_usage (
+    prompt_id INTEGER PRIMARY KEY REFERENCES prompts(id) ON DELETE CASCADE,
+    copy_count INTEGER NOT NULL DEFAULT 0,
+    render_count INTEGER NOT NULL DEFAULT 0,
+    use_count INTEGER NOT NULL DEFAULT 0, -- copy_count + render_count
+    last_used_at TIMESTAMP
+);
+
+CREATE INDEX idx_prompt_usage_use_count ON prompt_usage(use_count DESC);
+
+-- Keep in sync with SCHEMA_VERSION in database/db.py
+PRAGMA user_version = 7;
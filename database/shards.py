@@ -0,0 +1,157 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from flask import current_app, g, has_app_context, jsonify, request
+from database.db import DatabaseError, migrate_db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKSPACE = "default"
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+# Endpoints backed by process-wide state (in-memory search indexes, usage
+# buffer, background jobs) that only covers the default workspace
+DEFAULT_ONLY_ENDPOINTS = {
+    "get_similar_prompts",
+    "record_prompt_usage",
+    "get_prompt_usage",
+    "get_top_prompts",
+    "search_names",
+    "name_index_stats",
+    "rebuild_name_index",
+    "search_similar",
+    "similarity_index_stats",
+    "rebuild_similarity_index",
+    "create_job",
+    "get_jobs",
+    "get_job",
+    "cancel_job",
+}
+
+# A workspace's database is only created by a write; reads of a workspace
+# that does not exist yet get 404 rather than an empty file on disk
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+_ready = set()
+_lock = threading.Lock()
+
+
+def current_workspace():
+    """The workspace of the current request or writer, else the default."""
+    if has_app_context():
+        return g.get("workspace", DEFAULT_WORKSPACE)
+    return DEFAULT_WORKSPACE
+
+
+def in_default_workspace():
+    return current_workspace() == DEFAULT_WORKSPACE
+
+
+def shard_path(workspace=None):
+    """Path of a workspace's database file."""
+    workspace = workspace or current_workspace()
+    if workspace == DEFAULT_WORKSPACE:
+        return current_app.config["DATABASE"]
+    return os.path.join(
+        current_app.config.get("WORKSPACE_DIR", "instance/workspaces"),
+        f"{workspace}.sqlite",
+    )
+
+
+def ensure_shard(workspace, create=True):
+    """Create a workspace's database from schema.sql, or migrate it.
+
+    Runs once per workspace and process; later calls are a set lookup.
+    Raises LookupError for a missing workspace when ``create`` is False,
+    and OverflowError when creating it would exceed ``MAX_WORKSPACES``.
+    """
+    if workspace in _ready:
+        return
+    with _lock:
+        if workspace in _ready:
+            return
+        path = shard_path(workspace)
+        if not os.path.exists(path):
+            if not create:
+                raise LookupError(f"No workspace named {workspace}")
+            limit = current_app.config.get("MAX_WORKSPACES")
+            if limit is not None and len(list_workspaces()) > limit:
+                raise OverflowError("Workspace limit reached")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=20)
+        conn.row_factory = sqlite3.Row
+        try:
+            exists = conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='prompts'"
+            ).fetchone()
+            if exists:
+                migrate_db(conn)
+            else:
+                schema_path = Path(current_app.root_path) / "database" / "schema.sql"
+                conn.executescript(schema_path.read_text())
+                conn.commit()
+                logger.info(f"Created database for workspace {workspace}")
+        except sqlite3.Error as e:
+            logger.error(f"Error preparing workspace {workspace}: {e}")
+            raise DatabaseError(f"Failed to prepare workspace database: {e}")
+        finally:
+            conn.close()
+        _ready.add(workspace)
+
+
+def list_workspaces():
+    """Names of the workspaces with a database file."""
+    directory = current_app.config.get("WORKSPACE_DIR", "instance/workspaces")
+    names = {DEFAULT_WORKSPACE}
+    if os.path.isdir(directory):
+        names.update(
+            name[: -len(".sqlite")]
+            for name in os.listdir(directory)
+            if name.endswith(".sqlite")
+        )
+    return sorted(names)
+
+
+def _select_workspace():
+    workspace = (
+        request.headers.get("X-Workspace")
+        or request.args.get("workspace")
+        or DEFAULT_WORKSPACE
+    ).lower()
+    if not _NAME_RE.match(workspace):
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "Workspace names use a-z, 0-9, '-' and '_'",
+                }
+            ),
+            400,
+        )
+    if workspace != DEFAULT_WORKSPACE and request.endpoint in DEFAULT_ONLY_ENDPOINTS:
+        return (
+            jsonify(
+                {
+                    "status": "error",
+                    "message": "This endpoint is only available in the default workspace",
+                }
+            ),
+            400,
+        )
+    try:
+        ensure_shard(workspace, create=request.method in WRITE_METHODS)
+    except LookupError as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except OverflowError as e:
+        return jsonify({"status": "error", "message": str(e)}), 403
+    g.workspace = workspace
+    return None
+
+
+def init_app(app):
+    """Route each request to its workspace's database."""
+    _ready.add(DEFAULT_WORKSPACE)
+    app.before_request(_select_workspace)
@@ -0,0 +1,426 @@
+import os
+import re
+import math
+import time
+import zlib
+import shutil
+import sqlite3
+import logging
+import threading
+from collections import deque
+import numpy as np
+from flask import current_app
+from database.db import get_db, DatabaseError
+from database.shards import in_default_workspace
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+# Width of the hashed feature space (unigrams and bigrams)
+DIMENSIONS = 2**18
+
+# Pending rows are folded into the on-disk matrix once there are this many
+MERGE_THRESHOLD = 1000
+
+
+def _fingerprint(digest):
+    """Shorten a content hash to a uint64 used to detect stale rows."""
+    return int(digest[:16], 16)
+
+
+def _features(text):
+    """Return the hashed unigram and bigram counts of a prompt body."""
+    words = _WORD_RE.findall(text.lower())
+    tokens = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = {}
+    for token in tokens:
+        feature = zlib.crc32(token.encode("utf-8")) % DIMENSIONS
+        counts[feature] = counts.get(feature, 0) + 1
+    return counts
+
+
+class SimilarityIndex:
+    """Hashed TF-IDF index over prompt content for cosine top-k queries.
+
+    The matrix is stored feature-major (CSC: ``indptr`` per feature into
+    parallel ``rows``/``data`` arrays), so a query only touches the posting
+    lists of its own features and all scores come out of one ``bincount``.
+    The arrays are persisted as ``.npy`` files and memory-mapped on load.
+    Writes go to a small in-memory ``pending`` set plus a tombstone mask over
+    the mapped rows, and are merged into a fresh matrix every
+    ``MERGE_THRESHOLD`` changes. Each row stores L2-normalised TF-IDF
+    weights computed with the document frequencies current at write time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.loaded = False
+        self.path = None
+        self._empty()
+
+    def _empty(self):
+        self._indptr = np.zeros(DIMENSIONS + 1, dtype=np.int64)
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._data = np.zeros(0, dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)  # row -> prompt id, sorted
+        self._fingerprints = np.zeros(0, dtype=np.uint64)
+        self._alive = np.zeros(0, dtype=bool)
+        self._df = np.zeros(DIMENSIONS, dtype=np.int32)
+        self._pending = {}  # prompt id -> (features, weights, fingerprint)
+
+    # Vectorising
+
+    def _vectorise(self, text):
+        counts = _features(text)
+        if not counts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        features = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+        tf = np.array([counts[f] for f in features.tolist()], dtype=np.float32)
+        idf = np.log((1 + self._documents()) / (1 + self._df[features])) + 1
+        weights = (1 + np.log(tf)) * idf
+        weights /= np.linalg.norm(weights)
+        return features, weights.astype(np.float32)
+
+    def _documents(self):
+        return int(self._alive.sum()) + len(self._pending)
+
+    # Row bookkeeping
+
+    def _base_row(self, prompt_id):
+        row = int(np.searchsorted(self._ids, prompt_id))
+        if row < len(self._ids) and self._ids[row] == prompt_id and self._alive[row]:
+            return row
+        return None
+
+    def _drop(self, prompt_id):
+        # Document frequencies of tombstoned base rows are corrected at the
+        # next merge, which recounts them from the surviving postings
+        pending = self._pending.pop(prompt_id, None)
+        if pending is not None:
+            self._df[pending[0]] -= 1
+        row = self._base_row(prompt_id)
+        if row is not None:
+            self._alive[row] = False
+
+    def _put(self, prompt_id, content, fingerprint):
+        self._drop(prompt_id)
+        features, weights = self._vectorise(content)
+        self._df[features] += 1
+        self._pending[prompt_id] = (features, weights, fingerprint)
+
+    def add(self, prompt_id, content, digest):
+        """Index (or re-index) a prompt body; a no-op until the index is loaded."""
+        if not in_default_workspace():
+            return  # the index only covers the default workspace
+        with self._lock:
+            if not self.loaded:
+                return
+            self._put(prompt_id, content, _fingerprint(digest))
+            self._maybe_merge()
+
+    def remove(self, prompt_id):
+        """Drop a prompt from the index."""
+        if not in_default_workspace():
+            return
+        with self._lock:
+            if self.loaded:
+                self._drop(prompt_id)
+                self._maybe_merge()
+
+    # Persistence
+
+    def _maybe_merge(self):
+        tombstones = len(self._alive) - int(self._alive.sum())
+        if len(self._pending) + tombstones >= MERGE_THRESHOLD:
+            self._merge()
+
+    def _merge(self):
+        """Fold pending rows and tombstones into a new matrix and persist it."""
+        # Surviving base entries as (feature, prompt id, weight) triples
+        features = np.repeat(
+            np.arange(DIMENSIONS, dtype=np.int32), np.diff(self._indptr)
+        )
+        keep = self._alive[self._rows]
+        features = features[keep]
+        prompt_ids = self._ids[self._rows[keep]]
+        data = np.asarray(self._data[keep], dtype=np.float32)
+
+        alive = np.flatnonzero(self._alive)
+        ids = self._ids[alive].tolist()
+        fingerprints = dict(zip(ids, self._fingerprints[alive].tolist()))
+
+        if self._pending:
+            pending_ids = list(self._pending)
+            features = np.concatenate(
+                [features] + [row[0] for row in self._pending.values()]
+            )
+            prompt_ids = np.concatenate(
+                [prompt_ids]
+                + [
+                    np.full(len(row[0]), prompt_id, dtype=np.int64)
+                    for prompt_id, row in self._pending.items()
+                ]
+            )
+            data = np.concatenate([data] + [row[1] for row in self._pending.values()])
+            fingerprints.update(
+                (prompt_id, row[2]) for prompt_id, row in self._pending.items()
+            )
+            ids.extend(pending_ids)
+
+        self._ids = np.unique(np.array(ids, dtype=np.int64))
+        self._fingerprints = np.array(
+            [fingerprints[i] for i in self._ids.tolist()], dtype=np.uint64
+        )
+        rows = np.searchsorted(self._ids, prompt_ids).astype(np.int32)
+        order = np.lexsort((rows, features))
+        self._rows = rows[order]
+        self._data = data[order]
+        counts = np.bincount(features, minlength=DIMENSIONS)
+        self._indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._df = counts.astype(np.int32)
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._pending = {}
+        self._save()
+
+    def _arrays(self):
+        return {
+            "indptr": self._indptr,
+            "rows": self._rows,
+            "data": self._data,
+            "ids": self._ids,
+            "fingerprints": self._fingerprints,
+        }
+
+    def _save(self):
+        if self.path is None:
+            return
+        staging = f"{self.path}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name, values in self._arrays().items():
+            np.save(os.path.join(staging, f"{name}.npy"), values)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(staging, self.path)
+        logger.debug(f"Saved similarity index with {len(self._ids)} rows")
+
+    def load(self, path=None):
+        """Memory-map the persisted index and reconcile it with the database.
+
+        Rows whose prompt was deleted are tombstoned and rows whose content
+        hash no longer matches are re-vectorised, so an index written by
+        another process or before a restart is safe to reuse.
+        """
+        path = path or current_app.config.get(
+            "SIMILARITY_INDEX_DIR", "instance/similarity"
+        )
+        try:
+            current = {
+                row["id"]: row["content_hash"]
+                for row in get_db().execute("SELECT id, content_hash FROM prompts")
+            }
+        except sqlite3.Error as e:
+            logger.error(f"Database error while loading similarity index: {e}")
+            raise DatabaseError(f"Failed to load similarity index: {e}")
+
+        with self._lock:
+            self.path = path
+            self._empty()
+            if os.path.isdir(path):
+                for name in self._arrays():
+                    values = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                    setattr(self, f"_{name}", values)
+                self._alive = np.ones(len(self._ids), dtype=bool)
+                self._df = np.diff(self._indptr).astype(np.int32)
+
+            stale = []
+            indexed = self._ids.tolist()
+            for row, fingerprint in enumerate(self._fingerprints.tolist()):
+                digest = current.get(indexed[row])
+                if digest is None:
+                    self._alive[row] = False
+                elif _fingerprint(digest) != fingerprint:
+                    stale.append(indexed[row])
+            indexed = set(indexed)
+            stale.extend(prompt_id for prompt_id in current if prompt_id not in indexed)
+            self.loaded = True
+
+        self._reindex(stale)
+        logger.info(
+            f"Loaded similarity index with {len(self._ids)} rows, "
+            f"{len(stale)} re-indexed"
+        )
+        return self.stats()
+
+    def _reindex(self, prompt_ids):
+        db = get_db()
+        for start in range(0, len(prompt_ids), 500):
+            batch = prompt_ids[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = db.execute(
+                f"""SELECT p.id, p.content_hash, b.content
+                    FROM prompts p
+                    JOIN prompt_blobs b ON b.hash = p.content_hash
+                    WHERE p.id IN ({placeholders})""",
+                batch,
+            ).fetchall()
+            with self._lock:
+                for row in rows:
+                    self._put(
+                        row["id"], row["content"], _fingerprint(row["content_hash"])
+                    )
+        with self._lock:
+            tombstones = len(self._alive) - int(self._alive.sum())
+            if self._pending or tombstones:
+                self._merge()
+
+    def rebuild(self):
+        """Discard the persisted index and re-vectorise every prompt."""
+        path = self.path or current_app.config.get(
+            "SIMILARITY_INDEX_DIR", "instance/similarity"
+        )
+        shutil.rmtree(path, ignore_errors=True)
+        self.loaded = False
+        return self.load(path)
+
+    # Queries
+
+    def _scores(self, features, weights):
+        """Cosine scores of every row against a query vector.
+
+        Gathers the posting lists of the query features, scales them by the
+        query weights and sums them per row with a single ``bincount``.
+        """
+        starts = self._indptr[features]
+        ends = self._indptr[features + 1]
+        rows = [self._rows[a:b] for a, b in zip(starts.tolist(), ends.tolist())]
+        data = [
+            self._data[a:b] * weight
+            for a, b, weight in zip(starts.tolist(), ends.tolist(), weights.tolist())
+        ]
+        scores = np.bincount(
+            np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32),
+            weights=np.concatenate(data) if data else None,
+            minlength=len(self._ids),
+        )
+        scores[~self._alive] = 0.0
+
+        # Pending rows are few; score them against a dense query vector
+        query = np.zeros(DIMENSIONS, dtype=np.float32)
+        query[features] = weights
+        pending_ids = np.fromiter(self._pending, dtype=np.int64)
+        pending_scores = np.array(
+            [float(query[row[0]] @ row[1]) for row in self._pending.values()],
+            dtype=np.float64,
+        )
+        return (
+            np.concatenate((self._ids, pending_ids)),
+            np.concatenate((scores, pending_scores)),
+        )
+
+    def _top(self, features, weights, k, exclude=None):
+        ids, scores = self._scores(features, weights)
+        if exclude is not None:
+            scores[ids == exclude] = 0.0
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": int(ids[i]), "score": round(float(scores[i]), 4)}
+            for i in top
+            if scores[i] > 0
+        ]
+
+    def _timed(self, query):
+        started = time.perf_counter()
+        with self._lock:
+            results = query()
+        self._latencies.append(time.perf_counter() - started)
+        return _with_names(results)
+
+    def similar(self, prompt_id, k=10):
+        """Return the prompts most similar to an existing prompt."""
+        if not self.loaded:
+            self.load()
+        try:
+            prompt = (
+                get_db()
+                .execute(
+                    """SELECT b.content FROM prompts p
+                       JOIN prompt_blobs b ON b.hash = p.content_hash
+                       WHERE p.id = ?""",
+                    (prompt_id,),
+                )
+                .fetchone()
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Database error in similar: {e}")
+            raise DatabaseError(f"Failed to look up prompt: {e}")
+        if prompt is None:
+            return None
+
+        return self._timed(
+            lambda: self._top(*self._vectorise(prompt["content"]), k, exclude=prompt_id)
+        )
+
+    def search(self, text, k=10):
+        """Return the prompts whose content is most similar to ``text``."""
+        if not self.loaded:
+            self.load()
+        return self._timed(lambda: self._top(*self._vectorise(text), k))
+
+    def stats(self):
+        """Report index size and query latency percentiles in milliseconds."""
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                index = min(len(latencies) - 1, math.ceil(p * len(latencies)) - 1)
+                return round(latencies[index] * 1000, 3)
+
+            return {
+                "loaded": self.loaded,
+                "rows": self._documents(),
+                "pending": len(self._pending),
+                "tombstones": len(self._alive) - int(self._alive.sum()),
+                "nnz": int(len(self._data))
+                + sum(len(row[0]) for row in self._pending.values()),
+                "matrix_bytes": int(
+                    self._data.nbytes + self._rows.nbytes + self._indptr.nbytes
+                ),
+                "queries": len(latencies),
+                "p50_ms": percentile(0.5),
+                "p99_ms": percentile(0.99),
+            }
+
+
+def _with_names(results):
+    """Attach prompt names to ``{"id", "score"}`` results."""
+    if not results:
+        return results
+    ids = [result["id"] for result in results]
+    placeholders = ",".join("?" * len(ids))
+    try:
+        names = {
+            row["id"]: row["prompt_name"]
+            for row in get_db().execute(
+                f"SELECT id, prompt_name FROM prompts WHERE id IN ({placeholders})",
+                ids,
+            )
+        }
+    except sqlite3.Error as e:
+        logger.error(f"Database error in similarity lookup: {e}")
+        raise DatabaseError(f"Failed to look up similar prompts: {e}")
+    return [
+        {**result, "prompt_name": names[result["id"]]}
+        for result in results
+        if result["id"] in names
+    ]
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,214 @@
+import re
+import sys
+import time
+import heapq
+import sqlite3
+import logging
+import threading
+from array import array
+from collections import Counter
+from database.db import get_db, DatabaseError
+from database.shards import in_default_workspace
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Return the set of trigrams of a name, pg_trgm style.
+
+    Names are lowercased and split into words; every word is padded with two
+    leading spaces and one trailing space so that short words and word
+    boundaries still produce trigrams.
+    """
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """In-memory trigram index over prompt, tag and list names.
+
+    Entries are keyed by ``(kind, id)`` and stored in integer slots so the
+    posting lists can be compact ``array`` objects rather than sets of
+    tuples. The index is loaded from the database on first use and then
+    kept current by the write functions in ``database.db`` via :meth:`add`
+    and :meth:`remove`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.built = False
+        self.built_at = None
+        self.build_seconds = None
+
+    def _reset(self):
+        self._postings = {}  # trigram -> array of slots
+        self._slots = {}  # (kind, id) -> slot
+        self._keys = []  # slot -> (kind, id), None once freed
+        self._names = []  # slot -> name
+        self._sizes = array("H")  # slot -> trigram count
+        self._free = []
+
+    def _add(self, key, name):
+        grams = trigrams(name)
+        if self._free:
+            slot = self._free.pop()
+            self._keys[slot] = key
+            self._names[slot] = name
+            self._sizes[slot] = min(len(grams), 0xFFFF)
+        else:
+            slot = len(self._keys)
+            self._keys.append(key)
+            self._names.append(name)
+            self._sizes.append(min(len(grams), 0xFFFF))
+        self._slots[key] = slot
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(slot)
+
+    def _remove(self, key):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        for gram in trigrams(self._names[slot]):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.remove(slot)
+                if not postings:
+                    del self._postings[gram]
+        self._keys[slot] = None
+        self._names[slot] = None
+        self._free.append(slot)
+
+    def add(self, kind, id, name):
+        """Index (or re-index) a name; a no-op until the index is built."""
+        if kind == "prompt" and not in_default_workspace():
+            return  # the index only covers the default workspace's prompts
+        with self._lock:
+            if not self.built:
+                return
+            self._remove((kind, id))
+            self._add((kind, id), name)
+
+    def remove(self, kind, id):
+        """Drop a name from the index."""
+        if kind == "prompt" and not in_default_workspace():
+            return
+        with self._lock:
+            if self.built:
+                self._remove((kind, id))
+
+    def rebuild(self):
+        """Reload every prompt, tag and list name from the database."""
+        from sqlalchemy.exc import SQLAlchemyError
+        from database.models import List, Tag
+
+        started = time.perf_counter()
+        try:
+            rows = [
+                ("prompt", row["id"], row["prompt_name"])
+                for row in get_db().execute("SELECT id, prompt_name FROM prompts")
+            ]
+            # Tags and lists live in the task database, not the prompt one
+            for kind, model in (("tag", Tag), ("list", List)):
+                rows.extend(
+                    (kind, id, name)
+                    for id, name in model.query.with_entities(model.id, model.name)
+                )
+        except (sqlite3.Error, SQLAlchemyError) as e:
+            logger.error(f"Database error while building name index: {e}")
+            raise DatabaseError(f"Failed to build name index: {e}")
+
+        with self._lock:
+            self._reset()
+            for kind, id, name in rows:
+                self._add((kind, id), name)
+            self.built = True
+            self.built_at = time.time()
+            self.build_seconds = round(time.perf_counter() - started, 4)
+
+        logger.info(f"Built name index with {len(rows)} names in {self.build_seconds}s")
+        return self.stats()
+
+    def search(self, query, k=10, kind=None, min_score=0.1):
+        """Return the top ``k`` names most similar to ``query``.
+
+        Similarity is the trigram Jaccard index
+        ``shared / (query + name - shared)``, which tolerates typos and
+        transpositions that a ``LIKE`` match would miss.
+        """
+        if not self.built:
+            self.rebuild()
+
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        query_size = len(query_grams)
+        # A name can only reach min_score if it shares at least this many
+        # trigrams with the query, which prunes most candidates cheaply
+        min_shared = min_score * query_size
+
+        with self._lock:
+            shared = Counter()
+            for gram in query_grams:
+                postings = self._postings.get(gram)
+                if postings:
+                    shared.update(postings)
+
+            sizes = self._sizes
+            scored = []
+            for slot, count in shared.items():
+                if count < min_shared:
+                    continue
+                score = count / (query_size + sizes[slot] - count)
+                if score >= min_score and (kind is None or self._keys[slot][0] == kind):
+                    scored.append((score, slot))
+
+            top = heapq.nlargest(k, scored)
+            return [
+                {
+                    "kind": self._keys[slot][0],
+                    "id": self._keys[slot][1],
+                    "name": self._names[slot],
+                    "score": round(score, 4),
+                }
+                for score, slot in top
+            ]
+
+    def stats(self):
+        """Report index size and approximate memory usage in bytes."""
+        with self._lock:
+            postings_bytes = sys.getsizeof(self._postings) + sum(
+                sys.getsizeof(gram) + sys.getsizeof(slots)
+                for gram, slots in self._postings.items()
+            )
+            names_bytes = (
+                sys.getsizeof(self._slots)
+                + sys.getsizeof(self._keys)
+                + sys.getsizeof(self._names)
+                + sys.getsizeof(self._sizes)
+                + sum(
+                    sys.getsizeof(key) + sys.getsizeof(self._names[slot])
+                    for key, slot in self._slots.items()
+                )
+            )
+            return {
+                "built": self.built,
+                "built_at": self.built_at,
+                "build_seconds": self.build_seconds,
+                "names": len(self._slots),
+                "trigrams": len(self._postings),
+                "postings": sum(len(keys) for keys in self._postings.values()),
+                "memory_bytes": postings_bytes + names_bytes,
+            }
+
+
+name_index = NameIndex()
@@ -0,0 +1,228 @@
+import sqlite3
+import atexit
+import logging
+import threading
+from datetime import datetime
+from database.db import get_db, DatabaseError
+from database.writer import write_operation
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("copy", "render")
+
+
+class UsageCounter:
+    """Buffers prompt usage events in memory and flushes them in batches.
+
+    Each worker aggregates increments per prompt and writes them with a
+    single multi-row UPSERT every ``USAGE_FLUSH_INTERVAL`` seconds or once
+    ``USAGE_FLUSH_EVENTS`` events are buffered, whichever comes first, so a
+    hot prompt costs one write per flush instead of one per click.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 5.0
+        self.flush_events = 500
+        self._lock = threading.Lock()
+        self._pending = {}  # prompt id -> [copies, renders, last used]
+        self._events = 0
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.events_flushed = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get("USAGE_FLUSH_INTERVAL", 5.0)
+        self.flush_events = app.config.get("USAGE_FLUSH_EVENTS", 500)
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="usage-flush", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self._flush_in_context)
+
+    def record(self, prompt_id, event):
+        """Count a copy or render of a prompt."""
+        if event not in EVENTS:
+            raise ValueError(f"Event must be one of: {', '.join(EVENTS)}")
+
+        with self._lock:
+            counts = self._pending.setdefault(prompt_id, [0, 0, None])
+            counts[EVENTS.index(event)] += 1
+            counts[2] = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+            self._events += 1
+            full = self._events >= self.flush_events
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self._flush_in_context()
+            except Exception as e:
+                logger.error(f"Error flushing usage counters: {e}")
+
+    def _flush_in_context(self):
+        if self.app is None:
+            return
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        """Write all buffered increments in one transaction."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            events, self._events = self._events, 0
+        if not pending:
+            return 0
+
+        rows = [
+            (prompt_id, copies, renders, copies + renders, last_used)
+            for prompt_id, (copies, renders, last_used) in pending.items()
+        ]
+        try:
+            _write_usage(rows)
+        except DatabaseError:
+            # Put the increments back so they are retried on the next flush
+            with self._lock:
+                for prompt_id, (copies, renders, last_used) in pending.items():
+                    counts = self._pending.setdefault(prompt_id, [0, 0, None])
+                    counts[0] += copies
+                    counts[1] += renders
+                    counts[2] = max(filter(None, (counts[2], last_used)))
+                self._events += events
+            raise
+
+        self.flushes += 1
+        self.rows_flushed += len(rows)
+        self.events_flushed += events
+        logger.debug(f"Flushed {events} usage events for {len(rows)} prompts")
+        return len(rows)
+
+    def pending(self):
+        """Copy of the buffered increments, as (copies, renders, last used)."""
+        with self._lock:
+            return {
+                prompt_id: tuple(counts) for prompt_id, counts in self._pending.items()
+            }
+
+    def stats(self):
+        """Report buffered and flushed event counts for this worker."""
+        with self._lock:
+            return {
+                "pending_events": self._events,
+                "pending_prompts": len(self._pending),
+                "flushes": self.flushes,
+                "rows_flushed": self.rows_flushed,
+                "events_flushed": self.events_flushed,
+                "flush_interval": self.flush_interval,
+                "flush_events": self.flush_events,
+            }
+
+
+@write_operation
+def _write_usage(rows):
+    db = get_db()
+    try:
+        # Prompts deleted since the event was buffered are skipped
+        db.executemany(
+            """INSERT INTO prompt_usage
+                   (prompt_id, copy_count, render_count, use_count, last_used_at)
+               SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM prompts WHERE id = ?1)
+               ON CONFLICT(prompt_id) DO UPDATE SET
+                   copy_count = copy_count + excluded.copy_count,
+                   render_count = render_count + excluded.render_count,
+                   use_count = use_count + excluded.use_count,
+                   last_used_at = MAX(last_used_at, excluded.last_used_at)""",
+            rows,
+        )
+        db.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error flushing usage counters: {e}")
+        db.rollback()
+        raise DatabaseError(f"Failed to flush usage counters: {e}")
+
+
+usage_counter = UsageCounter()
+
+
+def init_app(app):
+    """Start the usage flusher for the Flask app."""
+    usage_counter.init_app(app)
+
+
+def get_usage(prompt_id):
+    """Get the usage counters of a prompt."""
+    try:
+        row = (
+            get_db()
+            .execute("SELECT * FROM prompt_usage WHERE prompt_id = ?", (prompt_id,))
+            .fetchone()
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_usage: {e}")
+        raise DatabaseError(f"Failed to retrieve prompt usage: {e}")
+
+    if row is None:
+        return {
+            "prompt_id": prompt_id,
+            "copy_count": 0,
+            "render_count": 0,
+            "use_count": 0,
+            "last_used_at": None,
+        }
+    return dict(row)
+
+
+def get_top_prompts(limit=10):
+    """Get the most used prompts, served from the use_count index.
+
+    This worker's unflushed increments are added on top, so reads stay off
+    the writer. Only prompts in the flushed top ``limit`` or with pending
+    increments can make the list, so those are the only ones fetched.
+    """
+    pending = usage_counter.pending()
+    try:
+        db = get_db()
+        rows = db.execute(
+            """SELECT u.prompt_id, p.prompt_name, u.copy_count, u.render_count,
+                      u.use_count, u.last_used_at
+               FROM prompt_usage u
+               JOIN prompts p ON p.id = u.prompt_id
+               ORDER BY u.use_count DESC
+               LIMIT ?""",
+            (limit,),
+        ).fetchall()
+        top = {row["prompt_id"]: dict(row) for row in rows}
+        missing = [prompt_id for prompt_id in pending if prompt_id not in top]
+        if missing:
+            placeholders = ", ".join("?" * len(missing))
+            rows = db.execute(
+                f"""SELECT p.id AS prompt_id, p.prompt_name,
+                           COALESCE(u.copy_count, 0) AS copy_count,
+                           COALESCE(u.render_count, 0) AS render_count,
+                           COALESCE(u.use_count, 0) AS use_count,
+                           u.last_used_at
+                    FROM prompts p
+                    LEFT JOIN prompt_usage u ON u.prompt_id = p.id
+                    WHERE p.id IN ({placeholders})""",
+                missing,
+            ).fetchall()
+            top.update((row["prompt_id"], dict(row)) for row in rows)
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_top_prompts: {e}")
+        raise DatabaseError(f"Failed to retrieve top prompts: {e}")
+
+    for prompt_id, (copies, renders, last_used) in pending.items():
+        row = top.get(prompt_id)
+        if row is None:
+            continue  # deleted since the event was recorded
+        row["copy_count"] += copies
+        row["render_count"] += renders
+        row["use_count"] += copies + renders
+        row["last_used_at"] = max(filter(None, (row["last_used_at"], last_used)))
+    return sorted(top.values(), key=lambda row: row["use_count"], reverse=True)[:limit]
@@ -0,0 +1,211 @@
+import sqlite3
+import json
+import difflib
+import logging
+from database.db import get_db, DatabaseError, content_hash, _store_blob
+
+logger = logging.getLogger(__name__)
+
+# Every SNAPSHOT_INTERVAL-th version is stored in full (through the prompt
+# blob table), everything in between as a line delta against its
+# predecessor. Reconstructing any version therefore applies at most
+# SNAPSHOT_INTERVAL - 1 deltas.
+SNAPSHOT_INTERVAL = 10
+
+
+def _line_delta(old, new):
+    """Encode ``new`` as a list of ``[start, end, text]`` line edits on ``old``."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    return [
+        [i1, i2, "".join(new_lines[j1:j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _apply_delta(old, delta):
+    """Rebuild a version from its predecessor and the stored line edits."""
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    position = 0
+    for start, end, text in delta:
+        parts.extend(old_lines[position:start])
+        parts.append(text)
+        position = end
+    parts.extend(old_lines[position:])
+    return "".join(parts)
+
+
+def record_version(db, prompt_id, prompt_name, ai_selection, prompt_content, previous):
+    """Append a version for a prompt inside the caller's transaction.
+
+    ``previous`` is the prompt body of the latest recorded version (or None
+    for the first one); it is the base the delta is computed against.
+    ``ai_selection`` is the JSON-encoded selection stored on the prompt.
+    """
+    last = db.execute(
+        "SELECT MAX(version) FROM prompt_versions WHERE prompt_id = ?",
+        (prompt_id,),
+    ).fetchone()[0]
+    version = (last or 0) + 1
+
+    delta = None
+    if previous is not None and (version - 1) % SNAPSHOT_INTERVAL:
+        delta = json.dumps(_line_delta(previous, prompt_content))
+        # Fall back to a snapshot when the delta would not save anything
+        if len(delta) >= len(prompt_content):
+            delta = None
+
+    digest = None
+    if delta is None:
+        digest = _store_blob(db, prompt_content)
+
+    db.execute(
+        """INSERT INTO prompt_versions
+               (prompt_id, version, prompt_name, ai_selection, content_hash, delta, size)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        (
+            prompt_id,
+            version,
+            prompt_name,
+            ai_selection,
+            digest,
+            delta,
+            len(prompt_content.encode("utf-8")),
+        ),
+    )
+    return version
+
+
+def ensure_base_version(db, prompt_id):
+    """Record the current state of a prompt as its first version if it has none."""
+    has_history = db.execute(
+        "SELECT 1 FROM prompt_versions WHERE prompt_id = ? LIMIT 1", (prompt_id,)
+    ).fetchone()
+    if has_history:
+        return
+
+    prompt = db.execute(
+        """SELECT p.prompt_name, p.ai_selection, b.content
+           FROM prompts p
+           JOIN prompt_blobs b ON b.hash = p.content_hash
+           WHERE p.id = ?""",
+        (prompt_id,),
+    ).fetchone()
+    if prompt is not None:
+        record_version(
+            db,
+            prompt_id,
+            prompt["prompt_name"],
+            prompt["ai_selection"],
+            prompt["content"],
+            previous=None,
+        )
+
+
+def get_versions(prompt_id):
+    """List the versions of a prompt, newest first, without their content."""
+    try:
+        rows = (
+            get_db()
+            .execute(
+                """SELECT version, prompt_name, size, created_at,
+                          content_hash IS NOT NULL AS is_snapshot
+                   FROM prompt_versions
+                   WHERE prompt_id = ?
+                   ORDER BY version DESC""",
+                (prompt_id,),
+            )
+            .fetchall()
+        )
+        return [
+            {
+                "version": row["version"],
+                "prompt_name": row["prompt_name"],
+                "size": row["size"],
+                "snapshot": bool(row["is_snapshot"]),
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_versions: {e}")
+        raise DatabaseError(f"Failed to retrieve prompt versions: {e}")
+
+
+def get_version(prompt_id, version):
+    """Reconstruct a single version of a prompt."""
+    try:
+        # The nearest snapshot at or below the version plus the deltas after it
+        rows = (
+            get_db()
+            .execute(
+                """SELECT v.version, v.prompt_name, v.ai_selection, v.delta,
+                          v.size, v.created_at, b.content AS snapshot
+                   FROM prompt_versions v
+                   LEFT JOIN prompt_blobs b ON b.hash = v.content_hash
+                   WHERE v.prompt_id = ?
+                     AND v.version <= ?
+                     AND v.version >= (
+                         SELECT MAX(version) FROM prompt_versions
+                         WHERE prompt_id = ? AND version <= ?
+                           AND content_hash IS NOT NULL)
+                   ORDER BY v.version""",
+                (prompt_id, version, prompt_id, version),
+            )
+            .fetchall()
+        )
+        if not rows or rows[-1]["version"] != version:
+            return None
+
+        content = rows[0]["snapshot"]
+        for row in rows[1:]:
+            content = _apply_delta(content, json.loads(row["delta"]))
+
+        target = rows[-1]
+        return {
+            "prompt_id": prompt_id,
+            "version": version,
+            "prompt_name": target["prompt_name"],
+            "ai_selection": json.loads(target["ai_selection"]),
+            "prompt_content": content,
+            "content_hash": content_hash(content),
+            "size": target["size"],
+            "created_at": target["created_at"],
+        }
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_version: {e}")
+        raise DatabaseError(f"Failed to retrieve prompt version: {e}")
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in get_version: {e}")
+        raise DatabaseError(f"Invalid version data in database: {e}")
+
+
+def diff_versions(prompt_id, from_version, to_version):
+    """Return a unified diff between two versions of a prompt."""
+    old = get_version(prompt_id, from_version)
+    new = get_version(prompt_id, to_version)
+    if old is None or new is None:
+        return None
+
+    diff = []
+    for line in difflib.unified_diff(
+        old["prompt_content"].splitlines(keepends=True),
+        new["prompt_content"].splitlines(keepends=True),
+        fromfile=f"v{from_version}",
+        tofile=f"v{to_version}",
+    ):
+        diff.append(line)
+        # Mark a last line without a newline the way diff(1) does, rather
+        # than letting it run into the next line of the output
+        if not line.endswith("\n"):
+            diff.append("\n\\ No newline at end of file\n")
+    return {
+        "prompt_id": prompt_id,
+        "from_version": from_version,
+        "to_version": to_version,
+        "name_changed": old["prompt_name"] != new["prompt_name"],
+        "diff": "".join(diff),
+    }
@@ -0,0 +1,298 @@
+import queue
+import sqlite3
+import logging
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from flask import g
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class _GroupCommitConnection:
+    """Connection handed to write operations running on the writer thread.
+
+    Operations keep calling ``commit()`` and ``rollback()`` as usual; the
+    writer turns those into savepoint handling so several operations can
+    share one transaction.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self._conn.execute("ROLLBACK TO write_op")
+
+
+class DatabaseWriter:
+    """Serialises the writes of one workspace through one thread.
+
+    Request threads submit write operations to a queue and wait on a
+    future. The writer thread drains up to ``WRITER_BATCH_SIZE`` queued
+    operations, runs each under its own savepoint inside a single
+    ``BEGIN IMMEDIATE`` transaction and commits once, so concurrent writers
+    stop fighting over the database lock. A failing operation only rolls
+    back its own savepoint.
+    """
+
+    def __init__(self, app, workspace, path):
+        self.app = app
+        self.workspace = workspace
+        self.path = path
+        self.batch_size = app.config.get("WRITER_BATCH_SIZE", 64)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.operations = 0
+        self.failed = 0
+        self.max_batch = 0
+        self.batch_sizes = {}
+        self.last_commit_ms = None
+        self._thread = threading.Thread(
+            target=self._run, name=f"db-writer-{workspace}", daemon=True
+        )
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=20,
+            isolation_level=None,  # transactions are managed by the writer
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        # WAL lets the read-only request connections run alongside the writer
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue a write operation and return a Future for its result."""
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def stop(self):
+        """Finish the queued operations, then close the connection."""
+        self._queue.put(None)
+
+    def _run(self):
+        _local.writer = self
+        _local.after_commit = []
+        with self.app.app_context():
+            conn = self._connect()
+            g.db = _GroupCommitConnection(conn)
+            g.workspace = self.workspace
+            while True:
+                batch = [self._queue.get()]
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is None
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._commit_batch(conn, batch)
+                if stopping:
+                    break
+            g.pop("db")
+            conn.close()
+        logger.debug(f"Closed writer for workspace {self.workspace}")
+
+    def _commit_batch(self, conn, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_op")
+                mark = len(_local.after_commit)
+                try:
+                    outcomes.append((future, fn(*args, **kwargs), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_op")
+                    del _local.after_commit[mark:]
+                    outcomes.append((future, None, e))
+                conn.execute("RELEASE write_op")
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            from database.db import DatabaseError
+
+            logger.error(f"Group commit of {len(batch)} operations failed: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            _local.after_commit.clear()
+            for fn, args, kwargs, future in batch:
+                if not future.done():
+                    future.set_exception(DatabaseError(f"Failed to commit write: {e}"))
+            return
+
+        callbacks, _local.after_commit = _local.after_commit, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error in after-commit callback: {e}")
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        with self._lock:
+            self.batches += 1
+            self.operations += len(outcomes)
+            self.failed += sum(1 for outcome in outcomes if outcome[2] is not None)
+            self.max_batch = max(self.max_batch, len(batch))
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+            self.last_commit_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def stats(self):
+        """Report queue depth and group-commit batch sizes."""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "operations": self.operations,
+                "failed": self.failed,
+                "avg_batch": (
+                    round(self.operations / self.batches, 2) if self.batches else None
+                ),
+                "max_batch": self.max_batch,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "last_commit_ms": self.last_commit_ms,
+            }
+
+
+class WriterPool:
+    """One DatabaseWriter per workspace, at most ``MAX_OPEN_SHARDS`` open.
+
+    Writers are created on first write to a workspace and the least
+    recently used one is stopped (after draining its queue) when the limit
+    is exceeded, so idle workspaces do not hold a thread and connection.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.timeout = 30
+        self.max_open = 16
+        self._writers = OrderedDict()
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evicted = 0
+
+    @property
+    def running(self):
+        return self.app is not None
+
+    def on_writer_thread(self):
+        return getattr(_local, "writer", None) is not None
+
+    def init_app(self, app):
+        self.app = app
+        self.timeout = app.config.get("WRITER_TIMEOUT", 30)
+        self.max_open = app.config.get("MAX_OPEN_SHARDS", 16)
+
+    def submit(self, workspace, path, fn, *args, **kwargs):
+        """Queue a write on the workspace's writer, opening it if needed."""
+        with self._lock:
+            writer = self._writers.get(workspace)
+            if writer is None:
+                writer = self._writers[workspace] = DatabaseWriter(
+                    self.app, workspace, path
+                )
+                self.opened += 1
+                if len(self._writers) > self.max_open:
+                    _, idle = self._writers.popitem(last=False)
+                    idle.stop()
+                    self.evicted += 1
+            else:
+                self._writers.move_to_end(workspace)
+            # Submitted under the lock so an eviction cannot slip its stop
+            # marker in front of this operation
+            return writer.submit(fn, *args, **kwargs)
+
+    def stats(self):
+        """Report open writers with their queue depth and batch sizes."""
+        with self._lock:
+            writers = {name: writer.stats() for name, writer in self._writers.items()}
+            return {
+                "running": self.running,
+                "queue_depth": sum(w["queue_depth"] for w in writers.values()),
+                "open_writers": len(writers),
+                "max_open": self.max_open,
+                "opened": self.opened,
+                "evicted": self.evicted,
+                "workspaces": writers,
+            }
+
+
+writer = WriterPool()
+
+
+def init_app(app):
+    """Start routing writes through writers unless SINGLE_WRITER = False."""
+    if app.config.get("SINGLE_WRITER", True):
+        writer.init_app(app)
+
+
+def after_commit(callback):
+    """Run ``callback()`` once the current write is durable.
+
+    On a writer thread that is after the batch commits, and never if the
+    operation or batch is rolled back; elsewhere the caller has already
+    committed, so it runs at once.
+    """
+    if writer.on_writer_thread():
+        _local.after_commit.append(callback)
+    else:
+        callback()
+
+
+def write_operation(fn):
+    """Route a database write function through its workspace's writer.
+
+    Calls from any other thread are queued and block until the batch they
+    land in has committed. Calls on a writer thread itself, or when writers
+    are disabled (scripts, tests), run directly.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not writer.running or writer.on_writer_thread():
+            return fn(*args, **kwargs)
+
+        from database.shards import current_workspace, shard_path
+
+        future = writer.submit(current_workspace(), shard_path(), fn, *args, **kwargs)
+        try:
+            return future.result(timeout=writer.timeout)
+        except FutureTimeout:
+            # Only report a failure if the write can no longer happen; once
+            # the writer has started it, wait for its real outcome so a
+            # retrying client does not apply it twice
+            if not future.cancel():
+                return future.result()
+            from database.db import DatabaseError
+
+            raise DatabaseError(
+                f"Timed out after {writer.timeout}s waiting for the database writer"
+            )
+
+    return wrapper
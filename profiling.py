@@ -0,0 +1,275 @@
+import hmac
+import json
+import os
+import re
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from urllib.parse import urlencode
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_RE = re.compile(r"^\d{20}-[0-9a-f]{6}$")
+
+# Stacks below this share of the request time are left out of the
+# collapsed output
+MIN_STACK_SHARE = 0.001
+MAX_STACK_DEPTH = 64
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        # Built-ins are reported as ('~', 0, '<built-in method ...>')
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats):
+    """Flamegraph-ready ``frame;frame;frame microseconds`` lines.
+
+    cProfile records caller/callee pairs rather than whole stacks, so the
+    stacks are rebuilt top-down from the entry points, splitting each
+    function's time among its callees in proportion to the time spent in
+    each call edge. Recursion is cut at the first repeat.
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+    total = sum(stats.stats[func][3] for func in roots) or 1.0
+    lines = {}
+
+    def walk(func, seconds, stack):
+        _, _, tottime, cumtime, _ = stats.stats[func]
+        if seconds < total * MIN_STACK_SHARE:
+            return
+        stack = stack + [_label(func)]
+        scale = seconds / cumtime if cumtime else 0.0
+        self_time = tottime * scale
+        for callee, edge_time in callees.get(func, ()):
+            if _label(callee) in stack or len(stack) >= MAX_STACK_DEPTH:
+                self_time += edge_time * scale
+            else:
+                walk(callee, edge_time * scale, stack)
+        key = ";".join(stack)
+        lines[key] = lines.get(key, 0.0) + self_time
+
+    for root in roots:
+        walk(root, stats.stats[root][3], [])
+    return [
+        f"{stack} {round(seconds * 1e6)}"
+        for stack, seconds in sorted(lines.items())
+        if round(seconds * 1e6) > 0
+    ]
+
+
+def top_functions(stats, n=20, sort="cumulative"):
+    """The ``n`` most expensive functions by cumulative or own time."""
+    index = {"cumulative": 3, "tottime": 2, "calls": 1}[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)
+    return [
+        {
+            "function": _label(func),
+            "calls": calls,
+            "primitive_calls": primitive,
+            "tottime_ms": round(tottime * 1000, 3),
+            "cumtime_ms": round(cumtime * 1000, 3),
+        }
+        for func, (primitive, calls, tottime, cumtime, _) in rows[:n]
+    ]
+
+
+def _request_path():
+    # The token must not end up in the stored summary
+    args = [(k, v) for k, v in request.args.items(multi=True) if k != "_profile"]
+    return request.path + ("?" + urlencode(args) if args else "")
+
+
+class Profiler:
+    """Profiles single requests with cProfile when asked to.
+
+    A request is profiled when it carries ``X-Profile: <PROFILE_TOKEN>``
+    (or ``?_profile=<PROFILE_TOKEN>``), or at random for a
+    ``PROFILE_SAMPLE_RATE`` share of requests. Profiles are kept in
+    ``PROFILE_DIR`` as pstats files plus a JSON summary, oldest removed past
+    ``PROFILE_MAX_FILES``.
+
+    Only one request is profiled at a time; others go unprofiled rather
+    than wait. With neither a token nor a sample rate configured no hooks
+    are installed, so there is no per-request cost.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.sample_rate = 0.0
+        self.directory = "instance/profiles"
+        self.max_files = 100
+        self._busy = threading.Lock()
+        self._store_lock = threading.Lock()
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def init_app(self, app):
+        self.token = app.config.get("PROFILE_TOKEN")
+        self.sample_rate = app.config.get("PROFILE_SAMPLE_RATE") or 0.0
+        self.directory = app.config.get("PROFILE_DIR", self.directory)
+        self.max_files = app.config.get("PROFILE_MAX_FILES", self.max_files)
+        self.enabled = bool(self.token or self.sample_rate)
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            app.before_request(self._before_request)
+            app.teardown_request(self._teardown_request)
+
+    def authorised(self):
+        """Whether the request carries the admin profiling token."""
+        if not self.token:
+            return False
+        supplied = request.headers.get("X-Profile") or request.args.get("_profile")
+        return bool(supplied) and hmac.compare_digest(supplied, self.token)
+
+    def _trigger(self):
+        if self.authorised():
+            return "token"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    def _before_request(self):
+        if request.endpoint in (None, "static") or request.path.startswith(
+            "/api/profiles"
+        ):
+            return None
+        trigger = self._trigger()
+        if trigger is None:
+            return None
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns the hook
+            self._busy.release()
+            return None
+        g.profile = (profile, trigger, time.perf_counter())
+        return None
+
+    def _teardown_request(self, e=None):
+        active = g.pop("profile", None)
+        if active is None:
+            return
+        profile, trigger, started = active
+        try:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            self._save(profile, trigger, elapsed, e)
+        except Exception as error:
+            logger.error(f"Error saving request profile: {error}")
+        finally:
+            self._busy.release()
+
+    def _save(self, profile, trigger, elapsed, error):
+        profile_id = f"{datetime.now():%Y%m%d%H%M%S%f}-{os.urandom(3).hex()}"
+        stats = pstats.Stats(profile)
+        summary = {
+            "id": profile_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "method": request.method,
+            "path": _request_path(),
+            "endpoint": request.endpoint,
+            "trigger": trigger,
+            "duration_ms": round(elapsed * 1000, 3),
+            "error": str(error) if error else None,
+            "function_calls": stats.total_calls,
+            "top": top_functions(stats, 10),
+        }
+        base = os.path.join(self.directory, profile_id)
+        stats.dump_stats(base + ".prof")
+        with open(base + ".json", "w") as f:
+            json.dump(summary, f)
+        self.profiled += 1
+        self._prune()
+        logger.info(
+            f"Profiled {summary['method']} {summary['path']} "
+            f"({summary['duration_ms']} ms) as {profile_id}"
+        )
+
+    def _prune(self):
+        with self._store_lock:
+            ids = self._ids()
+            for profile_id in ids[: max(0, len(ids) - self.max_files)]:
+                for suffix in (".prof", ".json"):
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def _ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[: -len(".json")]
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        )
+
+    def list_profiles(self, limit=50):
+        """Summaries of the stored profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self._ids()[-limit:] if limit else self._ids()):
+            try:
+                with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop("top", None)
+            profiles.append(summary)
+        return profiles
+
+    def pstats_path(self, profile_id):
+        """Path of a stored profile's pstats file, or None."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.abspath(os.path.join(self.directory, profile_id + ".prof"))
+        return path if os.path.exists(path) else None
+
+    def load(self, profile_id):
+        """The summary and pstats of a stored profile, or None."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        base = os.path.join(self.directory, profile_id)
+        try:
+            with open(base + ".json") as f:
+                summary = json.load(f)
+            return summary, pstats.Stats(base + ".prof")
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "token_configured": bool(self.token),
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+            "stored": len(self._ids()),
+            "max_files": self.max_files,
+        }
+
+
+profiler = Profiler()
+
+
+def init_app(app):
+    """Install on-demand request profiling on the Flask app."""
+    profiler.init_app(app)
@@ -1,7 +1,23 @@
-from flask import jsonify, request, render_template
+from flask import (
+    Response,
+    jsonify,
+    request,
+    render_template,
+    send_file,
+    stream_with_context,
+)
 from run import app
-from database import db
+from admission import admission
+from coalesce import coalesce, coalescer
+from profiling import collapsed_stacks, profiler, top_functions
+from database import db, jobs, metadata, minhash, shards, usage, versions, writer
+from database.similarity import similarity_index
+from database.trigram import name_index
+from database.changes import broker
 from database.db import DatabaseError
+from database.scheduler import due_scheduler
+import csv
+import io
 import logging
 from datetime import datetime, timedelta
 
@@ -63,7 +79,80 @@ def tag_view(id):
 # API Routes
 
 
+def _json_object():
+    """The request's JSON body, which must be an object (empty if absent)."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    return data
+
+
+def _stream_json(items):
+    """Stream a success envelope whose data array is written item by item.
+
+    The first bytes go out before the query has finished. An error after
+    that point can no longer change the status code, so it is logged and
+    the body is cut short, which clients see as invalid JSON.
+    """
+
+    def generate():
+        yield '{"status": "success", "data": ['
+        try:
+            for index, item in enumerate(items):
+                yield ("," if index else "") + app.json.dumps(item)
+        except Exception as e:
+            logger.error(f"Error streaming response: {e}")
+            return
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@app.route("/api/changes", methods=["GET"])
+def stream_changes():
+    """Stream prompt, task, list and tag changes as Server-Sent Events.
+
+    Reconnecting clients send ``Last-Event-ID`` (or ``?last_event_id=``)
+    and receive the events they missed, or a ``reset`` event when they
+    should reload instead.
+    """
+    try:
+        last_event_id = request.headers.get("Last-Event-ID") or request.args.get(
+            "last_event_id"
+        )
+        subscriber, replay = broker.subscribe(shards.current_workspace(), last_event_id)
+    except OverflowError as e:
+        response = jsonify({"status": "error", "message": str(e)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+    except Exception as e:
+        logger.error(f"Error opening change stream: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    # Not wrapped in stream_with_context: the stream needs no request
+    # state, and the request ends (releasing its admission slot) at once
+    return Response(
+        broker.stream(subscriber, replay),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/changes/stats", methods=["GET"])
+def get_change_stats():
+    """Get change stream subscriber and event counters."""
+    try:
+        return jsonify({"status": "success", "data": broker.stats()})
+    except Exception as e:
+        logger.error(f"Error getting change stream stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route("/api/tasks", methods=["GET"])
+@coalesce
 def get_tasks():
     """Get tasks with optional filters."""
     try:
@@ -73,6 +162,11 @@ def get_tasks():
         if due_date:
             due_date = datetime.strptime(due_date, "%Y-%m-%d").date()
 
+        if request.args.get("stream", type=int):
+            return _stream_json(
+                db.iter_tasks(list_id=list_id, tag_id=tag_id, due_date=due_date)
+            )
+
         tasks = db.get_tasks(list_id=list_id, tag_id=tag_id, due_date=due_date)
         return jsonify({"status": "success", "data": tasks})
     except Exception as e:
@@ -80,6 +174,16 @@ def get_tasks():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/tasks/stats", methods=["GET"])
+def get_task_stats():
+    """Get dashboard counts overall, per list and per tag."""
+    try:
+        return jsonify({"status": "success", "data": db.get_task_stats()})
+    except Exception as e:
+        logger.error(f"Error getting task stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route("/api/tasks", methods=["POST"])
 def create_task():
     """Create a new task."""
@@ -99,6 +203,7 @@ def create_task():
             list_id=data.get("list_id"),
             priority=data.get("priority", 4),
             tags=data.get("tags", []),
+            parent_id=data.get("parent_id"),
         )
         return jsonify({"status": "success", "data": task}), 201
     except Exception as e:
@@ -110,14 +215,28 @@ def create_task():
 def update_task(id):
     """Update a task."""
     try:
-        data = request.get_json()
-        task = db.update_task(id, **data)
+        task = db.update_task(id, **_json_object())
         return jsonify({"status": "success", "data": task})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error updating task: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/tasks/<int:id>", methods=["PATCH"])
+def patch_task(id):
+    """Update only the fields present in the request body."""
+    try:
+        task = db.update_task(id, **_json_object())
+        return jsonify({"status": "success", "data": task})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error patching task: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 @app.route("/api/tasks/<int:id>", methods=["DELETE"])
 def delete_task(id):
     """Delete a task."""
@@ -141,8 +260,88 @@ def toggle_task(id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+@app.route("/api/tasks/due", methods=["GET"])
+def get_due_tasks():
+    """Get open tasks with a due date, soonest first, from the scheduler."""
+    try:
+        limit = min(request.args.get("limit", 50, type=int), 1000)
+        return jsonify({"status": "success", "data": due_scheduler.upcoming(limit)})
+    except Exception as e:
+        logger.error(f"Error getting due tasks: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/tasks/due/feed", methods=["GET"])
+def get_due_feed():
+    """Get due/overdue events after event id ``since``, oldest first.
+
+    Poll with the last id seen to receive only new events.
+    """
+    try:
+        since = request.args.get("since", 0, type=int)
+        limit = min(request.args.get("limit", 100, type=int), 1000)
+        events = due_scheduler.feed(since, limit)
+        return jsonify(
+            {
+                "status": "success",
+                "data": events,
+                "last_id": events[-1]["id"] if events else since,
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error getting due task feed: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/tasks/due/stats", methods=["GET"])
+def get_due_stats():
+    """Get due task scheduler counters."""
+    try:
+        return jsonify({"status": "success", "data": due_scheduler.stats()})
+    except Exception as e:
+        logger.error(f"Error getting due task stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/tasks/<int:id>/subtree", methods=["GET"])
+def get_task_subtree(id):
+    """Get a task and its subtasks, optionally limited to ?depth=N levels."""
+    try:
+        tasks = db.get_task_subtree(id, max_depth=request.args.get("depth", type=int))
+        if not tasks:
+            return jsonify({"status": "error", "message": "Task not found"}), 404
+        return jsonify({"status": "success", "data": tasks})
+    except Exception as e:
+        logger.error(f"Error getting task subtree: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/tasks/<int:id>/move", methods=["POST"])
+def move_task(id):
+    """Move a task and its subtasks under another task or to the top level."""
+    try:
+        data = request.get_json() or {}
+        task = db.move_task(id, parent_id=data.get("parent_id"))
+        return jsonify({"status": "success", "data": task})
+    except Exception as e:
+        logger.error(f"Error moving task: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/tasks/tree/rebuild", methods=["POST"])
+def rebuild_task_tree():
+    """Regenerate the subtask closure table from the parent links."""
+    try:
+        rows = db.rebuild_task_tree()
+        return jsonify({"status": "success", "data": {"rows": rows}})
+    except Exception as e:
+        logger.error(f"Error rebuilding task tree: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
 # List management
 @app.route("/api/lists", methods=["GET"])
+@coalesce
 def get_lists():
     """Get all lists."""
     try:
@@ -174,6 +373,7 @@ def create_list():
 
 # Tag management
 @app.route("/api/tags", methods=["GET"])
+@coalesce
 def get_tags():
     """Get all tags."""
     try:
@@ -197,3 +397,585 @@ def create_tag():
     except Exception as e:
         logger.error(f"Error creating tag: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Prompt management
+@app.route("/api/prompts", methods=["GET"])
+@coalesce
+def get_prompts():
+    """Get prompts, optionally filtered and sorted.
+
+    Filters: ``search`` (name), ``ai``, ``variable``, ``min_tokens`` and
+    ``max_tokens``; ``sort`` is one of ``db.PROMPT_SORTS``.
+    """
+    try:
+        filters = {
+            "search_term": request.args.get("search"),
+            "ai_filter": request.args.get("ai"),
+            "variable": request.args.get("variable"),
+            "min_tokens": request.args.get("min_tokens", type=int),
+            "max_tokens": request.args.get("max_tokens", type=int),
+        }
+        sort = request.args.get("sort", "created")
+        if any(value is not None for value in filters.values()) or sort != "created":
+            prompts = db.search_prompts(**filters, sort=sort)
+        elif request.args.get("stream", type=int):
+            return _stream_json(db.iter_prompts())
+        else:
+            prompts = db.get_all_prompts()
+        return jsonify({"status": "success", "data": prompts})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/variables", methods=["GET"])
+def get_prompt_variables():
+    """Get the variable names in use and how many prompts use each."""
+    try:
+        limit = request.args.get("limit", 100, type=int)
+        return jsonify({"status": "success", "data": metadata.get_variables(limit)})
+    except Exception as e:
+        logger.error(f"Error getting prompt variables: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts", methods=["POST"])
+def create_prompt():
+    """Create a new prompt."""
+    try:
+        data = request.get_json()
+        prompt_id = db.create_prompt(
+            prompt_name=data.get("prompt_name"),
+            ai_selection=data.get("ai_selection", []),
+            prompt_content=data.get("prompt_content"),
+        )
+        return jsonify({"status": "success", "data": db.get_prompt(prompt_id)}), 201
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error creating prompt: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>", methods=["GET"])
+def get_prompt(id):
+    """Get a single prompt."""
+    try:
+        prompt = db.get_prompt(id)
+        if prompt is None:
+            return jsonify({"status": "error", "message": "Prompt not found"}), 404
+        return jsonify({"status": "success", "data": prompt})
+    except Exception as e:
+        logger.error(f"Error getting prompt: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>", methods=["PUT"])
+def update_prompt(id):
+    """Update a prompt."""
+    try:
+        data = request.get_json()
+        db.update_prompt(
+            id,
+            prompt_name=data.get("prompt_name"),
+            ai_selection=data.get("ai_selection", []),
+            prompt_content=data.get("prompt_content"),
+        )
+        return jsonify({"status": "success", "data": db.get_prompt(id)})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating prompt: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>", methods=["PATCH"])
+def patch_prompt(id):
+    """Update only the prompt fields present in the request body."""
+    try:
+        changed = db.patch_prompt(id, **_json_object())
+        return jsonify(
+            {"status": "success", "data": db.get_prompt(id), "changed": changed}
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error patching prompt: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>", methods=["DELETE"])
+def delete_prompt(id):
+    """Delete a prompt."""
+    try:
+        db.delete_prompt(id)
+        return jsonify({"status": "success"})
+    except Exception as e:
+        logger.error(f"Error deleting prompt: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/versions", methods=["GET"])
+def get_prompt_versions(id):
+    """List the version history of a prompt."""
+    try:
+        return jsonify({"status": "success", "data": versions.get_versions(id)})
+    except Exception as e:
+        logger.error(f"Error getting prompt versions: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/versions/<int:version>", methods=["GET"])
+def get_prompt_version(id, version):
+    """Get a single version of a prompt."""
+    try:
+        prompt_version = versions.get_version(id, version)
+        if prompt_version is None:
+            return jsonify({"status": "error", "message": "Version not found"}), 404
+        return jsonify({"status": "success", "data": prompt_version})
+    except Exception as e:
+        logger.error(f"Error getting prompt version: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/versions/diff", methods=["GET"])
+def diff_prompt_versions(id):
+    """Diff two versions of a prompt."""
+    try:
+        from_version = request.args.get("from", type=int)
+        to_version = request.args.get("to", type=int)
+        if from_version is None or to_version is None:
+            return (
+                jsonify({"status": "error", "message": "from and to are required"}),
+                400,
+            )
+
+        diff = versions.diff_versions(id, from_version, to_version)
+        if diff is None:
+            return jsonify({"status": "error", "message": "Version not found"}), 404
+        return jsonify({"status": "success", "data": diff})
+    except Exception as e:
+        logger.error(f"Error diffing prompt versions: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/similar", methods=["GET"])
+def get_similar_prompts(id):
+    """Get the prompts whose content is most similar to a prompt."""
+    try:
+        k = min(request.args.get("k", 10, type=int), 100)
+        similar = similarity_index.similar(id, k=k)
+        if similar is None:
+            return jsonify({"status": "error", "message": "Prompt not found"}), 404
+        return jsonify({"status": "success", "data": similar})
+    except Exception as e:
+        logger.error(f"Error getting similar prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/usage", methods=["POST"])
+def record_prompt_usage(id):
+    """Count a copy or render of a prompt."""
+    try:
+        data = request.get_json(silent=True) or {}
+        usage.usage_counter.record(id, data.get("event", "copy"))
+        return jsonify({"status": "success"}), 202
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error recording prompt usage: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/<int:id>/usage", methods=["GET"])
+def get_prompt_usage(id):
+    """Get the usage counters of a prompt."""
+    try:
+        return jsonify({"status": "success", "data": usage.get_usage(id)})
+    except Exception as e:
+        logger.error(f"Error getting prompt usage: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/top", methods=["GET"])
+def get_top_prompts():
+    """Get the most used prompts."""
+    try:
+        limit = min(request.args.get("limit", 10, type=int), 100)
+        return jsonify({"status": "success", "data": usage.get_top_prompts(limit)})
+    except Exception as e:
+        logger.error(f"Error getting top prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/usage/stats", methods=["GET"])
+def get_usage_stats():
+    """Get usage buffer and flush counters for this worker."""
+    try:
+        return jsonify({"status": "success", "data": usage.usage_counter.stats()})
+    except Exception as e:
+        logger.error(f"Error getting usage stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/db/writer/stats", methods=["GET"])
+def get_writer_stats():
+    """Get queue depth and group-commit batch sizes of the database writer."""
+    try:
+        return jsonify({"status": "success", "data": writer.writer.stats()})
+    except Exception as e:
+        logger.error(f"Error getting writer stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/db/updates/stats", methods=["GET"])
+def get_update_stats():
+    """Get update counts and the writes skipped for no-op updates."""
+    try:
+        return jsonify({"status": "success", "data": db.get_update_stats()})
+    except Exception as e:
+        logger.error(f"Error getting update stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/admission/stats", methods=["GET"])
+def get_admission_stats():
+    """Get rate limiting and load shedding counters."""
+    try:
+        return jsonify({"status": "success", "data": admission.stats()})
+    except Exception as e:
+        logger.error(f"Error getting admission stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/coalesce/stats", methods=["GET"])
+def get_coalesce_stats():
+    """Get executed vs coalesced counts of the coalesced GET routes."""
+    try:
+        return jsonify({"status": "success", "data": coalescer.stats()})
+    except Exception as e:
+        logger.error(f"Error getting coalescing stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _profiles_forbidden():
+    return (
+        jsonify(
+            {
+                "status": "error",
+                "message": "Profiles need the X-Profile admin token",
+            }
+        ),
+        403,
+    )
+
+
+def _profile_not_found():
+    return jsonify({"status": "error", "message": "Profile not found"}), 404
+
+
+@app.route("/api/profiles", methods=["GET"])
+def get_profiles():
+    """List stored request profiles, newest first."""
+    if not profiler.authorised():
+        return _profiles_forbidden()
+    try:
+        limit = request.args.get("limit", 50, type=int)
+        return jsonify({"status": "success", "data": profiler.list_profiles(limit)})
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/profiles/stats", methods=["GET"])
+def get_profiling_stats():
+    """Get profiling settings and counters."""
+    try:
+        return jsonify({"status": "success", "data": profiler.stats()})
+    except Exception as e:
+        logger.error(f"Error getting profiling stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """Get a profile's summary with its top ``n`` functions.
+
+    ``sort`` is cumulative (default), tottime or calls.
+    """
+    if not profiler.authorised():
+        return _profiles_forbidden()
+    try:
+        n = min(request.args.get("n", 20, type=int), 500)
+        sort = request.args.get("sort", "cumulative")
+        if sort not in ("cumulative", "tottime", "calls"):
+            raise ValueError("sort must be cumulative, tottime or calls")
+        profile = profiler.load(profile_id)
+        if profile is None:
+            return _profile_not_found()
+        summary, stats = profile
+        summary["top"] = top_functions(stats, n, sort)
+        return jsonify({"status": "success", "data": summary})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting profile {profile_id}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/profiles/<profile_id>/collapsed", methods=["GET"])
+def get_profile_collapsed(profile_id):
+    """Get a profile as collapsed stacks for flamegraph.pl or speedscope."""
+    if not profiler.authorised():
+        return _profiles_forbidden()
+    try:
+        profile = profiler.load(profile_id)
+        if profile is None:
+            return _profile_not_found()
+        lines = collapsed_stacks(profile[1])
+        return Response("\n".join(lines) + "\n", mimetype="text/plain")
+    except Exception as e:
+        logger.error(f"Error getting profile {profile_id}: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/profiles/<profile_id>/pstats", methods=["GET"])
+def download_profile(profile_id):
+    """Download a profile's pstats file (for snakeviz, pstats, etc.)."""
+    if not profiler.authorised():
+        return _profiles_forbidden()
+    path = profiler.pstats_path(profile_id)
+    if path is None:
+        return _profile_not_found()
+    return send_file(
+        path,
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name=f"{profile_id}.prof",
+    )
+
+
+@app.route("/api/workspaces", methods=["GET"])
+def get_workspaces():
+    """List the workspaces that have a database."""
+    try:
+        return jsonify({"status": "success", "data": shards.list_workspaces()})
+    except Exception as e:
+        logger.error(f"Error listing workspaces: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def _read_prompt_import():
+    """Read prompts to import from a CSV upload or a JSON body.
+
+    CSV files use the ``Name,Prompt`` columns of ``example.csv``; rows
+    missing either column are skipped.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        reader = csv.DictReader(io.StringIO(upload.read().decode("utf-8")))
+        return [
+            {"prompt_name": row["Name"], "prompt_content": row["Prompt"]}
+            for row in reader
+            if row.get("Name") and row.get("Prompt")
+        ]
+
+    data = request.get_json()
+    return data.get("prompts", []) if isinstance(data, dict) else data
+
+
+@app.route("/api/prompts/import", methods=["POST"])
+def import_prompts():
+    """Bulk-import prompts, storing each distinct body only once.
+
+    With ``?background=1`` the import runs as a job and 202 is returned.
+    """
+    try:
+        prompts = _read_prompt_import()
+        if request.args.get("background") == "1":
+            if not shards.in_default_workspace():
+                raise ValueError(
+                    "Background imports are only available in the default workspace"
+                )
+            job = jobs.runner.enqueue(
+                "import_prompts",
+                {
+                    "prompts": prompts,
+                    "skip_existing": request.args.get("skip_existing", "1") != "0",
+                    "near_duplicates": request.args.get("near_duplicates"),
+                },
+            )
+            return jsonify({"status": "success", "data": job}), 202
+
+        stats = db.import_prompts(
+            prompts,
+            skip_existing=request.args.get("skip_existing", "1") != "0",
+            near_duplicates=request.args.get("near_duplicates"),
+        )
+        return jsonify({"status": "success", "data": stats}), 201
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error importing prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/duplicates", methods=["GET"])
+def get_duplicate_prompts():
+    """Report clusters of near-duplicate prompts across the library."""
+    try:
+        threshold = request.args.get("threshold", minhash.DEFAULT_THRESHOLD, type=float)
+        clusters = minhash.get_duplicate_clusters(threshold=threshold)
+        return jsonify({"status": "success", "data": clusters})
+    except Exception as e:
+        logger.error(f"Error getting duplicate prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/storage", methods=["GET"])
+def get_prompt_storage():
+    """Get prompt deduplication stats."""
+    try:
+        return jsonify({"status": "success", "data": db.get_blob_stats()})
+    except Exception as e:
+        logger.error(f"Error getting prompt storage stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/prompts/storage/gc", methods=["POST"])
+def gc_prompt_storage():
+    """Garbage-collect unreferenced prompt bodies."""
+    try:
+        return jsonify({"status": "success", "data": db.gc_prompt_blobs()})
+    except Exception as e:
+        logger.error(f"Error collecting prompt storage: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Fuzzy name search
+@app.route("/api/search/names", methods=["GET"])
+def search_names():
+    """Typo-tolerant lookup over prompt, tag and list names."""
+    try:
+        query = request.args.get("q", "")
+        k = min(request.args.get("k", 10, type=int), 100)
+        kind = request.args.get("kind")
+        matches = name_index.search(query, k=k, kind=kind)
+        return jsonify({"status": "success", "data": matches})
+    except Exception as e:
+        logger.error(f"Error searching names: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/search/names/stats", methods=["GET"])
+def name_index_stats():
+    """Get name index size and memory usage."""
+    try:
+        return jsonify({"status": "success", "data": name_index.stats()})
+    except Exception as e:
+        logger.error(f"Error getting name index stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/search/names/rebuild", methods=["POST"])
+def rebuild_name_index():
+    """Rebuild the name index from the database."""
+    try:
+        return jsonify({"status": "success", "data": name_index.rebuild()})
+    except Exception as e:
+        logger.error(f"Error rebuilding name index: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Content similarity search
+@app.route("/api/search/similar", methods=["GET"])
+def search_similar():
+    """Find prompts whose content is similar to free text."""
+    try:
+        query = request.args.get("q", "")
+        k = min(request.args.get("k", 10, type=int), 100)
+        return jsonify(
+            {"status": "success", "data": similarity_index.search(query, k=k)}
+        )
+    except Exception as e:
+        logger.error(f"Error searching similar prompts: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/search/similar/stats", methods=["GET"])
+def similarity_index_stats():
+    """Get similarity index size and query latency."""
+    try:
+        return jsonify({"status": "success", "data": similarity_index.stats()})
+    except Exception as e:
+        logger.error(f"Error getting similarity index stats: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/search/similar/rebuild", methods=["POST"])
+def rebuild_similarity_index():
+    """Rebuild the similarity index from the database."""
+    try:
+        return jsonify({"status": "success", "data": similarity_index.rebuild()})
+    except Exception as e:
+        logger.error(f"Error rebuilding similarity index: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# Background jobs
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    """Enqueue a background job."""
+    try:
+        data = request.get_json()
+        if "kind" not in data:
+            return jsonify({"status": "error", "message": "Kind is required"}), 400
+
+        job = jobs.runner.enqueue(data["kind"], data.get("params", {}))
+        return jsonify({"status": "success", "data": job}), 202
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error creating job: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/jobs", methods=["GET"])
+def get_jobs():
+    """List recent jobs."""
+    try:
+        status = request.args.get("status")
+        limit = min(request.args.get("limit", 50, type=int), 500)
+        return jsonify({"status": "success", "data": jobs.get_jobs(status, limit)})
+    except Exception as e:
+        logger.error(f"Error getting jobs: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/jobs/<int:id>", methods=["GET"])
+def get_job(id):
+    """Poll a job's status and progress."""
+    try:
+        job = jobs.get_job(id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        return jsonify({"status": "success", "data": job})
+    except Exception as e:
+        logger.error(f"Error getting job: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route("/api/jobs/<int:id>/cancel", methods=["POST"])
+def cancel_job(id):
+    """Request cancellation of a job."""
+    try:
+        job = jobs.runner.cancel(id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        return jsonify({"status": "success", "data": job})
+    except Exception as e:
+        logger.error(f"Error cancelling job: {e}")
+        return jsonify({"status": "error", "message": str(e)}), 500
@@ -1,6 +1,18 @@
 from flask import Flask
 from flask_cors import CORS
-from database import db
+from werkzeug.middleware.proxy_fix import ProxyFix
+import admission
+import profiling
+from database import (
+    changes,
+    db,
+    jobs,
+    maintenance,
+    scheduler,
+    shards,
+    usage,
+    writer,
+)
 import logging
 import os
 from flask_sqlalchemy import SQLAlchemy
@@ -18,19 +30,83 @@ CORS(
     resources={
         r"/*": {
             "origins": "*",
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type"],
+            "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+            "allow_headers": ["Content-Type", "X-Workspace"],
         }
     },
 )
 
 # Configure the app
-app.config.update(DATABASE="instance/promptful.sqlite", DEBUG=True)
+app.config.update(
+    DATABASE=os.environ.get("DATABASE", "instance/promptful.sqlite"), DEBUG=True
+)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev")
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
     "DATABASE_URL", "sqlite:///database/tasks.db"
 )
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SIMILARITY_INDEX_DIR"] = "instance/similarity"
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_PROCESSES"] = int(os.environ.get("JOB_PROCESSES", 1))
+app.config["USAGE_FLUSH_INTERVAL"] = 5.0  # seconds
+app.config["USAGE_FLUSH_EVENTS"] = 500
+# All writes go through one writer thread that group-commits them; GET
+# requests read through separate read-only connections
+app.config["SINGLE_WRITER"] = True
+app.config["WRITER_BATCH_SIZE"] = 64
+app.config["WRITER_TIMEOUT"] = 30  # seconds
+app.config["READ_ONLY_CONNECTIONS"] = True
+# Requests with an X-Workspace header (or ?workspace=) use their own
+# database file, created by the workspace's first write; at most
+# MAX_WORKSPACES exist besides the default, and at most MAX_OPEN_SHARDS
+# workspace writers stay open
+app.config["WORKSPACE_DIR"] = "instance/workspaces"
+app.config["MAX_WORKSPACES"] = int(os.environ.get("MAX_WORKSPACES", 100))
+app.config["MAX_OPEN_SHARDS"] = 16
+# Admission control: (requests per second, burst) token buckets per client
+# address, overall and for the listed endpoints, plus global limits past
+# which requests are shed with 503
+app.config["RATE_LIMIT_ENABLED"] = True
+app.config["RATE_LIMIT_DEFAULT"] = (50, 100)
+app.config["RATE_LIMIT_ROUTES"] = {
+    "create_task": (5, 20),
+    "import_prompts": (0.2, 2),
+    "create_job": (1, 5),
+    "search_names": (10, 20),
+    "search_similar": (10, 20),
+}
+app.config["MAX_IN_FLIGHT"] = 64
+# Number of reverse proxies in front of the app whose X-Forwarded-For
+# entries are trusted for the client address; set to 1 behind the bundled
+# nginx, or every client shares the proxy's rate limit buckets. Leave at 0
+# when clients reach the app directly, as they could forge the header
+app.config["PROXY_FIX_X_FOR"] = int(os.environ.get("PROXY_FIX_X_FOR", 0))
+app.config["MAX_WRITE_QUEUE"] = 256
+# Seconds between scheduled maintain_db jobs (ANALYZE, incremental vacuum,
+# integrity check); unset to only run `scripts/db_init.py maintain` by hand
+app.config["DB_MAINTENANCE_INTERVAL"] = (
+    int(os.environ["DB_MAINTENANCE_INTERVAL"])
+    if os.environ.get("DB_MAINTENANCE_INTERVAL")
+    else None
+)
+# Due and overdue task events kept for GET /api/tasks/due/feed
+app.config["DUE_FEED_SIZE"] = 1000
+# GET /api/changes streams write events; clients resuming with
+# Last-Event-ID are replayed the missed ones from the last
+# CHANGE_REPLAY_SIZE events, and idle streams get a heartbeat every
+# CHANGE_HEARTBEAT seconds
+app.config["CHANGE_REPLAY_SIZE"] = 1000
+app.config["CHANGE_QUEUE_SIZE"] = 256
+app.config["CHANGE_HEARTBEAT"] = 15  # seconds
+app.config["MAX_CHANGE_SUBSCRIBERS"] = 100
+# Requests sent with X-Profile: <PROFILE_TOKEN> (or ?_profile=) are run
+# under cProfile, as is a PROFILE_SAMPLE_RATE share of all requests; with
+# neither set profiling is off. The newest PROFILE_MAX_FILES profiles are
+# kept in PROFILE_DIR
+app.config["PROFILE_TOKEN"] = os.environ.get("PROFILE_TOKEN")
+app.config["PROFILE_SAMPLE_RATE"] = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILE_DIR"] = "instance/profiles"
+app.config["PROFILE_MAX_FILES"] = 100
 
 # Initialize the database
 try:
@@ -38,11 +114,23 @@ try:
         db.init_app(app)
         # Ensure the database exists
         db.get_db()
+        writer.init_app(app)
+        jobs.init_app(app)
+        usage.init_app(app)
+        maintenance.init_app(app)
+        scheduler.init_app(app)
+        changes.init_app(app)
         logger.info("Database initialized successfully")
 except Exception as e:
     logger.error(f"Failed to initialize database: {e}")
     raise
 
+if app.config["PROXY_FIX_X_FOR"]:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
+admission.init_app(app)
+shards.init_app(app)
+profiling.init_app(app)
+
 # Import and register routes
 import routes
 
@@ -3,13 +3,27 @@
 import os
 import sqlite3
 import sys
+from contextlib import closing
 from pathlib import Path
 
 # Get the project root directory
 ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from database.maintenance import (
+    AUTO_VACUUM_INCREMENTAL,
+    database_files,
+    enable_incremental_vacuum,
+    run_maintenance,
+)
+
 INSTANCE_DIR = ROOT_DIR / "instance"
 SCHEMA_FILE = ROOT_DIR / "database" / "schema.sql"
 DB_FILE = INSTANCE_DIR / "promptful.sqlite"
+# The app's default sqlite:///database/tasks.db, which Flask-SQLAlchemy
+# resolves inside the instance folder
+TASKS_DB_FILE = INSTANCE_DIR / "database" / "tasks.db"
+WORKSPACE_DIR = INSTANCE_DIR / "workspaces"
 
 
 def init_db():
@@ -46,10 +60,82 @@ def reset_db():
     init_db()
 
 
+def _format_bytes(size):
+    if size is None:
+        return "-"
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def _print_report(report):
+    if report["problems"]:
+        print("Integrity check FAILED:")
+        for problem in report["problems"]:
+            print(f"  {problem}")
+    else:
+        print("Integrity check: ok")
+    for step, seconds in report["steps"].items():
+        print(f"  {step}: {seconds:.3f}s")
+    print(f"Pages reclaimed: {report.get('vacuumed_pages') or 0}")
+    print(
+        f"File size: {_format_bytes(report['file_bytes'])} "
+        f"({report['page_count']} pages of {report['page_size']} bytes, "
+        f"{report['freelist_pages']} free, "
+        f"fragmentation {report['fragmentation']:.1%})"
+    )
+
+    print(f"\n{'Table':<28}{'Rows':>10}{'Pages':>8}{'Size':>12}")
+    for table in report["tables"]:
+        print(
+            f"{table['name']:<28}{table['rows']:>10}{table.get('pages', '-'):>8}"
+            f"{_format_bytes(table.get('bytes')):>12}"
+        )
+    print(f"\n{'Index':<36}{'Table':<20}{'Pages':>8}{'Size':>12}")
+    for index in report["indexes"]:
+        print(
+            f"{index['name']:<36}{index['table']:<20}{index.get('pages', '-'):>8}"
+            f"{_format_bytes(index.get('bytes')):>12}"
+        )
+
+
+def maintain_db():
+    """Check integrity, refresh planner statistics and reclaim free space.
+
+    Covers the prompt database, the task database and every workspace.
+    """
+    if not DB_FILE.exists():
+        print("Database does not exist. Use 'init' to create it.")
+        sys.exit(1)
+
+    failed = False
+    for name, path in database_files(
+        str(DB_FILE), str(TASKS_DB_FILE), str(WORKSPACE_DIR)
+    ):
+        print(f"== {name} ({path})")
+        try:
+            with closing(sqlite3.connect(path, isolation_level=None)) as conn:
+                mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+                if mode != AUTO_VACUUM_INCREMENTAL:
+                    print("Enabling incremental auto-vacuum (one-time full VACUUM)...")
+                    enable_incremental_vacuum(conn)
+                report = run_maintenance(conn)
+        except Exception as e:
+            print(f"Error maintaining database: {e}", file=sys.stderr)
+            sys.exit(1)
+        _print_report(report)
+        failed = failed or bool(report["problems"])
+        print()
+
+    if failed:
+        sys.exit(1)
+
+
 def main():
     """Main entry point."""
-    if len(sys.argv) != 2 or sys.argv[1] not in ["init", "reset"]:
-        print("Usage: python db_init.py [init|reset]")
+    if len(sys.argv) != 2 or sys.argv[1] not in ["init", "reset", "maintain"]:
+        print("Usage: python db_init.py [init|reset|maintain]")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -61,6 +147,8 @@ def main():
             print("Database already exists. Use 'reset' to recreate it.")
     elif command == "reset":
         reset_db()
+    elif command == "maintain":
+        maintain_db()
 
 
 if __name__ == "__main__":
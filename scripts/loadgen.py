@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""Replay or synthesise a mixed workload against the API.
+
+Traffic is JSON lines, one request per line:
+
+    {"request_id": "load-000001", "at": 0.0132, "kind": "search",
+     "method": "GET", "path": "/api/prompts?search=summary"}
+
+``at`` (seconds from the start) and ``body`` (JSON for writes) are
+optional. Paths may contain ``{prompt}`` or ``{task}``, which are filled
+at send time with an id that exists on the target, chosen by the line's
+``pick`` (0-1) so a saved schedule replays the same way.
+
+Examples:
+
+    # 2000 synthetic requests at 50/s against the app in-process, on
+    # throwaway databases in a temporary directory (or --data-dir)
+    python scripts/loadgen.py --requests 2000 --rate 50 --concurrency 16
+
+    # Save that schedule, then replay it against a running server
+    python scripts/loadgen.py --requests 2000 --rate 50 --save mix.jsonl
+    python scripts/loadgen.py --replay mix.jsonl --url http://localhost:5000
+
+With ``--rate`` (or ``at`` in a replayed file) arrivals follow an open
+model: requests are sent on schedule whether or not earlier ones have
+finished, and latency is measured from the scheduled time, so queueing
+behind ``--concurrency`` busy workers counts. Without it each worker sends
+its next request as soon as the previous one returns (closed model).
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Get the project root directory
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+DEFAULT_MIX = {"read": 50, "search": 25, "create": 15, "toggle": 10}
+
+WORDS = (
+    "summary email report outline draft review translate explain plan "
+    "bug test release meeting notes customer product launch budget idea"
+).split()
+
+# Errors caused by contention rather than by the request itself
+LOCK_RE = re.compile(
+    r"database is locked|database table is locked|waiting for the database writer"
+)
+
+OUTCOMES = ("ok", "error", "lock_timeout", "shed")
+
+
+def _parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def _synthesise_request(rng, kind, index):
+    """One request of the given kind; ids are resolved at send time."""
+    word = rng.choice(WORDS)
+    if kind == "read":
+        path = rng.choice(
+            [
+                "/api/prompts",
+                "/api/prompts/{prompt}",
+                "/api/tasks",
+                "/api/lists",
+                "/api/tags",
+            ]
+        )
+        return {"method": "GET", "path": path}
+    if kind == "search":
+        path = rng.choice(
+            [
+                f"/api/prompts?search={word}",
+                f"/api/search/names?q={word}",
+                "/api/prompts?variable=topic&sort=-tokens",
+            ]
+        )
+        return {"method": "GET", "path": path}
+    if kind == "create":
+        if rng.random() < 0.7:
+            content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80)))
+            return {
+                "method": "POST",
+                "path": "/api/prompts",
+                "body": {
+                    "prompt_name": f"Load {word} {index}",
+                    "prompt_content": f"Write a {word} about {{topic}}. {content}",
+                    "ai_selection": [rng.choice(["ChatGPT", "Claude", "Gemini"])],
+                },
+            }
+        return {
+            "method": "POST",
+            "path": "/api/tasks",
+            "body": {"title": f"Load {word} {index}", "priority": rng.randint(1, 4)},
+        }
+    return {
+        "method": "POST",
+        "path": "/api/tasks/{task}/toggle",
+        "body": {"completed": rng.random() < 0.5},
+    }
+
+
+def synthesise(count, mix, rate=None, seed=0):
+    """Build a reproducible schedule of ``count`` requests.
+
+    Kinds are drawn from ``mix`` (weights); with ``rate`` the arrival
+    times are a Poisson process of that many requests per second.
+    """
+    rng = random.Random(seed)
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    at = 0.0
+    schedule = []
+    for index in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        item = {"request_id": f"load-{index + 1:06d}", "kind": kind}
+        if rate:
+            at += rng.expovariate(rate)
+            item["at"] = round(at, 6)
+        item.update(_synthesise_request(rng, kind, index))
+        item["pick"] = round(rng.random(), 6)
+        schedule.append(item)
+    return schedule
+
+
+def load_schedule(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_schedule(schedule, path):
+    with open(path, "w") as f:
+        for item in schedule:
+            f.write(json.dumps(item) + "\n")
+
+
+class AppTarget:
+    """Sends requests to the Flask app in this process (no network).
+
+    The app runs on fresh databases in ``directory`` (a new temporary
+    directory by default), never on the ones under ``instance/``. Every
+    request comes from the same address, so the per-client rate limits
+    are lifted unless ``rate_limits`` is set; otherwise most of the load
+    would be answered with 429 by the admission controller. The global
+    in-flight and write queue limits stay on.
+    """
+
+    def __init__(self, directory=None, rate_limits=False):
+        self.directory = directory or tempfile.mkdtemp(prefix="promptful-load-")
+        os.makedirs(self.directory, exist_ok=True)
+        os.environ["DATABASE"] = os.path.join(self.directory, "promptful.sqlite")
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(
+            self.directory, "tasks.db"
+        )
+        # Relative instance/ paths (workspaces, indexes, profiles) too
+        os.chdir(self.directory)
+        import run
+
+        if not rate_limits:
+            from admission import admission
+
+            admission.default_limit = None
+            admission.route_limits = {}
+        self.app = run.app
+        self._local = threading.local()
+
+    def send(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HttpTarget:
+    """Sends requests to a running server, one keep-alive session per thread."""
+
+    def __init__(self, url, timeout=60):
+        import requests
+
+        self.requests = requests
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, method, path, body=None):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self.requests.Session()
+        response = session.request(
+            method, self.url + path, json=body, timeout=self.timeout
+        )
+        return response.status_code, response.content
+
+
+class IdPool:
+    """Ids known to exist on the target, for ``{prompt}`` and ``{task}``."""
+
+    def __init__(self):
+        self._ids = {"prompt": [], "task": []}
+        self._lock = threading.Lock()
+
+    def load(self, target):
+        for name, path in (("prompt", "/api/prompts"), ("task", "/api/tasks")):
+            try:
+                status, payload = target.send("GET", path)
+                if status == 200:
+                    self._ids[name] = [
+                        item["id"] for item in json.loads(payload)["data"]
+                    ]
+            except Exception as e:
+                print(f"Could not list {name}s: {e}", file=sys.stderr)
+
+    def add(self, name, id):
+        with self._lock:
+            self._ids[name].append(id)
+
+    def resolve(self, path, pick):
+        for name, ids in self._ids.items():
+            placeholder = "{" + name + "}"
+            if placeholder in path:
+                with self._lock:
+                    id = ids[int(pick * len(ids))] if ids else 0
+                path = path.replace(placeholder, str(id))
+        return path
+
+
+def classify(status, payload):
+    if status < 400:
+        return "ok"
+    if status in (429, 503):
+        return "shed"
+    if LOCK_RE.search(payload.decode("utf-8", "replace")):
+        return "lock_timeout"
+    return "error"
+
+
+class LoadRun:
+    """Sends a schedule to a target and records one sample per request."""
+
+    def __init__(self, target, schedule, concurrency=8, ids=None):
+        self.target = target
+        self.schedule = schedule
+        self.concurrency = concurrency
+        self.ids = ids or IdPool()
+        self.samples = []
+        self._lock = threading.Lock()
+        self.started = None
+
+    def _fire(self, item, scheduled):
+        path = self.ids.resolve(item["path"], item.get("pick", 0.0))
+        try:
+            status, payload = self.target.send(
+                item.get("method", "GET"), path, item.get("body")
+            )
+            outcome = classify(status, payload)
+        except Exception:
+            status, payload, outcome = None, b"", "error"
+        done = time.perf_counter()
+
+        if outcome == "ok" and item.get("method") == "POST":
+            kind = {"/api/prompts": "prompt", "/api/tasks": "task"}.get(path)
+            if kind:
+                try:
+                    self.ids.add(kind, json.loads(payload)["data"]["id"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+
+        with self._lock:
+            self.samples.append(
+                {
+                    "kind": item.get("kind", item.get("method", "GET")),
+                    "at": scheduled - self.started,
+                    "done": done - self.started,
+                    "latency": done - scheduled,
+                    "status": status,
+                    "outcome": outcome,
+                }
+            )
+
+    def run_open(self, speed=1.0):
+        """Send each request at its ``at`` time (divided by ``speed``)."""
+        self.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for item in self.schedule:
+                scheduled = self.started + item["at"] / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._fire, item, scheduled)
+
+    def run_closed(self):
+        """Keep ``concurrency`` requests in flight until the schedule is done."""
+        items = iter(self.schedule)
+        items_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with items_lock:
+                    item = next(items, None)
+                if item is None:
+                    return
+                self._fire(item, time.perf_counter())
+
+        self.started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+def summarise(samples, duration=None):
+    latencies = sorted(sample["latency"] for sample in samples)
+    duration = duration or max((s["done"] for s in samples), default=0.0)
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    for sample in samples:
+        counts[sample["outcome"]] += 1
+    total = len(samples)
+    return {
+        "requests": total,
+        "seconds": round(duration, 3),
+        "throughput": round(total / duration, 2) if duration else None,
+        "p50_ms": _ms(percentile(latencies, 50)),
+        "p99_ms": _ms(percentile(latencies, 99)),
+        "max_ms": _ms(latencies[-1] if latencies else None),
+        **counts,
+        "error_rate": round(counts["error"] / total, 4) if total else 0.0,
+        "lock_timeout_rate": round(counts["lock_timeout"] / total, 4) if total else 0,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def report(samples, interval=1.0):
+    """Summaries overall, per interval of completion time, and per kind."""
+    windows = {}
+    kinds = {}
+    for sample in samples:
+        windows.setdefault(int(sample["done"] // interval), []).append(sample)
+        kinds.setdefault(sample["kind"], []).append(sample)
+    return {
+        "total": summarise(samples),
+        "intervals": [
+            {"t": round(window * interval, 3), **summarise(group, interval)}
+            for window, group in sorted(windows.items())
+        ],
+        "kinds": {
+            kind: summarise(group, summarise(samples)["seconds"])
+            for kind, group in sorted(kinds.items())
+        },
+    }
+
+
+def print_report(result):
+    header = (
+        f"{'':<10}{'reqs':>7}{'req/s':>9}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'errors':>8}{'locked':>8}{'shed':>7}"
+    )
+
+    def line(label, row):
+        return (
+            f"{label:<10}{row['requests']:>7}{row['throughput'] or 0:>9.1f}"
+            f"{row['p50_ms'] or 0:>10.1f}{row['p99_ms'] or 0:>10.1f}"
+            f"{row['error']:>8}{row['lock_timeout']:>8}{row['shed']:>7}"
+        )
+
+    print(header)
+    for row in result["intervals"]:
+        print(line(f"{row['t']:.0f}s", row))
+    print()
+    print(header)
+    for kind, row in result["kinds"].items():
+        print(line(kind, row))
+    print(line("total", result["total"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", help="server to load; default is the app in-process")
+    parser.add_argument(
+        "--data-dir", help="databases of the in-process app; default a temporary dir"
+    )
+    parser.add_argument(
+        "--rate-limits",
+        action="store_true",
+        help="keep the per-client rate limits of the in-process app",
+    )
+    parser.add_argument("--replay", help="JSON lines file of requests to send")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rate", type=float, help="arrivals per second (open model)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=DEFAULT_MIX,
+        help="weights, e.g. read=50,search=25,create=15,toggle=10",
+    )
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="replay faster (>1) or slower (<1)"
+    )
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--save", help="write the schedule as JSON lines and exit")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.replay:
+        schedule = load_schedule(args.replay)
+        if args.rate:
+            # Re-time the recorded requests as a seeded Poisson process
+            rng = random.Random(args.seed)
+            at = 0.0
+            for item in schedule:
+                at += rng.expovariate(args.rate)
+                item["at"] = round(at, 6)
+    else:
+        schedule = synthesise(args.requests, args.mix, args.rate, args.seed)
+
+    if args.save:
+        save_schedule(schedule, args.save)
+        print(f"Wrote {len(schedule)} requests to {args.save}")
+        return
+
+    if args.json:
+        # AppTarget changes into its data directory
+        args.json = os.path.abspath(args.json)
+    if args.url:
+        target = HttpTarget(args.url)
+    else:
+        target = AppTarget(
+            args.data_dir and os.path.abspath(args.data_dir), args.rate_limits
+        )
+        print(f"Running the app in-process on databases in {target.directory}")
+    ids = IdPool()
+    ids.load(target)
+    load = LoadRun(target, schedule, args.concurrency, ids)
+    if all("at" in item for item in schedule):
+        load.run_open(args.speed)
+    else:
+        load.run_closed()
+
+    result = report(load.samples, args.interval)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import logging
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """The app running on throwaway databases in a temporary directory."""
+    workdir = tmp_path_factory.mktemp("promptful")
+    os.environ["DATABASE"] = str(workdir / "promptful.sqlite")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'tasks.db'}"
+    # Relative instance/ paths (workspaces, indexes, profiles) land here too
+    os.chdir(workdir)
+
+    import run
+    from admission import admission
+
+    admission.default_limit = None
+    admission.route_limits = {}
+    logging.getLogger().setLevel(logging.WARNING)
+    return run.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def task_db(app):
+    """A clean task database, inside an app context."""
+    from sqlalchemy import text
+    from database.db import db
+
+    with app.app_context():
+        for table in ("task_closure", "task_tags", "tasks", "tags", "lists"):
+            db.session.execute(text(f"DELETE FROM {table}"))
+        db.session.commit()
+        yield db
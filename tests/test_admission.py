@@ -0,0 +1,33 @@
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from admission import AdmissionController
+
+
+def _app(proxy_fix_x_for):
+    app = Flask(__name__)
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_DEFAULT=(0.001, 1))
+    if proxy_fix_x_for:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_fix_x_for)
+    AdmissionController().init_app(app)
+    app.add_url_rule("/ping", "ping", lambda: "pong")
+    return app.test_client()
+
+
+def _statuses(client):
+    return [
+        client.get(
+            "/ping",
+            headers={"X-Forwarded-For": address},
+            environ_base={"REMOTE_ADDR": "10.0.0.2"},
+        ).status_code
+        for address in ("203.0.113.1", "203.0.113.2", "203.0.113.1")
+    ]
+
+
+def test_clients_behind_proxy_get_their_own_buckets():
+    assert _statuses(_app(proxy_fix_x_for=1)) == [200, 200, 429]
+
+
+def test_forwarded_header_is_ignored_without_proxy_fix():
+    assert _statuses(_app(proxy_fix_x_for=0)) == [200, 429, 429]
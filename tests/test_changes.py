@@ -0,0 +1,23 @@
+from database.changes import ChangeBroker, publish
+
+
+def test_task_events_reach_every_workspace(app, monkeypatch):
+    broker = ChangeBroker()
+    monkeypatch.setattr("database.changes.broker", broker)
+    default, _ = broker.subscribe("default")
+    acme, _ = broker.subscribe("acme")
+
+    with app.test_request_context(
+        "/api/tasks", method="POST", headers={"X-Workspace": "acme"}
+    ):
+        app.preprocess_request()
+        publish("task", "created", 1)
+        publish("prompt", "created", 2)
+
+    assert [event["entity"] for event in default.queue.queue] == ["task"]
+    assert [event["entity"] for event in acme.queue.queue] == ["task", "prompt"]
+    assert default.queue.queue[0]["workspace"] is None
+
+    first = default.queue.queue[0]["id"]
+    _, replay = broker.subscribe("default", last_event_id=first.split(":")[0] + ":0")
+    assert [event["entity"] for event in replay] == ["task"]
@@ -0,0 +1,54 @@
+import threading
+
+from coalesce import coalescer
+
+
+def test_key_includes_workspace(app):
+    app.test_client().post(
+        "/api/prompts",
+        json={"prompt_name": "acme prompt", "prompt_content": "body"},
+        headers={"X-Workspace": "acme"},
+    )
+    keys = []
+    for headers in ({}, {"X-Workspace": "acme"}, {"X-Workspace": "acme"}):
+        with app.test_request_context("/api/prompts", headers=headers):
+            app.preprocess_request()
+            keys.append(coalescer._key({}))
+    assert keys[0] != keys[1]
+    assert keys[1] == keys[2]
+
+
+def test_concurrent_gets_from_other_workspaces_are_not_shared(app):
+    app.test_client().post(
+        "/api/prompts",
+        json={"prompt_name": "default only", "prompt_content": "body"},
+    )
+    app.test_client().post(
+        "/api/prompts",
+        json={"prompt_name": "acme only", "prompt_content": "body"},
+        headers={"X-Workspace": "acme"},
+    )
+
+    results = {}
+    barrier = threading.Barrier(8)
+
+    def fetch(index, workspace):
+        barrier.wait()
+        response = app.test_client().get(
+            "/api/prompts", headers={"X-Workspace": workspace}
+        )
+        names = {prompt["prompt_name"] for prompt in response.get_json()["data"]}
+        results[index] = (workspace, names)
+
+    threads = [
+        threading.Thread(target=fetch, args=(i, ("default", "acme")[i % 2]))
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for workspace, names in results.values():
+        assert ("acme only" in names) == (workspace == "acme")
+        assert ("default only" in names) == (workspace == "default")
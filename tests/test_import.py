@@ -0,0 +1,47 @@
+from database.db import import_prompts
+
+
+def _prompt(name, content):
+    return {"prompt_name": name, "prompt_content": content}
+
+
+def test_import_dedupes_within_and_across_calls(app):
+    with app.app_context():
+        first = import_prompts(
+            [
+                _prompt("import a", "shared import body"),
+                _prompt("import b", "shared import body"),
+                _prompt("import a", "shared import body"),
+            ]
+        )
+        second = import_prompts(
+            [
+                _prompt("import a", "shared import body"),
+                _prompt("import c", "another import body"),
+            ]
+        )
+
+    assert first == {
+        "created": 2,
+        "skipped": 1,
+        "blobs_created": 1,
+        "blobs_reused": 1,
+    }
+    assert second == {
+        "created": 1,
+        "skipped": 1,
+        "blobs_created": 1,
+        "blobs_reused": 0,
+    }
+
+
+def test_import_without_skip_reuses_the_blob(app):
+    with app.app_context():
+        stats = import_prompts(
+            [_prompt("kept twice", "twice body"), _prompt("kept twice", "twice body")],
+            skip_existing=False,
+        )
+
+    assert stats["created"] == 2
+    assert stats["blobs_created"] == 1
+    assert stats["blobs_reused"] == 1
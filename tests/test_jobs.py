@@ -0,0 +1,106 @@
+import time
+
+from database import jobs
+
+
+def _wait(app, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = jobs.get_job(job_id)
+        if job["status"] not in (jobs.QUEUED, jobs.RUNNING):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_state_is_written_through_the_writer(app, monkeypatch):
+    from database.writer import writer
+
+    submitted = []
+    original = writer.submit
+
+    def submit(*args, **kwargs):
+        submitted.append(args[2].__name__)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(writer, "submit", submit)
+    with app.app_context():
+        job = jobs.runner.enqueue("rebuild_name_index")
+
+    job = _wait(app, job["id"])
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["progress"] == 1
+    assert {"_insert_job", "_claim_job", "_finish_job"} <= set(submitted)
+
+
+def test_backfill_minhash_signs_unsigned_bodies(app):
+    from database.db import create_prompt, get_db
+
+    with app.app_context():
+        create_prompt("unsigned prompt", [], "A body signed by the backfill job")
+        db = get_db()
+        db.execute("DELETE FROM blob_lsh")
+        db.execute("DELETE FROM blob_minhash")
+        db.commit()
+        job = jobs.runner.enqueue("backfill_minhash")
+
+    job = _wait(app, job["id"], timeout=60)
+    assert job["status"] == jobs.SUCCEEDED, job["error"]
+    assert job["result"]["signed"] >= 1
+    with app.app_context():
+        unsigned = (
+            get_db()
+            .execute(
+                """SELECT COUNT(*) FROM prompts p
+                   LEFT JOIN blob_minhash m ON m.hash = p.content_hash
+                   WHERE m.hash IS NULL"""
+            )
+            .fetchone()[0]
+        )
+    assert unsigned == 0
+
+
+def test_backfill_metadata_describes_bodies(app):
+    from database.db import create_prompt, get_db
+    from database.metadata import metadata_pending
+
+    with app.app_context():
+        create_prompt("undescribed prompt", [], "Fill {jobvar_one} and {jobvar_two}")
+        db = get_db()
+        db.execute("DELETE FROM blob_variables WHERE name LIKE 'jobvar_%'")
+        db.execute(
+            "UPDATE prompt_blobs SET char_count = NULL, word_count = NULL, "
+            "token_estimate = NULL"
+        )
+        db.commit()
+        job = jobs.runner.enqueue("backfill_metadata", {"batch_size": 2})
+
+    job = _wait(app, job["id"], timeout=60)
+    assert job["status"] == jobs.SUCCEEDED, job["error"]
+    assert job["result"]["described"] >= 1
+    with app.app_context():
+        assert not metadata_pending()
+        names = {
+            row[0]
+            for row in get_db().execute(
+                "SELECT name FROM blob_variables WHERE name LIKE 'jobvar_%'"
+            )
+        }
+    assert names == {"jobvar_one", "jobvar_two"}
+
+
+def test_maintain_db_covers_every_database(app, client):
+    client.post(
+        "/api/prompts",
+        json={"prompt_name": "kept", "prompt_content": "body"},
+        headers={"X-Workspace": "maintained"},
+    )
+    with app.app_context():
+        job = jobs.runner.enqueue("maintain_db")
+
+    job = _wait(app, job["id"], timeout=60)
+    assert job["status"] == jobs.SUCCEEDED, job["error"]
+    databases = job["result"]["databases"]
+    assert {"prompts", "tasks", "workspace:maintained"} <= set(databases)
+    assert "tasks" in {table["name"] for table in databases["tasks"]["tables"]}
@@ -0,0 +1,72 @@
+from database.db import create_prompt, get_db
+from database.metadata import content_metadata, metadata_pending
+
+
+def test_content_metadata():
+    metadata = content_metadata("Write a {tone} poem about {topic} in {tone} style")
+
+    assert metadata["variables"] == ["tone", "topic"]
+    assert metadata["char_count"] == 49
+    assert metadata["word_count"] == 9
+    assert metadata["token_estimate"] > 0
+
+
+def test_variable_and_size_filters(client, app):
+    with app.app_context():
+        create_prompt("meta short", [], "Say {metavar_a}")
+        create_prompt(
+            "meta long", [], "Describe {metavar_a} and {metavar_b} " + "in detail " * 50
+        )
+        create_prompt("meta other", [], "Nothing to fill in here")
+
+    def names(query):
+        response = client.get(f"/api/prompts?{query}")
+        assert response.status_code == 200
+        return [prompt["prompt_name"] for prompt in response.get_json()["data"]]
+
+    assert names("variable=metavar_a&sort=tokens") == ["meta short", "meta long"]
+    assert names("variable=metavar_a&sort=-tokens") == ["meta long", "meta short"]
+    assert names("variable=metavar_b") == ["meta long"]
+    assert names("variable=metavar_a&max_tokens=20") == ["meta short"]
+    assert names("variable=metavar_a&min_tokens=21") == ["meta long"]
+    assert client.get("/api/prompts?sort=bogus").status_code == 400
+
+    variables = client.get("/api/prompts/variables?limit=1000").get_json()["data"]
+    counts = {row["name"]: row["prompts"] for row in variables}
+    assert counts["metavar_a"] == 2
+    assert counts["metavar_b"] == 1
+
+
+def test_variable_filter_is_served_from_the_index(app):
+    with app.app_context():
+        plan = " ".join(
+            row["detail"]
+            for row in get_db().execute(
+                "EXPLAIN QUERY PLAN SELECT hash FROM blob_variables WHERE name = ?",
+                ("topic",),
+            )
+        )
+
+    assert plan.startswith("SEARCH")
+
+
+def test_filters_backfill_bodies_stored_without_metadata(client, app):
+    with app.app_context():
+        create_prompt("meta legacy", [], "Old body with {metavar_legacy}")
+        db = get_db()
+        db.execute("DELETE FROM blob_variables WHERE name = 'metavar_legacy'")
+        db.execute(
+            """UPDATE prompt_blobs
+               SET char_count = NULL, word_count = NULL, token_estimate = NULL
+               WHERE content LIKE '%metavar_legacy%'"""
+        )
+        db.commit()
+        assert metadata_pending()
+
+    response = client.get("/api/prompts?variable=metavar_legacy")
+
+    assert [prompt["prompt_name"] for prompt in response.get_json()["data"]] == [
+        "meta legacy"
+    ]
+    with app.app_context():
+        assert not metadata_pending()
@@ -0,0 +1,90 @@
+from database import minhash
+from database.db import create_prompt, get_db, import_prompts
+
+# Long enough that a one-word edit keeps most shingles in common
+BODY = (
+    "You are a careful quillhaven assistant. Read the customer message below, "
+    "identify the product they are asking about, summarise the problem in two "
+    "sentences and suggest the next troubleshooting step they should try"
+)
+
+
+def test_signature_similarity():
+    edited = BODY.replace("two sentences", "three sentences")
+
+    assert minhash.similarity(minhash.signature(BODY), minhash.signature(BODY)) == 1
+    assert (
+        minhash.similarity(minhash.signature(BODY), minhash.signature(edited))
+        >= minhash.DEFAULT_THRESHOLD
+    )
+    assert (
+        minhash.similarity(
+            minhash.signature(BODY), minhash.signature("Write a haiku about tea")
+        )
+        < 0.2
+    )
+
+
+def test_writes_store_signatures_and_buckets(app):
+    with app.app_context():
+        create_prompt("lsh stored", [], BODY + " stored")
+        db = get_db()
+        digest = db.execute(
+            "SELECT content_hash FROM prompts WHERE prompt_name = 'lsh stored'"
+        ).fetchone()[0]
+        signed = db.execute(
+            "SELECT COUNT(*) FROM blob_minhash WHERE hash = ?", (digest,)
+        ).fetchone()[0]
+        buckets = db.execute(
+            "SELECT COUNT(DISTINCT band) FROM blob_lsh WHERE hash = ?", (digest,)
+        ).fetchone()[0]
+
+    assert signed == 1
+    assert buckets == minhash.BANDS
+
+
+def test_duplicate_report_clusters_near_duplicates(client, app):
+    with app.app_context():
+        create_prompt("lsh original", [], BODY + " cluster")
+        create_prompt("lsh edited", [], BODY.replace("careful", "patient") + " cluster")
+        create_prompt("lsh unrelated", [], "Plan a seven day quillhaven itinerary")
+
+    response = client.get("/api/prompts/duplicates")
+
+    assert response.status_code == 200
+    clusters = [
+        {prompt["prompt_name"] for prompt in cluster["prompts"]}
+        for cluster in response.get_json()["data"]
+    ]
+    cluster = next(names for names in clusters if "lsh original" in names)
+    assert "lsh edited" in cluster
+    assert not any("lsh unrelated" in names for names in clusters)
+
+
+def test_import_flags_or_skips_near_duplicates(app):
+    with app.app_context():
+        create_prompt("lsh existing", [], BODY + " import")
+        near = BODY.replace("customer", "client") + " import"
+
+        flagged = import_prompts(
+            [{"prompt_name": "lsh flagged", "prompt_content": near}],
+            near_duplicates="flag",
+        )
+        skipped = import_prompts(
+            [{"prompt_name": "lsh skipped", "prompt_content": near + "!"}],
+            near_duplicates="skip",
+        )
+        names = {
+            row[0]
+            for row in get_db().execute(
+                "SELECT prompt_name FROM prompts WHERE prompt_name LIKE 'lsh %'"
+            )
+        }
+
+    assert flagged["created"] == 1
+    matched = {
+        match["prompt_name"] for match in flagged["near_duplicates"][0]["matches"]
+    }
+    assert "lsh existing" in matched
+    assert skipped["created"] == 0 and skipped["skipped"] == 1
+    assert "lsh flagged" in names and "lsh skipped" not in names
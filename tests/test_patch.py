@@ -0,0 +1,61 @@
+from database.db import get_update_stats
+
+
+def test_noop_prompt_patch_skips_the_write(client):
+    response = client.post(
+        "/api/prompts", json={"prompt_name": "patched", "prompt_content": "body"}
+    )
+    prompt_id = response.get_json()["data"]["id"]
+    before = client.get(f"/api/prompts/{prompt_id}").get_json()["data"]
+    stats = get_update_stats()
+
+    response = client.patch(
+        f"/api/prompts/{prompt_id}",
+        json={"prompt_name": "patched", "prompt_content": "body"},
+    )
+
+    assert response.status_code == 200
+    assert response.get_json()["changed"] is False
+    assert response.get_json()["data"]["updated_at"] == before["updated_at"]
+    assert (
+        get_update_stats()["prompt_writes_avoided"]
+        == stats["prompt_writes_avoided"] + 1
+    )
+    versions = client.get(f"/api/prompts/{prompt_id}/versions").get_json()["data"]
+    assert len(versions) == 1
+
+
+def test_noop_task_patch_skips_the_write(client, task_db):
+    task = client.post("/api/tasks", json={"title": "same"}).get_json()["data"]
+    stats = get_update_stats()
+
+    response = client.patch(f"/api/tasks/{task['id']}", json={"title": "same"})
+
+    assert response.status_code == 200
+    assert response.get_json()["data"]["updated_at"] == task["updated_at"]
+    assert get_update_stats()["task_writes_avoided"] == stats["task_writes_avoided"] + 1
+
+
+def test_bad_patch_bodies_are_client_errors(client, task_db):
+    task = client.post("/api/tasks", json={"title": "target"}).get_json()["data"]
+
+    unknown = client.patch(f"/api/tasks/{task['id']}", json={"colour": "red"})
+    not_object = client.patch(f"/api/tasks/{task['id']}", json=["title"])
+    prompt = client.patch("/api/prompts/1", json=["prompt_name"])
+
+    assert unknown.status_code == 400
+    assert "colour" in unknown.get_json()["message"]
+    assert not_object.status_code == 400
+    assert prompt.status_code == 400
+
+
+def test_cors_allows_patch_preflight(client):
+    response = client.options(
+        "/api/tasks/1",
+        headers={
+            "Origin": "http://localhost:3000",
+            "Access-Control-Request-Method": "PATCH",
+        },
+    )
+
+    assert "PATCH" in response.headers["Access-Control-Allow-Methods"]
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta, timezone
+
+from database.scheduler import as_datetime, due_scheduler
+
+
+def test_offsets_become_naive_local_time():
+    utc = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+    expected = utc.astimezone().replace(tzinfo=None)
+
+    assert as_datetime("2030-01-01T12:00:00Z") == expected
+    assert as_datetime("2030-01-01T12:00:00+00:00") == expected
+    assert as_datetime(utc) == expected
+    assert as_datetime("2030-01-01").tzinfo is None
+
+
+def test_load_tracks_open_tasks(client, task_db):
+    due = (datetime.now() + timedelta(days=2)).isoformat(timespec="seconds")
+    task_id = client.post("/api/tasks", json={"title": "later", "due_date": due})
+    task_id = task_id.get_json()["data"]["id"]
+
+    due_scheduler.load()
+
+    assert due_scheduler.stats()["load_error"] is None
+    assert task_id in {task["task_id"] for task in due_scheduler.upcoming()}
+
+
+def test_utc_due_dates_are_scheduled(client, task_db):
+    due = datetime.now(timezone.utc) + timedelta(days=3)
+    response = client.post(
+        "/api/tasks",
+        json={"title": "utc", "due_date": due.strftime("%Y-%m-%dT%H:%M:%SZ")},
+    )
+    assert response.status_code == 201
+    task_id = response.get_json()["data"]["id"]
+
+    moved = due + timedelta(days=1)
+    response = client.patch(
+        f"/api/tasks/{task_id}", json={"due_date": moved.isoformat()}
+    )
+    assert response.status_code == 200
+
+    upcoming = {task["task_id"]: task for task in due_scheduler.upcoming()}
+    assert datetime.fromisoformat(upcoming[task_id]["due_date"]) == (
+        moved.astimezone().replace(tzinfo=None)
+    )
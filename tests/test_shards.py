@@ -0,0 +1,55 @@
+import os
+
+from database.shards import shard_path
+
+
+def _exists(app, workspace):
+    with app.app_context():
+        return os.path.exists(shard_path(workspace))
+
+
+def test_reads_do_not_create_workspaces(client, app):
+    response = client.get("/api/prompts", headers={"X-Workspace": "never-written"})
+
+    assert response.status_code == 404
+    assert not _exists(app, "never-written")
+
+
+def test_first_write_creates_the_workspace(client, app):
+    response = client.post(
+        "/api/prompts",
+        json={"prompt_name": "first", "prompt_content": "body"},
+        headers={"X-Workspace": "written"},
+    )
+
+    assert response.status_code == 201
+    assert _exists(app, "written")
+    response = client.get("/api/prompts", headers={"X-Workspace": "written"})
+    assert [prompt["prompt_name"] for prompt in response.get_json()["data"]] == [
+        "first"
+    ]
+
+
+def test_workspace_limit(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, "MAX_WORKSPACES", 0)
+    response = client.post(
+        "/api/prompts",
+        json={"prompt_name": "over", "prompt_content": "body"},
+        headers={"X-Workspace": "over-limit"},
+    )
+
+    assert response.status_code == 403
+    assert not _exists(app, "over-limit")
+
+
+def test_cors_allows_workspace_header(client):
+    response = client.options(
+        "/api/prompts",
+        headers={
+            "Origin": "http://localhost:3000",
+            "Access-Control-Request-Method": "GET",
+            "Access-Control-Request-Headers": "X-Workspace",
+        },
+    )
+
+    assert "x-workspace" in response.headers["Access-Control-Allow-Headers"].lower()
@@ -0,0 +1,87 @@
+from database import similarity
+from database.db import get_db
+from database.similarity import SimilarityIndex, similarity_index
+
+
+def _create(client, name, content):
+    response = client.post(
+        "/api/prompts", json={"prompt_name": name, "prompt_content": content}
+    )
+    assert response.status_code == 201
+    return response.get_json()["data"]["id"]
+
+
+def _similar_ids(client, prompt_id):
+    response = client.get(f"/api/prompts/{prompt_id}/similar?k=5")
+    assert response.status_code == 200
+    return [result["id"] for result in response.get_json()["data"]]
+
+
+def test_similar_prompts_rank_closest_first(client):
+    base = _create(
+        client, "sim base", "Summarise the quarterly zorbant revenue for investors"
+    )
+    close = _create(
+        client, "sim close", "Summarise the quarterly zorbant revenue for the board"
+    )
+    _create(client, "sim far", "Translate this zorbant menu into French")
+
+    ids = _similar_ids(client, base)
+    assert ids[0] == close
+    assert base not in ids
+
+    response = client.get("/api/search/similar?q=quarterly zorbant revenue&k=2")
+    results = response.get_json()["data"]
+    assert results[0]["id"] in (base, close)
+    assert {"id", "score", "prompt_name"} <= set(results[0])
+
+    assert client.get("/api/prompts/999999/similar").status_code == 404
+
+
+def test_index_follows_writes_without_rebuild(client):
+    client.post("/api/search/similar/rebuild")
+    first = _create(client, "sim first", "Plan a glimmerquad hiking trip")
+    second = _create(client, "sim second", "Plan a glimmerquad hiking holiday")
+    assert second in _similar_ids(client, first)
+
+    # Rewriting the body moves the prompt away from its old neighbours
+    client.patch(
+        f"/api/prompts/{second}", json={"prompt_content": "Water the garden roses"}
+    )
+    assert second not in _similar_ids(client, first)
+
+    client.patch(
+        f"/api/prompts/{second}",
+        json={"prompt_content": "Plan a glimmerquad hiking weekend"},
+    )
+    assert second in _similar_ids(client, first)
+
+    client.delete(f"/api/prompts/{second}")
+    assert second not in _similar_ids(client, first)
+    stats = client.get("/api/search/similar/stats").get_json()["data"]
+    assert stats["loaded"] and stats["queries"] >= 1
+
+
+def test_persisted_index_is_reconciled_on_load(app, client, monkeypatch):
+    # Merge on every write so the index is saved to disk as it changes
+    monkeypatch.setattr(similarity, "MERGE_THRESHOLD", 1)
+    client.post("/api/search/similar/rebuild")
+    kept = _create(client, "sim kept", "Draft a wintermoss press release")
+    gone = _create(client, "sim gone", "Draft a wintermoss press statement")
+    changed = _create(client, "sim changed", "Draft a wintermoss launch email")
+
+    # Later writes made while this process was not watching
+    monkeypatch.setattr(similarity_index, "loaded", False)
+    client.delete(f"/api/prompts/{gone}")
+    client.patch(f"/api/prompts/{changed}", json={"prompt_content": "Water plants"})
+
+    with app.test_request_context():
+        index = SimilarityIndex()
+        index.load(app.config["SIMILARITY_INDEX_DIR"])
+        ids = [result["id"] for result in index.search("wintermoss press", k=10)]
+        prompts = get_db().execute("SELECT COUNT(*) FROM prompts").fetchone()[0]
+
+    assert index.stats()["rows"] == prompts
+    assert kept in ids
+    assert gone not in ids and changed not in ids
+    client.post("/api/search/similar/rebuild")
@@ -0,0 +1,78 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import text
+
+from database import db as db_module
+
+
+def _at(days, hour=12):
+    return datetime.combine(date.today() + timedelta(days=days), time(hour))
+
+
+def test_due_counts(task_db):
+    db_module.create_task("yesterday", due_date=_at(-1, 23))
+    db_module.create_task("today early", due_date=_at(0, 0))
+    db_module.create_task("today late", due_date=_at(0, 23))
+    db_module.create_task("in six days", due_date=_at(6, 23))
+    db_module.create_task("in seven days", due_date=_at(7, 0))
+    done = db_module.create_task("done and overdue", due_date=_at(-3))
+    db_module.toggle_task(done["id"])
+    db_module.create_task("no date", priority=1)
+
+    overall = db_module.get_task_stats()["overall"]
+    assert overall["total"] == 7
+    assert overall["completed"] == 1
+    assert overall["overdue"] == 1
+    assert overall["due_today"] == 2
+    assert overall["due_this_week"] == 3
+    assert overall["by_priority"]["1"] == 1
+
+
+def test_due_date_filter_uses_index(task_db):
+    db_module.create_task("today", due_date=_at(0))
+    db_module.create_task("tomorrow", due_date=_at(1))
+
+    tasks = db_module.get_tasks(due_date=date.today())
+    assert [task["title"] for task in tasks] == ["today"]
+
+    query = db_module._task_query(due_date=date.today())
+    compiled = query.statement.compile(
+        task_db.engine, compile_kwargs={"literal_binds": True}
+    )
+    # A bare range on due_date (no date() call) can be answered from the index
+    assert "date(" not in str(compiled)
+    plan = task_db.session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT id FROM tasks "
+            "WHERE due_date >= :start AND due_date < :end"
+        ),
+        {"start": "2026-01-01", "end": "2026-01-02"},
+    ).fetchall()
+    assert any("ix_tasks_due_date" in row[-1] for row in plan)
+
+
+def test_indexes_exist(task_db):
+    names = {
+        row[0]
+        for row in task_db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index'")
+        )
+    }
+    assert {"ix_tasks_due_date", "ix_tasks_completed", "ix_tasks_list_id"} <= names
+
+
+def test_cache_sees_writes_from_other_processes(task_db):
+    import sqlite3
+
+    db_module.create_task("ours")
+    assert db_module.get_task_stats()["overall"]["total"] == 1
+
+    # Another worker process commits through its own connection
+    conn = sqlite3.connect(task_db.engine.url.database)
+    conn.execute(
+        "INSERT INTO tasks (title, completed, priority) VALUES ('theirs', 0, 4)"
+    )
+    conn.commit()
+    conn.close()
+
+    assert db_module.get_task_stats()["overall"]["total"] == 2
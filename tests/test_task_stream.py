@@ -0,0 +1,54 @@
+from sqlalchemy import event
+
+from database import db as db_module
+
+
+def _create(client, title, **fields):
+    response = client.post("/api/tasks", json={"title": title, **fields})
+    return response.get_json()["data"]["id"]
+
+
+def test_stream_matches_list_without_nesting(client, task_db):
+    client.post("/api/tags", json={"name": "streamed"})
+    parent = _create(client, "parent", tags=["streamed"])
+    _create(client, "child", parent_id=parent)
+
+    listed = client.get("/api/tasks").get_json()["data"]
+    response = client.get("/api/tasks?stream=1")
+    assert response.is_streamed
+    streamed = response.get_json()["data"]
+
+    assert [task["id"] for task in streamed] == [task["id"] for task in listed]
+    for flat, full in zip(streamed, listed):
+        assert "subtasks" not in flat
+        assert flat["tags"] == [
+            {"id": tag["id"], "name": tag["name"]} for tag in full["tags"]
+        ]
+        full.pop("subtasks")
+        full.pop("tags")
+        flat.pop("tags")
+        assert flat == full
+
+
+def test_stream_query_count_is_per_batch(app, task_db):
+    tag = db_module.create_tag("bulk")
+    ids = [db_module.create_task(f"task {i}", tags=["bulk"])["id"] for i in range(50)]
+    for index in range(5):
+        db_module.create_task(f"subtask {index}", parent_id=ids[0])
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(task_db.engine, "before_cursor_execute", count)
+    try:
+        tasks = list(db_module.iter_tasks(batch_size=10))
+    finally:
+        event.remove(task_db.engine, "before_cursor_execute", count)
+
+    assert len(tasks) == 55
+    tagged = [task for task in tasks if task["title"].startswith("task")]
+    assert all(task["tags"] == [{"id": tag["id"], "name": "bulk"}] for task in tagged)
+    # One task query plus one tag query per batch of ten
+    assert len(statements) <= 1 + 6
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+from sqlalchemy import text
+
+from database import db as db_module
+from database.db import DatabaseError
+
+
+def _closure(db):
+    return set(
+        db.session.execute(
+            text("SELECT ancestor_id, descendant_id, depth FROM task_closure")
+        ).fetchall()
+    )
+
+
+def _expected_closure(db):
+    """The closure rebuilt naively from parent_id."""
+    parents = dict(
+        db.session.execute(text("SELECT id, parent_id FROM tasks")).fetchall()
+    )
+    rows = set()
+    for task_id in parents:
+        ancestor, depth = task_id, 0
+        while ancestor is not None:
+            rows.add((ancestor, task_id, depth))
+            ancestor, depth = parents[ancestor], depth + 1
+    return rows
+
+
+def _chain(length):
+    ids = [db_module.create_task("level 0")["id"]]
+    for level in range(1, length):
+        ids.append(db_module.create_task(f"level {level}", parent_id=ids[-1])["id"])
+    return ids
+
+
+def _fan(width):
+    root = db_module.create_task("root")["id"]
+    children = [
+        db_module.create_task(f"child {i}", parent_id=root)["id"] for i in range(width)
+    ]
+    return root, children
+
+
+def test_deep_chain_subtree(task_db):
+    ids = _chain(200)
+
+    subtree = db_module.get_task_subtree(ids[0])
+    assert [task["id"] for task in subtree] == ids
+    assert [task["depth"] for task in subtree] == list(range(200))
+    assert subtree[0]["descendant_count"] == 199
+    assert subtree[-1]["descendant_count"] == 0
+    assert len(db_module.get_task_subtree(ids[0], max_depth=10)) == 11
+    assert _closure(task_db) == _expected_closure(task_db)
+
+
+def test_wide_tree_subtree(task_db):
+    root, children = _fan(500)
+    db_module.toggle_task(children[0])
+
+    subtree = db_module.get_task_subtree(root)
+    assert len(subtree) == 501
+    assert subtree[0]["descendant_count"] == 500
+    assert subtree[0]["completed_descendant_count"] == 1
+    assert {task["id"] for task in subtree[1:]} == set(children)
+    assert all(task["depth"] == 1 for task in subtree[1:])
+
+
+def test_move_subtree(task_db):
+    ids = _chain(20)
+    other = db_module.create_task("other")["id"]
+
+    db_module.move_task(ids[10], other)
+    assert _closure(task_db) == _expected_closure(task_db)
+    assert len(db_module.get_task_subtree(ids[0])) == 10
+    assert [t["depth"] for t in db_module.get_task_subtree(other)][-1] == 10
+
+    db_module.move_task(ids[10], None)
+    assert _closure(task_db) == _expected_closure(task_db)
+
+
+def test_move_under_own_subtask_is_rejected(task_db):
+    ids = _chain(5)
+    with pytest.raises(DatabaseError):
+        db_module.move_task(ids[0], ids[4])
+    assert _closure(task_db) == _expected_closure(task_db)
+
+
+def test_delete_promotes_subtasks(task_db):
+    ids = _chain(4)
+    db_module.delete_task(ids[1])
+
+    parent = task_db.session.execute(
+        text("SELECT parent_id FROM tasks WHERE id = :id"), {"id": ids[2]}
+    ).scalar()
+    assert parent is None
+    assert _closure(task_db) == _expected_closure(task_db)
+    assert len(db_module.get_task_subtree(ids[2])) == 2
+
+
+def test_rebuild_matches_incremental(task_db):
+    ids = _chain(30)
+    _fan(30)
+    db_module.move_task(ids[15], ids[2])
+    incremental = _closure(task_db)
+
+    db_module.rebuild_task_tree()
+    assert _closure(task_db) == incremental == _expected_closure(task_db)
+
+
+def test_subtree_and_move_performance(task_db):
+    deep = _chain(300)
+    root, _ = _fan(1000)
+
+    started = time.perf_counter()
+    for _ in range(10):
+        db_module.get_task_subtree(deep[0])
+        db_module.get_task_subtree(root)
+    assert (time.perf_counter() - started) / 10 < 0.5
+
+    # Moving a 150-deep subtree rewrites its links to 150 ancestors
+    started = time.perf_counter()
+    db_module.move_task(deep[150], root)
+    assert time.perf_counter() - started < 2.0
+    assert _closure(task_db) == _expected_closure(task_db)
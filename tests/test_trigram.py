@@ -0,0 +1,11 @@
+def test_rebuild_indexes_tags_and_lists(client, task_db):
+    assert client.post("/api/tags", json={"name": "urgentwork"}).status_code == 201
+    assert client.post("/api/lists", json={"name": "groceries"}).status_code == 201
+
+    response = client.post("/api/search/names/rebuild")
+    assert response.get_json()["data"]["names"] >= 2
+
+    tags = client.get("/api/search/names?q=urgnetwork&kind=tag").get_json()["data"]
+    lists = client.get("/api/search/names?q=grocerys&kind=list").get_json()["data"]
+    assert [match["name"] for match in tags] == ["urgentwork"]
+    assert [match["name"] for match in lists] == ["groceries"]
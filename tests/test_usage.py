@@ -0,0 +1,26 @@
+from database.db import create_prompt
+from database.usage import usage_counter
+
+
+def test_top_prompts_include_unflushed_usage(client, app, monkeypatch):
+    def no_flush():
+        raise AssertionError("reads must not flush usage counters")
+
+    with app.app_context():
+        usage_counter.flush()
+        monkeypatch.setattr(usage_counter, "flush", no_flush)
+        quiet = create_prompt("quiet prompt", [], "quiet body")
+        busy = create_prompt("busy prompt", [], "busy body")
+    for _ in range(3):
+        client.post(f"/api/prompts/{busy}/usage", json={"event": "copy"})
+    client.post(f"/api/prompts/{quiet}/usage", json={"event": "render"})
+
+    response = client.get("/api/prompts/top?limit=50")
+
+    assert response.status_code == 200
+    top = {row["prompt_id"]: row for row in response.get_json()["data"]}
+    assert top[busy]["use_count"] == 3
+    assert top[busy]["copy_count"] == 3
+    assert top[quiet]["render_count"] == 1
+    ids = [row["prompt_id"] for row in response.get_json()["data"]]
+    assert ids.index(busy) < ids.index(quiet)
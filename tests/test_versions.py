@@ -0,0 +1,18 @@
+from database.db import create_prompt, patch_prompt
+from database.versions import diff_versions
+
+
+def test_diff_marks_missing_final_newline(app):
+    with app.app_context():
+        prompt_id = create_prompt("diffed", [], "Write about {topic} now")
+        patch_prompt(prompt_id, prompt_content="Write about {topic} later\nline2")
+        diff = diff_versions(prompt_id, 1, 2)["diff"]
+
+    assert diff.splitlines()[2:] == [
+        "@@ -1 +1,2 @@",
+        "-Write about {topic} now",
+        "\\ No newline at end of file",
+        "+Write about {topic} later",
+        "+line2",
+        "\\ No newline at end of file",
+    ]
@@ -0,0 +1,75 @@
+import time
+import threading
+
+import pytest
+
+from database import db as db_module
+from database.db import DatabaseError, get_db
+from database.writer import write_operation, writer
+
+
+@write_operation
+def _slow_write(seconds, name=None):
+    time.sleep(seconds)
+    if name:
+        db_module.create_prompt(name, [], "slow body")
+    return "done"
+
+
+@pytest.fixture
+def short_timeout():
+    timeout, writer.timeout = writer.timeout, 0.2
+    yield
+    writer.timeout = timeout
+
+
+def _prompt_names(app):
+    with app.app_context():
+        return {
+            row["prompt_name"]
+            for row in get_db().execute("SELECT prompt_name FROM prompts")
+        }
+
+
+def test_timed_out_queued_write_is_cancelled(app, short_timeout):
+    def block():
+        with app.app_context():
+            _slow_write(0.6)
+
+    blocker = threading.Thread(target=block)
+    blocker.start()
+    time.sleep(0.05)
+    with app.app_context():
+        with pytest.raises(DatabaseError):
+            db_module.create_prompt("never written", [], "body")
+    blocker.join()
+
+    assert "never written" not in _prompt_names(app)
+
+
+def test_started_write_is_waited_for(app, short_timeout):
+    with app.app_context():
+        assert _slow_write(0.5, name="slow but written") == "done"
+    assert "slow but written" in _prompt_names(app)
+
+
+@write_operation
+def _create_then_fail(name):
+    db_module.create_prompt(name, [], "rolled back body")
+    raise ValueError("abandon this write")
+
+
+def test_rolled_back_write_leaves_indexes_alone(app):
+    from database.trigram import name_index
+
+    with app.app_context():
+        name_index.rebuild()
+        with pytest.raises(ValueError):
+            _create_then_fail("zyxwv rolled back")
+        rolled_back = name_index.search("zyxwv", kind="prompt")
+        db_module.create_prompt("zyxwv committed", [], "body")
+        committed = name_index.search("zyxwv", kind="prompt")
+
+    assert rolled_back == []
+    assert [hit["name"] for hit in committed] == ["zyxwv committed"]
+    assert "zyxwv rolled back" not in _prompt_names(app)